@@ -0,0 +1,25 @@
+"""add key stats to typing sessions
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Per-key and digraph timing summary computed while typing
+    op.add_column('typing_sessions', sa.Column('key_stats_json', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('typing_sessions', 'key_stats_json')
@@ -0,0 +1,33 @@
+"""unique leaderboard snapshot per scope and category
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The snapshot job upserts on (scope, category); keep only the newest row of any duplicates
+    op.execute('''
+        DELETE FROM leaderboards a
+        USING leaderboards b
+        WHERE a.scope = b.scope AND a.category = b.category AND a.updated_at < b.updated_at
+    ''')
+    op.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_leaderboards_scope_category
+        ON leaderboards(scope, category)
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_index('uq_leaderboards_scope_category', 'leaderboards')
@@ -0,0 +1,64 @@
+"""add per-user best score table
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_best_scores',
+        sa.Column('user_id', sa.UUID(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('language', sa.String(length=10), nullable=False),
+        sa.Column('mode_seconds', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('bucket', sa.String(length=8), nullable=False),
+        sa.Column('score_id', sa.UUID(), sa.ForeignKey('scores.id'), nullable=False),
+        sa.Column('wpm', sa.Float(), nullable=False),
+        sa.Column('accuracy', sa.Float(), nullable=False),
+        sa.Column('achieved_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'language', 'mode_seconds', 'period'),
+    )
+    op.create_index(
+        'idx_user_best_scores_rank', 'user_best_scores',
+        ['period', 'language', 'mode_seconds', 'bucket', 'wpm', 'accuracy'],
+    )
+
+    # Backfill the current calendar buckets from existing scores
+    op.execute('''
+        WITH periods(period, bucket, since) AS (
+            VALUES
+                ('daily', to_char(now() AT TIME ZONE 'utc', 'YYYYMMDD'), date_trunc('day', now() AT TIME ZONE 'utc')),
+                ('weekly', to_char(now() AT TIME ZONE 'utc', 'IYYY"W"IW'), date_trunc('week', now() AT TIME ZONE 'utc')),
+                ('monthly', to_char(now() AT TIME ZONE 'utc', 'YYYYMM'), date_trunc('month', now() AT TIME ZONE 'utc')),
+                ('alltime', 'all', NULL)
+        )
+        INSERT INTO user_best_scores (user_id, language, mode_seconds, period, bucket, score_id, wpm, accuracy, achieved_at)
+        SELECT DISTINCT ON (ts.user_id, k.language, k.mode_seconds, p.period)
+            ts.user_id, k.language, k.mode_seconds, p.period, p.bucket, s.id, s.wpm, s.accuracy, s.created_at
+        FROM scores s
+        JOIN typing_sessions ts ON ts.id = s.session_id
+        CROSS JOIN periods p
+        CROSS JOIN LATERAL (
+            VALUES (s.language, ts.mode_seconds), (s.language, 0), ('overall', ts.mode_seconds), ('overall', 0)
+        ) AS k(language, mode_seconds)
+        WHERE ts.user_id IS NOT NULL AND s.is_void = false AND s.wpm > 0 AND s.accuracy > 0
+            AND (p.since IS NULL OR s.created_at >= p.since)
+        ORDER BY ts.user_id, k.language, k.mode_seconds, p.period, s.wpm DESC, s.accuracy DESC, s.created_at DESC
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_index('idx_user_best_scores_rank', 'user_best_scores')
+    op.drop_table('user_best_scores')
@@ -0,0 +1,49 @@
+"""add hourly per-user best score buckets
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_hourly_best_scores',
+        sa.Column('user_id', sa.UUID(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('language', sa.String(length=10), nullable=False),
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('score_id', sa.UUID(), sa.ForeignKey('scores.id'), nullable=False),
+        sa.Column('wpm', sa.Float(), nullable=False),
+        sa.Column('accuracy', sa.Float(), nullable=False),
+        sa.Column('achieved_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'language', 'hour'),
+    )
+    op.create_index('idx_user_hourly_best_scores_window', 'user_hourly_best_scores', ['language', 'hour'])
+
+    # Backfill the retained hours (31 days) from existing scores
+    op.execute('''
+        INSERT INTO user_hourly_best_scores (user_id, language, hour, score_id, wpm, accuracy, achieved_at)
+        SELECT DISTINCT ON (ts.user_id, k.language, date_trunc('hour', s.created_at))
+            ts.user_id, k.language, date_trunc('hour', s.created_at), s.id, s.wpm, s.accuracy, s.created_at
+        FROM scores s
+        JOIN typing_sessions ts ON ts.id = s.session_id
+        CROSS JOIN LATERAL (VALUES (s.language), ('overall')) AS k(language)
+        WHERE ts.user_id IS NOT NULL AND s.is_void = false AND s.wpm > 0 AND s.accuracy > 0
+            AND s.created_at >= now() - interval '31 days'
+        ORDER BY ts.user_id, k.language, date_trunc('hour', s.created_at), s.wpm DESC, s.accuracy DESC, s.created_at DESC
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_index('idx_user_hourly_best_scores_window', 'user_hourly_best_scores')
+    op.drop_table('user_hourly_best_scores')
@@ -0,0 +1,33 @@
+"""extend the user best score ranking index for keyset pagination
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Leaderboard pages seek on (wpm, accuracy, achieved_at, user_id) within one board
+    op.create_index(
+        'idx_user_best_scores_keyset', 'user_best_scores',
+        ['period', 'language', 'mode_seconds', 'bucket', 'wpm', 'accuracy', 'achieved_at', 'user_id'],
+    )
+    op.drop_index('idx_user_best_scores_rank', 'user_best_scores')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'idx_user_best_scores_rank', 'user_best_scores',
+        ['period', 'language', 'mode_seconds', 'bucket', 'wpm', 'accuracy'],
+    )
+    op.drop_index('idx_user_best_scores_keyset', 'user_best_scores')
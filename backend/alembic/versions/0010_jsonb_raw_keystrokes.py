@@ -0,0 +1,34 @@
+"""store raw keystrokes as jsonb
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Replays slice single chunks out of the blob; jsonb is parsed once on write, not per slice
+    op.alter_column(
+        'typing_sessions', 'raw_keystrokes_json',
+        type_=postgresql.JSONB(),
+        postgresql_using='raw_keystrokes_json::jsonb',
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'typing_sessions', 'raw_keystrokes_json',
+        type_=sa.JSON(),
+        postgresql_using='raw_keystrokes_json::json',
+    )
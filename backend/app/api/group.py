@@ -10,6 +10,7 @@ from app.core.deps import get_current_user
 from app.models.users import User
 from app.models.organizations import Organization, Group, GroupMember, GroupRole
 from app.models.sessions import TypingSession, Score
+from app.services.best_scores import best_scores
 
 router = APIRouter()
 
@@ -175,43 +176,17 @@ async def group_leaderboard(
             )
 
     elif mode_norm == "best":
-        # Best entry per user (highest WPM, tie-break by accuracy then recency)
-        query = (
-            select(
-                TypingSession.user_id,
-                User.display_name,
-                User.picture,
-                Score.wpm,
-                Score.accuracy,
-                Score.created_at,
-            )
-            .join(TypingSession, Score.session_id == TypingSession.id)
-            .join(User, TypingSession.user_id == User.id, isouter=True)
-            .where(and_(TypingSession.user_id.in_(uids), Score.is_void == False))
-            .order_by(
-                TypingSession.user_id,
-                desc(Score.wpm),
-                desc(Score.accuracy),
-                desc(Score.created_at),
-            )
-        )
-
-        best_map = {}
-        res = await db.execute(query)
-        for row in res.fetchall():
-            uid = row[0]
-            if uid not in best_map:
-                best_map[uid] = row
-
-        for uid, row in best_map.items():
+        # Best entry per user, maintained on write in user_best_scores (primary-key lookups)
+        rows = await best_scores.for_users(db, uids)
+        for wpm, accuracy, achieved_at, uid, display_name, picture in rows:
             items.append(
                 GroupScoreItem(
                     user_id=uid,
-                    display_name=row[1] or "User",
-                    user_picture=row[2],
-                    wpm=float(row[3]) if row[3] is not None else 0.0,
-                    accuracy=float(row[4]) if row[4] is not None else 0.0,
-                    created_at=str(row[5]),
+                    display_name=display_name or "User",
+                    user_picture=picture,
+                    wpm=float(wpm),
+                    accuracy=float(accuracy),
+                    created_at=str(achieved_at),
                 )
             )
 
@@ -1,17 +1,33 @@
 # Real leaderboard API implementation
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc, func
+from sqlalchemy import select
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from email.utils import format_datetime
+import base64
+import json
+import structlog
+import uuid
 
-from app.core.database import get_db
-from app.models.sessions import Score, TypingSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_db
+from app.core.deps import get_current_user_required
 from app.models.users import User
+from app.services.best_scores import ALL_MODES, ROLLING_HOURS
+from app.services.leaderboard_snapshots import (
+    leaderboard_snapshots, page_scores, rank_around, rolling_scores, top_scores,
+)
+from app.services.leaderboard_store import OVERALL, SCOPES, leaderboard_store
+from app.services.response_cache import leaderboard_cache
+from app.services.wpm_sketches import wpm_sketches
 
 router = APIRouter()
+logger = structlog.get_logger()
+
+WINDOWS = ("calendar", "rolling")
 
 class LeaderboardItem(BaseModel):
     rank: int
@@ -26,69 +42,266 @@ class LeaderboardResponse(BaseModel):
     entries: List[LeaderboardItem]
     total_count: int
 
+class LeaderboardPage(BaseModel):
+    entries: List[LeaderboardItem]
+    next_cursor: Optional[str] = None  # None on the last page
+
+class PercentileResponse(BaseModel):
+    language: str
+    mode_seconds: int
+    wpm: float
+    faster_than: float  # Percent of recorded scores below this WPM
+    sample_count: int
+    quantiles: Dict[str, Optional[float]]  # p50 / p90 / p99, within 1% of the true value
+
+class MyRankResponse(BaseModel):
+    scope: str
+    category: str
+    rank: Optional[int] = None  # None while the caller has no score in this bucket
+    total_count: int
+    percentile: Optional[float] = None  # Share of ranked users at or below the caller
+    neighbours: List[LeaderboardItem]
+
 @router.get("/", response_model=LeaderboardResponse)
 async def get_leaderboard(
+    request: Request,
     scope: str = Query("daily", description="Time scope: daily, weekly, monthly, alltime"),
     category: str = Query("overall", description="Category: overall, en, code, zh-TW, etc."),
     limit: int = Query(10, le=50),
-    db: AsyncSession = Depends(get_db)
+    window: str = Query("calendar", description="calendar (UTC day / ISO week / month) or rolling (last 24h / 168h / 720h)"),
 ):
-    """Get leaderboard from real scores; no placeholders returned."""
+    """Get leaderboard from real scores; no placeholders returned.
+
+    Responses carry ETag / Last-Modified and are served from a per-worker cache
+    that is rebuilt in the background once stale, so no request waits on a rebuild
+    after the first one.
+    """
+
+    if scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"Invalid scope. Use one of: {', '.join(SCOPES)}")
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Invalid window. Use one of: {', '.join(WINDOWS)}")
+    if not category or category.lower() == OVERALL:
+        category = OVERALL
+
+    async def build() -> bytes:
+        async with AsyncSessionLocal() as db:
+            response = await _compute_leaderboard(db, scope, category, limit, window)
+        return response.model_dump_json().encode()
+
+    return await _cached_json(request, (scope, category, limit, window), build)
 
-    # Calculate time filter
-    now = datetime.utcnow()
-    if scope == "daily":
-        start_date = now - timedelta(days=1)
-    elif scope == "weekly":
-        start_date = now - timedelta(weeks=1)
-    elif scope == "monthly":
-        start_date = now - timedelta(days=30)
-    else:
-        start_date = None
 
-    # Base query: scores joined to users
-    query = select(
-        Score.wpm,
-        Score.accuracy,
-        Score.created_at,
-        User.id.label('user_id'),
-        User.display_name,
-        User.picture,
-    ).join(TypingSession, Score.session_id == TypingSession.id, isouter=True)
-    query = query.join(User, TypingSession.user_id == User.id, isouter=True)
+@router.get("/page", response_model=LeaderboardPage)
+async def get_leaderboard_page(
+    request: Request,
+    scope: str = Query("daily", description="Time scope: daily, weekly, monthly, alltime"),
+    category: str = Query("overall", description="Category: overall, en, code, zh-TW, etc."),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Browse the whole calendar leaderboard page by page.
+
+    The cursor carries the last row's (wpm, accuracy, achieved_at, user_id) and
+    rank; the next page seeks past it on the ranking index, so page 200 costs
+    the same as page 1.
+    """
+    if scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"Invalid scope. Use one of: {', '.join(SCOPES)}")
+    if not category or category.lower() == OVERALL:
+        category = OVERALL
+    after, rank = _decode_cursor(cursor) if cursor else (None, 0)
+
+    async def build() -> bytes:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = await page_scores(db, scope, category, limit + 1, after, rank + 1, now)
+        more, rows = len(rows) > limit, rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]) if more else None
+        page = LeaderboardPage(entries=[_item(row, now) for row in rows], next_cursor=next_cursor)
+        return page.model_dump_json().encode()
+
+    return await _cached_json(request, ("page", scope, category, limit, cursor), build)
+
 
-    # Filter voided and non-positive scores
-    query = query.where(Score.is_void == False, Score.wpm > 0, Score.accuracy > 0)
+def _encode_cursor(row: dict) -> str:
+    raw = json.dumps(
+        [row["wpm"], row["accuracy"], row["date"], row["user_id"], row["rank"]], separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-    # Time filter
-    if start_date:
-        query = query.where(Score.created_at >= start_date)
 
-    # Language/category filter (if provided and not overall)
-    if category and category.lower() != 'overall':
-        query = query.where(Score.language == category)
+def _decode_cursor(cursor: str) -> Tuple[tuple, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        wpm, accuracy, achieved_at, user_id, rank = json.loads(raw)
+        return (float(wpm), float(accuracy), datetime.fromisoformat(achieved_at), uuid.UUID(user_id)), int(rank)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _cached_json(request: Request, key: tuple, build) -> Response:
+    """Serve from the leaderboard cache with ETag / Last-Modified and 304 handling"""
+    entry = await leaderboard_cache.get(key, build)
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": format_datetime(entry.last_modified, usegmt=True),
+        "Cache-Control": (
+            f"public, max-age={settings.LEADERBOARD_CACHE_FRESH_SECONDS}, "
+            f"stale-while-revalidate={settings.LEADERBOARD_CACHE_STALE_SECONDS}"
+        ),
+    }
+    if entry.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        leaderboard_cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+async def _compute_leaderboard(
+    db: AsyncSession, scope: str, category: str, limit: int, window: str
+) -> LeaderboardResponse:
+    now = datetime.utcnow()
 
-    # Order best scores first
-    query = query.order_by(desc(Score.wpm), desc(Score.accuracy), desc(Score.created_at)).limit(limit)
+    # Rolling windows merge the hourly per-user bests inside the window
+    if window == "rolling" and scope in ROLLING_HOURS:
+        try:
+            entries = [_item(row, now) for row in await rolling_scores(db, scope, category, limit, now)]
+            return LeaderboardResponse(entries=entries, total_count=len(entries))
+        except Exception as e:
+            logger.warning("Rolling leaderboard unavailable", error=str(e), scope=scope, category=category)
+            return LeaderboardResponse(entries=[], total_count=0)
 
+    # Redis sorted sets first; snapshots and SQL below cover them until seeded, or while unreachable
     try:
-        result = await db.execute(query)
-        rows = result.fetchall()
-        entries: List[LeaderboardItem] = []
-        for idx, (wpm, accuracy, created_at, user_id, display_name, picture) in enumerate(rows, 1):
-            if not user_id:
-                # Skip entries without user id to avoid placeholders
-                continue
-            entries.append(LeaderboardItem(
-                rank=idx,
-                user_id=str(user_id),
-                display_name=display_name or f"User-{str(user_id)[:6]}",
-                picture=picture,
-                wpm=float(wpm),
-                accuracy=float(accuracy),
-                date=created_at or now,
-            ))
+        entries = await _leaderboard_from_store(db, scope, category, limit, now)
+        if entries is not None:
+            return LeaderboardResponse(entries=entries, total_count=len(entries))
+    except Exception as e:
+        logger.warning("Leaderboard store unavailable", error=str(e), scope=scope, category=category)
 
+    # Materialized snapshot next: one row by unique index instead of the ranking query
+    try:
+        rows = await leaderboard_snapshots.load(db, scope, category, now)
+        if rows is not None:
+            entries = [_item(row, now) for row in rows[:limit]]
+            return LeaderboardResponse(entries=entries, total_count=len(entries))
+    except Exception as e:
+        logger.warning("Leaderboard snapshot unavailable", error=str(e), scope=scope, category=category)
+
+    # Live query: best score per user in the current calendar bucket
+    try:
+        rows = await top_scores(db, scope, category, limit, now)
+        entries = [_item(row, now) for row in rows]
         return LeaderboardResponse(entries=entries, total_count=len(entries))
     except Exception:
         return LeaderboardResponse(entries=[], total_count=0)
+
+
+@router.get("/percentile", response_model=PercentileResponse)
+async def get_wpm_percentile(
+    response: Response,
+    wpm: float = Query(..., gt=0, le=1000),
+    language: str = Query("overall", max_length=10, description="Language code, or overall"),
+    mode_seconds: int = Query(0, ge=0, description="Practice mode in seconds; 0 for all modes"),
+):
+    """Share of all recorded scores below ``wpm`` ("faster than X%") from a merged quantile sketch.
+
+    The sketch has a bounded number of buckets, so the answer never touches ``scores``.
+    """
+    modes = (ALL_MODES, *settings.PRACTICE_DURATIONS)
+    if mode_seconds not in modes:
+        raise HTTPException(status_code=400, detail=f"Invalid mode_seconds. Use one of: {', '.join(map(str, modes))}")
+    if not language or language.lower() == OVERALL:
+        language = OVERALL
+    try:
+        sketch = await wpm_sketches.load(language, mode_seconds)
+    except Exception as e:
+        logger.warning("WPM sketch unavailable", error=str(e), language=language, mode_seconds=mode_seconds)
+        raise HTTPException(status_code=503, detail="Percentiles temporarily unavailable")
+
+    response.headers["Cache-Control"] = f"public, max-age={int(settings.WPM_SKETCH_CACHE_SECONDS)}"
+    return PercentileResponse(
+        language=language,
+        mode_seconds=mode_seconds,
+        wpm=wpm,
+        faster_than=round(100 * sketch.faster_than(wpm), 1),
+        sample_count=len(sketch),
+        quantiles={name: sketch.quantile(q) for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))},
+    )
+
+
+@router.get("/me", response_model=MyRankResponse)
+async def get_my_rank(
+    response: Response,
+    scope: str = Query("daily", description="Time scope: daily, weekly, monthly, alltime"),
+    category: str = Query("overall", description="Category: overall, en, code, zh-TW, etc."),
+    neighbours: int = Query(2, ge=0, le=10, description="Entries shown above and below the caller"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_required),
+):
+    """Caller's rank, percentile and neighbours without counting everyone ahead of them."""
+    # Per-user answer: keep it out of shared caches (nginx, CDN)
+    response.headers["Cache-Control"] = "private, no-store"
+    if scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"Invalid scope. Use one of: {', '.join(SCOPES)}")
+    now = datetime.utcnow()
+    if not category or category.lower() == OVERALL:
+        category = OVERALL
+
+    ranked = None
+    try:
+        # ZREVRANK on the sorted set; None until the set has been seeded from the database
+        ranked = await leaderboard_store.rank_of(scope, category, str(current_user.id), neighbours, now)
+    except Exception as e:
+        logger.warning("Leaderboard store unavailable", error=str(e), scope=scope, category=category)
+    if ranked is None:
+        rank, total, rows = await rank_around(db, scope, category, current_user.id, neighbours, now)
+    else:
+        rank, total, rows = ranked
+        await _fill_users(db, rows)
+
+    return MyRankResponse(
+        scope=scope,
+        category=category,
+        rank=rank,
+        total_count=total,
+        percentile=round(100.0 * (total - rank + 1) / total, 2) if rank else None,
+        neighbours=[_item(row, now) for row in rows],
+    )
+
+
+def _item(row: dict, now: datetime) -> LeaderboardItem:
+    return LeaderboardItem(
+        rank=row["rank"],
+        user_id=row["user_id"],
+        display_name=row["display_name"] or f"User-{row['user_id'][:6]}",
+        picture=row["picture"],
+        wpm=row["wpm"],
+        accuracy=row["accuracy"],
+        date=row["date"] or now,
+    )
+
+
+async def _leaderboard_from_store(
+    db: AsyncSession, scope: str, category: str, limit: int, now: datetime
+) -> Optional[List[LeaderboardItem]]:
+    """Best score per user for the current scope bucket, read from the sorted set; None until seeded"""
+    rows = await leaderboard_store.top(scope, category, limit, now)
+    if rows is None:
+        return None
+    await _fill_users(db, rows)
+    return [_item(row, now) for row in rows]
+
+
+async def _fill_users(db: AsyncSession, rows: List[dict]) -> None:
+    """Users not cached yet (e.g. only seen via the WebSocket path): one primary-key lookup"""
+    missing = [row["user_id"] for row in rows if row["display_name"] is None]
+    if not missing:
+        return
+    ids = [uuid.UUID(user_id) for user_id in missing]
+    result = await db.execute(select(User.id, User.display_name, User.picture).where(User.id.in_(ids)))
+    users = {str(user_id): {"display_name": name, "picture": picture} for user_id, name, picture in result.all()}
+    await leaderboard_store.remember_users(users)
+    for row in rows:
+        if row["user_id"] in users:
+            row.update(users[row["user_id"]])
@@ -6,13 +6,18 @@ from sqlalchemy import select
 from typing import Optional, List
 from uuid import UUID
 from pydantic import BaseModel, Field
+import structlog
 
 from app.core.database import get_db
 from app.core.deps import get_current_user
 from app.models.users import User, UserRole
 from app.models.sessions import Score, TypingSession
+from app.services.best_scores import best_scores
+from app.services.leaderboard_store import leaderboard_store
+from app.services.wpm_sketches import wpm_sketches
 
 router = APIRouter()
+logger = structlog.get_logger()
 
 class ScoreItem(BaseModel):
     id: UUID
@@ -100,10 +105,16 @@ async def update_score(
     if current_user.role not in [UserRole.SUPER_ADMIN, UserRole.ORG_ADMIN]:
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    res = await db.execute(select(Score).where(Score.id == score_id))
-    s: Optional[Score] = res.scalar_one_or_none()
-    if not s:
+    res = await db.execute(
+        select(Score, TypingSession.user_id, TypingSession.mode_seconds)
+        .join(TypingSession, Score.session_id == TypingSession.id)
+        .where(Score.id == score_id)
+    )
+    row = res.first()
+    if not row:
         raise HTTPException(status_code=404, detail="Score not found")
+    s, owner_id, mode_seconds = row
+    counted_wpm = None if s.is_void else s.wpm
 
     if payload.wpm is not None:
         s.wpm = float(payload.wpm)
@@ -116,5 +127,16 @@ async def update_score(
     if payload.is_void is not None:
         s.is_void = bool(payload.is_void)
 
+    if owner_id:
+        await best_scores.rebuild_user(db, owner_id)
     await db.commit()
+    # 分位數 sketch 只累加，修改或作廢需扣回原本計入的值
+    wpm_sketches.replace(s.language, mode_seconds, counted_wpm, None if s.is_void else s.wpm)
+
+    if owner_id:
+        # 修改或作廢後重算該使用者的排行榜名次
+        try:
+            await leaderboard_store.rebuild_user(db, owner_id, s.language)
+        except Exception as e:
+            logger.warning("Leaderboard rebuild failed", error=str(e), user_id=str(owner_id))
     return {"message": "Score updated"}
@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import BaseModel, UUID4
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 from datetime import datetime
+import json
+import structlog
 
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, get_db
 from app.core.deps import get_current_user
 from app.models.sessions import TypingSession, Score
 from app.models.articles import Article
-from app.models.users import User
+from app.models.users import User, UserRole
+from app.services.best_scores import best_rows, best_scores
+from app.services.leaderboard_store import leaderboard_store
+from app.services.wpm_sketches import wpm_sketches
+from app.ws.keystrokes import CHUNKED_ENCODING, COMPACT_ENCODING, decode_chunk, first_chunk_at
 
 router = APIRouter()
+logger = structlog.get_logger()
+
+# Keystroke chunks pulled from the database per query while streaming a replay
+REPLAY_FETCH_CHUNKS = 4
 
 
 class SubmitPayload(BaseModel):
@@ -66,6 +77,110 @@ async def submit_session(
         language=payload.language,
     )
     db.add(score)
+    if current_user:
+        # Same transaction as the score, so the per-user best never points at a missing row
+        await db.flush()
+        await best_scores.record(db, best_rows(
+            current_user.id, score.id, score.language, session.mode_seconds, score.wpm, score.accuracy, datetime.utcnow()
+        ))
     await db.commit()
+    wpm_sketches.add(score.language, session.mode_seconds, score.wpm)
+
+    if current_user:
+        try:
+            await leaderboard_store.record(
+                str(current_user.id), score.language, score.wpm, score.accuracy, datetime.utcnow()
+            )
+            await leaderboard_store.remember_users({
+                str(current_user.id): {"display_name": current_user.display_name, "picture": current_user.picture}
+            })
+        except Exception as e:
+            # The database row is the source of truth; the ranking catches up on the next submit
+            logger.warning("Leaderboard update failed", error=str(e), session_id=str(session.id))
 
     return {"message": "Recorded", "session_id": str(session.id)}
+
+
+async def _replay_lines(
+    session_id: UUID4,
+    header: dict,
+    parts: List,
+    from_ms: int,
+    to_ms: Optional[int],
+) -> AsyncIterator[str]:
+    """NDJSON: a header line, then one line of ``[t, char, correct]`` triples per chunk"""
+    yield json.dumps(header) + "\n"
+    raw = TypingSession.raw_keystrokes_json
+    for start in range(0, len(parts), REPLAY_FETCH_CHUNKS):
+        batch = parts[start:start + REPLAY_FETCH_CHUNKS]
+        # Only the requested chunks leave the database, never the whole blob
+        async with AsyncSessionLocal() as db:
+            res = await db.execute(
+                select(*[raw[path].as_string() for path in batch]).where(TypingSession.id == session_id)
+            )
+            row = res.first()
+        if row is None:
+            return
+        for data in row:
+            keystrokes = [
+                [t, char, correct]
+                for t, char, correct in decode_chunk(data)
+                if t >= from_ms and (to_ms is None or t <= to_ms)
+            ]
+            if keystrokes:
+                yield json.dumps({"keystrokes": keystrokes}) + "\n"
+
+
+@router.get("/{session_id}/replay")
+async def replay_session(
+    session_id: UUID4,
+    from_ms: int = Query(0, ge=0, description="Seek: first keystroke offset to send"),
+    to_ms: Optional[int] = Query(None, ge=0, description="Last keystroke offset to send"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """Stream a session's keystrokes in time order for replay / ghost playback (owner or admin only)"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    raw = TypingSession.raw_keystrokes_json
+    res = await db.execute(
+        select(
+            TypingSession.user_id,
+            TypingSession.started_at,
+            raw["encoding"].as_string(),
+            raw["count"].as_integer(),
+            raw["index"],
+        ).where(TypingSession.id == session_id)
+    )
+    row = res.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    owner_id, started_at, encoding, count, index = row
+    # Keystroke timing is per-user data, same rule as other users' scores
+    if owner_id != current_user.id and current_user.role not in [UserRole.SUPER_ADMIN, UserRole.ORG_ADMIN]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if encoding == CHUNKED_ENCODING:
+        # Seek with the chunk index; later chunks stop once past to_ms
+        parts = [
+            ("chunks", i)
+            for i in range(first_chunk_at(index, from_ms), len(index))
+            if to_ms is None or index[i][0] <= to_ms
+        ]
+    elif encoding == COMPACT_ENCODING:
+        parts = [("data",)]
+    else:
+        raise HTTPException(status_code=404, detail="No replay recorded for this session")
+    
+    header = {
+        "session_id": str(session_id),
+        "started_at": started_at.isoformat() if started_at else None,
+        "count": count,
+        "from_ms": from_ms,
+        "to_ms": to_ms,
+    }
+    return StreamingResponse(
+        _replay_lines(session_id, header, parts, from_ms, to_ms),
+        media_type="application/x-ndjson"
+    )
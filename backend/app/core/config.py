@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     JWT_SECRET: str = "your-super-secret-jwt-key"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    JWT_CACHE_SIZE: int = 10000  # Verified token payloads kept per worker
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str
@@ -44,6 +45,50 @@ class Settings(BaseSettings):
     PROGRESS_SAMPLE_SIZE: int = 10
     MIN_PROGRESS_SAMPLES: int = 3
     
+    # WebSocket
+    WS_METRICS_INTERVAL_SECONDS: float = 30.0  # Periodic metrics_update push
+    WS_METRICS_TICK_SECONDS: float = 1.0  # Metrics scheduler resolution
+    WS_LIVE_WINDOW_SECONDS: int = 10  # Sliding window for live / burst WPM
+    WS_KEYSTROKE_ACK_MODE: str = "batch"  # none, batch or sampled
+    WS_KEYSTROKE_ACK_SAMPLE_EVERY: int = 10  # Frames per ack in sampled mode
+    WS_KEYSTROKE_BATCH_MAX: int = 512  # Keystrokes accepted per keystroke_batch frame
+    WS_SEND_QUEUE_SIZE: int = 256  # Frames buffered per connection before eviction
+    WS_PING_INTERVAL_SECONDS: int = 30  # Ping connections silent for this long
+    WS_IDLE_TIMEOUT_SECONDS: int = 90  # Close connections silent for this long (half-open TCP)
+    WS_SESSION_IDLE_SECONDS: int = 900  # Drop sessions without keystrokes for this long
+    WS_REAP_INTERVAL_SECONDS: int = 10  # Idle sweep period
+    WS_MEMORY_BUDGET_MB: int = 512  # Session memory per worker before longest-idle eviction
+    WS_SESSION_BACKEND: str = "memory"  # memory or redis (required for multiple workers)
+    WS_SESSION_STATE_TTL_SECONDS: int = 1800  # How long a checkpoint survives without updates
+    WS_RESUME_GRACE_SECONDS: int = 300  # How long a dropped session can be resumed
+    WS_RACE_TICK_SECONDS: float = 0.5  # race_progress fan-out period
+    WS_ROOM_MAX_MEMBERS: int = 50  # Typists per race room
+    WS_MIN_SESSION_SECONDS: float = 5.0  # Shorter sessions are not persisted
+    WS_MIN_SESSION_CHARS: int = 10  # Nor are sessions with fewer typed characters
+    WS_MODE_GRACE_SECONDS: float = 2.0  # Keystrokes arriving this long after the mode ends still count
+    
+    # Article texts cached per worker for server-side keystroke checking
+    ARTICLE_CACHE_SIZE: int = 512
+    ARTICLE_CACHE_ALIAS_SECONDS: float = 30.0  # How long "latest version" and not-found lookups are reused
+    
+    # Write-behind persistence of sessions finished over WebSocket
+    SESSION_WRITE_BATCH_SIZE: int = 200  # Rows per multi-row INSERT
+    SESSION_WRITE_FLUSH_SECONDS: float = 1.0  # Max time a finished session waits
+    SESSION_WRITE_QUEUE_SIZE: int = 10000  # Pending sessions before falling back to HTTP submit
+    
+    # Materialized leaderboard snapshots (leaderboards table)
+    LEADERBOARD_SNAPSHOT_SECONDS: int = 60  # Refresh period; one worker refreshes per period
+    LEADERBOARD_SNAPSHOT_SIZE: int = 50  # Entries stored per (scope, category)
+    LEADERBOARD_CACHE_FRESH_SECONDS: int = 10  # Served as-is; also the Cache-Control max-age
+    LEADERBOARD_CACHE_STALE_SECONDS: int = 60  # Served stale while one background refresh runs
+    LEADERBOARD_CACHE_SIZE: int = 256  # Cached (scope, category, limit, window) responses per worker
+    
+    # WPM percentile sketches (merged across workers in Redis)
+    WPM_SKETCH_FLUSH_SECONDS: float = 10.0  # How often local increments are merged into Redis
+    WPM_SKETCH_CACHE_SECONDS: float = 30.0  # How long a worker reuses a merged sketch for reads
+    WPM_SKETCH_CACHE_SIZE: int = 64  # Merged (language, mode) sketches kept per worker
+    WPM_SKETCH_RESEED_SECONDS: int = 86400  # How often one worker rebuilds the sketches from scores
+    
     # Practice modes
     PRACTICE_DURATIONS: List[int] = [60, 180, 300, 600]  # 1, 3, 5, 10 minutes
     
@@ -0,0 +1,18 @@
+"""
+共用 Redis 連線
+"""
+import redis.asyncio as redis
+from app.core.config import settings
+
+redis_client = None
+
+async def get_redis_client():
+    """獲取 Redis 客戶端"""
+    global redis_client
+    if redis_client is None:
+        redis_client = await redis.from_url(
+            settings.REDIS_URL,
+            encoding="utf-8",
+            decode_responses=True
+        )
+    return redis_client
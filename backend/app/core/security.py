@@ -1,8 +1,12 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import hashlib
+import time
 from app.core.config import settings
+from app.services.monitoring import jwt_cache_lookups
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -31,17 +35,69 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     )
     return encoded_jwt
 
+class TokenCache:
+    """LRU of verified token payloads keyed by a digest of the token.
+    
+    Entries expire with the token's own ``exp`` claim, so a cached payload is
+    never served after jose would have rejected the token. Only successful
+    verifications are cached.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self._hit = jwt_cache_lookups.labels(result="hit")
+        self._miss = jwt_cache_lookups.labels(result="miss")
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+    
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self._hit.inc()
+                return dict(entry[1])
+            del self._entries[key]
+        self._miss.inc()
+        return None
+    
+    def put(self, token: str, payload: dict) -> None:
+        exp = payload.get("exp")
+        if not isinstance(exp, (int, float)) or self.capacity <= 0:
+            return
+        key = self._key(token)
+        self._entries[key] = (float(exp), dict(payload))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        self._entries.clear()
+
+token_cache = TokenCache(settings.JWT_CACHE_SIZE)
+
 def verify_token(token: str) -> Optional[dict]:
     """Verify JWT token and return payload"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(
             token, 
             settings.JWT_SECRET, 
             algorithms=[settings.JWT_ALGORITHM]
         )
-        return payload
     except JWTError:
         return None
+    token_cache.put(token, payload)
+    return payload
 
 def generate_guest_id(user_agent: str) -> str:
     """Generate guest ID from user agent"""
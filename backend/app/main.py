@@ -12,7 +12,10 @@ from app.core.database import engine, Base, AsyncSessionLocal
 from app.models.users import User, UserRole, AuthProvider
 from sqlalchemy import select
 from app.api import auth, articles, sessions, scores, leaderboard, admin, organizations, config, simple_articles, classrooms, group
-from app.ws.router import router as ws_router
+from app.ws.router import router as ws_router, manager as ws_manager
+from app.services.session_writer import session_writer
+from app.services.leaderboard_snapshots import leaderboard_snapshots
+from app.services.wpm_sketches import wpm_sketches
 
 # Configure structured logging
 structlog.configure(
@@ -124,6 +127,8 @@ async def startup_event():
     # Note: In production, use Alembic for database migrations
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    leaderboard_snapshots.start()
+    wpm_sketches.start()
     logger.info("TypeFlow API started successfully")
     # Promote configured admin emails to SUPER_ADMIN (create if missing)
     try:
@@ -151,5 +156,9 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down TypeFlow API...")
+    ws_manager.stop()
+    await session_writer.stop()
+    await leaderboard_snapshots.stop()
+    await wpm_sketches.stop()
     await engine.dispose()
     logger.info("TypeFlow API shut down complete")
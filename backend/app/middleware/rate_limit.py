@@ -5,22 +5,8 @@ import time
 from typing import Callable
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
-import redis.asyncio as redis
 from app.core.config import settings
-
-# 初始化 Redis 連線
-redis_client = None
-
-async def get_redis_client():
-    """獲取 Redis 客戶端"""
-    global redis_client
-    if redis_client is None:
-        redis_client = await redis.from_url(
-            settings.REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True
-        )
-    return redis_client
+from app.core.redis_client import get_redis_client
 
 
 class RateLimiter:
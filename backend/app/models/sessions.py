@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text, Enum, UUID, ForeignKey, JSON, Float
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text, Enum, UUID, ForeignKey, JSON, Float, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import uuid
@@ -19,7 +20,9 @@ class TypingSession(Base):
     ended_at = Column(DateTime(timezone=True), nullable=True)
     
     # Raw data
-    raw_keystrokes_json = Column(JSON, nullable=True)  # Detailed keystroke data
+    # jsonb so replays can slice single chunks without re-parsing the blob
+    raw_keystrokes_json = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # Detailed keystroke data
+    key_stats_json = Column(JSON, nullable=True)  # Per-key / digraph timing summary
     focus_blur_count = Column(Integer, default=0, nullable=False)
     
     # Relationships
@@ -57,14 +60,71 @@ class Score(Base):
     def __repr__(self):
         return f"<Score {self.wpm} WPM, {self.accuracy}% accuracy>"
 
+class LeaderboardScope(enum.Enum):
+    daily = 1
+    weekly = 2
+    monthly = 3
+    alltime = 4
+
 class LeaderboardEntry(Base):
     __tablename__ = "leaderboards"
+    __table_args__ = (
+        # One snapshot row per (scope, category), written by the snapshot job
+        Index("uq_leaderboards_scope_category", "scope", "category", unique=True),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    scope = Column(Enum(enum.Enum('Scope', 'daily weekly monthly alltime')), nullable=False)
+    scope = Column(Enum(LeaderboardScope, name="scope"), nullable=False)
     category = Column(String(20), nullable=False)  # overall, en, code, zh-TW, etc.
     rank_json = Column(JSON, nullable=False)  # Serialized ranking data
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     def __repr__(self):
-        return f"<LeaderboardEntry {self.scope.value} {self.category}>"
\ No newline at end of file
+        return f"<LeaderboardEntry {self.scope.value} {self.category}>"
+
+
+class UserBestScore(Base):
+    __tablename__ = "user_best_scores"
+    __table_args__ = (
+        # Top-N and keyset pages per (period, language, mode) are a backward scan of this index
+        Index(
+            "idx_user_best_scores_keyset",
+            "period", "language", "mode_seconds", "bucket", "wpm", "accuracy", "achieved_at", "user_id",
+        ),
+    )
+    
+    # One row per user, language and mode for each period; language "overall" and
+    # mode_seconds 0 hold the best across all languages / modes
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    language = Column(String(10), primary_key=True)
+    mode_seconds = Column(Integer, primary_key=True)
+    period = Column(String(10), primary_key=True)  # daily, weekly, monthly, alltime
+    bucket = Column(String(8), nullable=False)  # Calendar bucket the best belongs to (20240131, 2024W05, 202401, all)
+    
+    score_id = Column(UUID(as_uuid=True), ForeignKey("scores.id"), nullable=False)
+    wpm = Column(Float, nullable=False)
+    accuracy = Column(Float, nullable=False)
+    achieved_at = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<UserBestScore {self.user_id} {self.language}/{self.mode_seconds}s {self.period}: {self.wpm} WPM>"
+
+class UserHourlyBestScore(Base):
+    __tablename__ = "user_hourly_best_scores"
+    __table_args__ = (
+        # Rolling windows read the hours of one language since a cut-off
+        Index("idx_user_hourly_best_scores_window", "language", "hour"),
+    )
+    
+    # Best score per user, language ("overall" included) and UTC hour
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    language = Column(String(10), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    
+    score_id = Column(UUID(as_uuid=True), ForeignKey("scores.id"), nullable=False)
+    wpm = Column(Float, nullable=False)
+    accuracy = Column(Float, nullable=False)
+    achieved_at = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<UserHourlyBestScore {self.user_id} {self.language} {self.hour}: {self.wpm} WPM>"
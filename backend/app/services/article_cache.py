@@ -0,0 +1,173 @@
+"""
+文章內容快取：以 (article_id, version) 為鍵的 LRU，存放預先解碼的 code point 陣列
+
+未指定版本或版本不存在的查詢，其解析結果（實際版本或查無文章）另外短暫快取，
+避免每次開始練習都查詢資料庫。查詢結果帶有實際解析出的版本，成績記錄的是
+實際比對的版本而非客戶端要求的版本。
+"""
+import asyncio
+import sys
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+import structlog
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.articles import Article, ArticleRevision, Language
+
+logger = structlog.get_logger()
+
+CacheKey = Tuple[str, int]
+RequestKey = Tuple[str, Optional[int]]
+Loader = Callable[[str, Optional[int]], Awaitable[Optional[Tuple[int, str, str]]]]
+
+
+class ArticleText(NamedTuple):
+    """實際解析出的版本、文章語言與其 code points"""
+
+    version: int
+    language: str
+    code_points: array
+
+
+def to_code_points(text: str) -> array:
+    """將文字轉為 uint32 code point 陣列，O(1) 依位置比對"""
+    code_points = array("I")
+    code_points.frombytes(text.replace("\r\n", "\n").encode("utf-32-le"))
+    if sys.byteorder != "little":
+        code_points.byteswap()
+    return code_points
+
+
+async def load_article_text(article_id: str, version: Optional[int]) -> Optional[Tuple[int, str, str]]:
+    """從資料庫讀取指定版本的文章內容，回傳 (version, content, language)"""
+    try:
+        article_uuid = uuid.UUID(str(article_id))
+    except ValueError:
+        return None
+
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(
+            select(Article.version, Article.content, Article.language).where(Article.id == article_uuid)
+        )
+        row = res.first()
+        if row is None:
+            return None
+        current_version, content, language = row
+        language = language.value if isinstance(language, Language) else language
+        if version is None or version == current_version:
+            return current_version, content, language
+
+        res = await db.execute(
+            select(ArticleRevision.content).where(
+                ArticleRevision.article_id == article_uuid,
+                ArticleRevision.version == version,
+            )
+        )
+        revision = res.scalar_one_or_none()
+        if revision is None:
+            # 找不到舊版本時以目前內容為準
+            return current_version, content, language
+        return version, revision, language
+
+
+class ArticleTextCache:
+    """每個 worker 一份的 LRU；同一篇文章同時只會查詢一次資料庫
+
+    ``alias_ttl`` 秒內，最新版本（version 為 None）與未知版本的查詢沿用上次解析出的版本，
+    查無文章的結果也同樣保留。
+    """
+
+    def __init__(self, capacity: int, loader: Loader = load_article_text, alias_ttl: float = 30.0):
+        self.capacity = capacity
+        self.loader = loader
+        self.alias_ttl = alias_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, ArticleText]" = OrderedDict()
+        # 查詢鍵 -> (到期時間, 解析出的版本；None 表示查無文章)
+        self._aliases: "OrderedDict[RequestKey, Tuple[float, Optional[int]]]" = OrderedDict()
+        self._inflight: Dict[RequestKey, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cached(self, request: RequestKey) -> Tuple[bool, Optional[ArticleText]]:
+        """回傳 (是否命中, 文章內容)；命中且為 None 表示近期查無此文章"""
+        key = request
+        alias = self._aliases.get(request)
+        if alias is not None:
+            expires_at, resolved = alias
+            if expires_at <= time.monotonic():
+                del self._aliases[request]
+            elif resolved is None:
+                return True, None
+            else:
+                key = (request[0], resolved)
+        if key[1] is None:
+            return False, None
+        text = self._entries.get(key)
+        if text is None:
+            return False, None
+        self._entries.move_to_end(key)
+        return True, text
+
+    async def get(self, article_id: str, version: Optional[int] = None) -> Optional[ArticleText]:
+        request = (str(article_id), version)
+        hit, text = self._cached(request)
+        if hit:
+            self.hits += 1
+            return text
+
+        self.misses += 1
+        future = self._inflight.get(request)
+        if future is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[request] = future
+        try:
+            text = await self._load(request)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            # 已回報給等待者，避免未取用例外的警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[request]
+
+    async def _load(self, request: RequestKey) -> Optional[ArticleText]:
+        article_id, version = request
+        loaded = await self.loader(article_id, version)
+        if loaded is None:
+            self._alias(request, None)
+            return None
+        loaded_version, content, language = loaded
+        text = self.put(article_id, loaded_version, language, to_code_points(content))
+        if loaded_version != version:
+            self._alias(request, loaded_version)
+        return text
+
+    def _alias(self, request: RequestKey, resolved: Optional[int]) -> None:
+        self._aliases[request] = (time.monotonic() + self.alias_ttl, resolved)
+        self._aliases.move_to_end(request)
+        while len(self._aliases) > self.capacity:
+            self._aliases.popitem(last=False)
+
+    def put(self, article_id: str, version: int, language: str, code_points: array) -> ArticleText:
+        key = (str(article_id), version)
+        text = self._entries[key] = ArticleText(version, language, code_points)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return text
+
+
+article_cache = ArticleTextCache(settings.ARTICLE_CACHE_SIZE, alias_ttl=settings.ARTICLE_CACHE_ALIAS_SECONDS)
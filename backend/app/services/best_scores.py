@@ -0,0 +1,330 @@
+"""
+每位使用者的最佳成績表（user_best_scores），於寫入成績時 upsert
+
+主鍵為 (user_id, language, mode_seconds, period)，每列記錄所屬的日曆時間桶；
+時間桶切換後第一筆成績直接覆蓋舊列，讀取時只取目前時間桶。language 為
+"overall"、mode_seconds 為 0 的列代表跨語言 / 跨模式的最佳成績。
+排行榜的「每人最佳」因此是索引查詢，不需掃描 scores。
+
+另以 user_hourly_best_scores 保存每小時的每人最佳成績（保留 31 天）；
+滾動視窗（最近 24 / 168 / 720 小時）合併視窗內的小時摘要，成本只取決於
+使用者數與小時數，與視窗內的成績筆數無關。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import structlog
+from sqlalchemy import and_, delete, desc, func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sessions import Score, TypingSession, UserBestScore, UserHourlyBestScore
+from app.models.users import User
+from app.services.leaderboard_store import OVERALL, SCOPES, bucket_for
+
+logger = structlog.get_logger()
+
+ALL_MODES = 0
+
+_UPDATED_COLUMNS = ("bucket", "score_id", "wpm", "accuracy", "achieved_at")
+_HOURLY_UPDATED_COLUMNS = ("score_id", "wpm", "accuracy", "achieved_at")
+
+# 滾動視窗涵蓋的小時數（含目前這一小時）
+ROLLING_HOURS = {"daily": 24, "weekly": 168, "monthly": 720}
+HOURLY_RETENTION = timedelta(days=31)
+
+
+def hour_of(when: datetime) -> datetime:
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def best_rows(
+    user_id: UUID,
+    score_id: UUID,
+    language: str,
+    mode_seconds: int,
+    wpm: float,
+    accuracy: float,
+    achieved_at: datetime,
+) -> List[dict]:
+    """一筆成績對應的候選列：各週期 × (語言, overall) × (模式, 全部)"""
+    if wpm <= 0 or accuracy <= 0:
+        return []
+    rows = []
+    for period in SCOPES:
+        bucket = bucket_for(period, achieved_at)
+        for category in {language, OVERALL}:
+            for mode in {mode_seconds, ALL_MODES}:
+                rows.append({
+                    "user_id": user_id,
+                    "language": category,
+                    "mode_seconds": mode,
+                    "period": period,
+                    "bucket": bucket,
+                    "score_id": score_id,
+                    "wpm": wpm,
+                    "accuracy": accuracy,
+                    "achieved_at": achieved_at,
+                })
+    return rows
+
+
+def _reduce(rows: Iterable[dict]) -> List[dict]:
+    """同一主鍵只保留最新時間桶中的最佳成績（同一批 INSERT 不能更新同一列兩次）"""
+    best: Dict[Tuple, dict] = {}
+    for row in rows:
+        key = (row["user_id"], row["language"], row["mode_seconds"], row["period"])
+        current = best.get(key)
+        if current is None or (row["bucket"], row["wpm"], row["accuracy"]) > (
+            current["bucket"], current["wpm"], current["accuracy"]
+        ):
+            best[key] = row
+    return list(best.values())
+
+
+def _hourly(rows: Iterable[dict]) -> List[dict]:
+    """由候選列取出每個 (使用者, 語言, 小時) 的最佳成績"""
+    best: Dict[Tuple, dict] = {}
+    for row in rows:
+        if row["period"] != "alltime" or row["mode_seconds"] != ALL_MODES:
+            continue
+        hour = hour_of(row["achieved_at"])
+        key = (row["user_id"], row["language"], hour)
+        current = best.get(key)
+        if current is None or (row["wpm"], row["accuracy"]) > (current["wpm"], current["accuracy"]):
+            best[key] = {
+                "user_id": row["user_id"],
+                "language": row["language"],
+                "hour": hour,
+                "score_id": row["score_id"],
+                "wpm": row["wpm"],
+                "accuracy": row["accuracy"],
+                "achieved_at": row["achieved_at"],
+            }
+    return list(best.values())
+
+
+class BestScoreTable:
+    """user_best_scores 的寫入與查詢"""
+
+    async def record(self, db: AsyncSession, rows: Iterable[dict]) -> None:
+        """upsert 候選列與每小時最佳；只在進入較新的時間桶或成績更好時覆蓋，呼叫端負責 commit"""
+        rows = list(rows)
+        if not rows:
+            return
+        await self._record_hourly(db, _hourly(rows))
+        rows = _reduce(rows)
+        table = UserBestScore
+        statement = insert(table)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.user_id, table.language, table.mode_seconds, table.period],
+            set_={column: excluded[column] for column in _UPDATED_COLUMNS},
+            where=or_(
+                # 延遲寫入的舊時間桶成績不可蓋掉較新的時間桶
+                excluded.bucket > table.bucket,
+                and_(
+                    excluded.bucket == table.bucket,
+                    or_(
+                        table.wpm < excluded.wpm,
+                        and_(table.wpm == excluded.wpm, table.accuracy < excluded.accuracy),
+                    ),
+                ),
+            ),
+        )
+        await db.execute(statement, rows)
+
+    async def _record_hourly(self, db: AsyncSession, rows: List[dict]) -> None:
+        table = UserHourlyBestScore
+        statement = insert(table)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.user_id, table.language, table.hour],
+            set_={column: excluded[column] for column in _HOURLY_UPDATED_COLUMNS},
+            where=or_(
+                table.wpm < excluded.wpm,
+                and_(table.wpm == excluded.wpm, table.accuracy < excluded.accuracy),
+            ),
+        )
+        await db.execute(statement, rows)
+
+    async def rebuild_user(self, db: AsyncSession, user_id: UUID) -> None:
+        """依 scores 重算使用者的所有最佳成績（管理員修改或作廢分數後）"""
+        await db.execute(delete(UserBestScore).where(UserBestScore.user_id == user_id))
+        await db.execute(delete(UserHourlyBestScore).where(UserHourlyBestScore.user_id == user_id))
+        result = await db.execute(
+            select(Score.id, Score.language, TypingSession.mode_seconds, Score.wpm, Score.accuracy, Score.created_at)
+            .join(TypingSession, Score.session_id == TypingSession.id)
+            .where(TypingSession.user_id == user_id, Score.is_void == False)
+        )
+        rows = []
+        for score_id, language, mode_seconds, wpm, accuracy, created_at in result.all():
+            rows.extend(best_rows(user_id, score_id, language, mode_seconds, wpm, accuracy, created_at or datetime.utcnow()))
+        await self.record(db, rows)
+
+    @staticmethod
+    def _key():
+        """排名順序的列值（與 _ranked 的排序相同），供 keyset 比較"""
+        return tuple_(UserBestScore.wpm, UserBestScore.accuracy, UserBestScore.achieved_at, UserBestScore.user_id)
+
+    def _ranked(self, period: str, language: str, mode_seconds: int, now: datetime):
+        return (
+            select(
+                UserBestScore.wpm,
+                UserBestScore.accuracy,
+                UserBestScore.achieved_at,
+                UserBestScore.user_id,
+                User.display_name,
+                User.picture,
+            )
+            .join(User, User.id == UserBestScore.user_id)
+            .where(
+                UserBestScore.period == period,
+                UserBestScore.language == language,
+                UserBestScore.mode_seconds == mode_seconds,
+                UserBestScore.bucket == bucket_for(period, now),
+            )
+            .order_by(
+                desc(UserBestScore.wpm),
+                desc(UserBestScore.accuracy),
+                desc(UserBestScore.achieved_at),
+                desc(UserBestScore.user_id),
+            )
+        )
+
+    async def top(
+        self,
+        db: AsyncSession,
+        period: str,
+        language: str,
+        limit: int,
+        now: Optional[datetime] = None,
+        mode_seconds: int = ALL_MODES,
+    ) -> List[tuple]:
+        """前 ``limit`` 名 (wpm, accuracy, achieved_at, user_id, display_name, picture)"""
+        query = self._ranked(period, language, mode_seconds, now or datetime.utcnow()).limit(limit)
+        return list((await db.execute(query)).all())
+
+    async def page(
+        self,
+        db: AsyncSession,
+        period: str,
+        language: str,
+        limit: int,
+        after: Optional[Tuple[float, float, datetime, UUID]] = None,
+        now: Optional[datetime] = None,
+        mode_seconds: int = ALL_MODES,
+    ) -> List[tuple]:
+        """``after``（上一頁最後一列的 wpm, accuracy, achieved_at, user_id）之後的 ``limit`` 列
+
+        以列值比較在排名索引上定位，任何深度的頁面成本都與第一頁相同；欄位同 ``top``。
+        """
+        query = self._ranked(period, language, mode_seconds, now or datetime.utcnow())
+        if after is not None:
+            query = query.where(self._key() < tuple_(*after))
+        return list((await db.execute(query.limit(limit))).all())
+
+    async def rolling_top(
+        self, db: AsyncSession, period: str, language: str, limit: int, now: Optional[datetime] = None
+    ) -> List[tuple]:
+        """最近 ``ROLLING_HOURS[period]`` 小時的前 ``limit`` 名，欄位同 ``top``"""
+        hours = ROLLING_HOURS[period]
+        since = hour_of(now or datetime.utcnow()) - timedelta(hours=hours - 1)
+        table = UserHourlyBestScore
+        ranked = (
+            select(
+                table.wpm,
+                table.accuracy,
+                table.achieved_at,
+                table.user_id,
+                func.row_number().over(
+                    partition_by=table.user_id,
+                    order_by=(desc(table.wpm), desc(table.accuracy), desc(table.achieved_at)),
+                ).label("best"),
+            )
+            .where(table.language == language, table.hour >= since)
+            .subquery()
+        )
+        query = (
+            select(ranked.c.wpm, ranked.c.accuracy, ranked.c.achieved_at, ranked.c.user_id, User.display_name, User.picture)
+            .join(User, User.id == ranked.c.user_id)
+            .where(ranked.c.best == 1)
+            .order_by(desc(ranked.c.wpm), desc(ranked.c.accuracy), desc(ranked.c.achieved_at))
+            .limit(limit)
+        )
+        return list((await db.execute(query)).all())
+
+    async def prune_hourly(self, db: AsyncSession, now: Optional[datetime] = None) -> None:
+        """刪除超過保留期的小時摘要，呼叫端負責 commit"""
+        cutoff = hour_of(now or datetime.utcnow()) - HOURLY_RETENTION
+        await db.execute(delete(UserHourlyBestScore).where(UserHourlyBestScore.hour < cutoff))
+
+    async def rank_of(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        period: str,
+        language: str,
+        neighbours: int,
+        now: Optional[datetime] = None,
+        mode_seconds: int = ALL_MODES,
+    ) -> Tuple[Optional[int], int, List[tuple]]:
+        """Redis 不可用時的名次查詢：名次與鄰居都以 (wpm, accuracy, achieved_at, user_id) 的列值比較定位
+
+        名次為排序鍵嚴格大於自己的列數 + 1，鄰居為排名索引上自己前後各 ``neighbours`` 列，
+        兩者的同分處理一致且不需 OFFSET。回傳 (名次或 None, 上榜人數, 前後鄰居列)；
+        鄰居列欄位同 ``top``。
+        """
+        now = now or datetime.utcnow()
+        bucket = bucket_for(period, now)
+        same_board = and_(
+            UserBestScore.period == period,
+            UserBestScore.language == language,
+            UserBestScore.mode_seconds == mode_seconds,
+            UserBestScore.bucket == bucket,
+        )
+        total = (await db.execute(select(func.count()).select_from(UserBestScore).where(same_board))).scalar() or 0
+        mine = (await db.execute(
+            select(UserBestScore.wpm, UserBestScore.accuracy, UserBestScore.achieved_at, UserBestScore.user_id)
+            .where(same_board, UserBestScore.user_id == user_id)
+        )).first()
+        if mine is None:
+            return None, total, []
+        key, mine = self._key(), tuple_(*mine)
+        ahead = (await db.execute(
+            select(func.count()).select_from(UserBestScore).where(same_board, key > mine)
+        )).scalar() or 0
+        ranked = self._ranked(period, language, mode_seconds, now)
+        # 前方鄰居：由自己往上反向掃描
+        above = ranked.where(key > mine).order_by(None).order_by(
+            UserBestScore.wpm, UserBestScore.accuracy, UserBestScore.achieved_at, UserBestScore.user_id
+        ).limit(neighbours)
+        below = ranked.where(key <= mine).limit(neighbours + 1)
+        rows = list(reversed((await db.execute(above)).all())) + list((await db.execute(below)).all())
+        return ahead + 1, total, rows
+
+    async def for_users(
+        self,
+        db: AsyncSession,
+        user_ids: Sequence[UUID],
+        period: str = "alltime",
+        language: str = OVERALL,
+        now: Optional[datetime] = None,
+        mode_seconds: int = ALL_MODES,
+    ) -> List[tuple]:
+        """指定使用者的最佳成績，依名次排序；欄位同 ``top``"""
+        query = self._ranked(period, language, mode_seconds, now or datetime.utcnow())
+        return list((await db.execute(query.where(UserBestScore.user_id.in_(user_ids)))).all())
+
+    async def languages(self, db: AsyncSession) -> List[str]:
+        """已有成績的語言"""
+        result = await db.execute(
+            select(UserBestScore.language)
+            .where(UserBestScore.period == "alltime", UserBestScore.mode_seconds == ALL_MODES)
+            .distinct()
+        )
+        return sorted(language for (language,) in result.all() if language != OVERALL)
+
+
+best_scores = BestScoreTable()
@@ -0,0 +1,218 @@
+"""
+排行榜快照：定期計算每個 (scope, category) 的前 N 名，寫入 leaderboards.rank_json
+
+資料庫只在每個刷新週期做一次排名查詢，API 讀取時只需依唯一索引取一列。
+時間窗與 Redis 排行榜相同，採 UTC 日曆週期；每人最佳成績取自 user_best_scores。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+import structlog
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis_client
+from app.models.sessions import LeaderboardEntry, LeaderboardScope
+from app.services.best_scores import best_scores
+from app.services.leaderboard_store import OVERALL, SCOPES, bucket_for, leaderboard_store
+from app.services.monitoring import leaderboard_snapshot_duration
+
+logger = structlog.get_logger()
+
+# 種入 Redis 排行榜時每次讀取的列數
+SEED_BATCH = 1000
+
+
+async def top_scores(db: AsyncSession, scope: str, category: str, limit: int, now: datetime) -> List[dict]:
+    """每位使用者在目前時間桶內的最佳成績，取前 ``limit`` 名（user_best_scores 索引查詢）"""
+    rows = await best_scores.top(db, scope, category, limit, now)
+    return _entries(rows, 1, now)
+
+
+async def page_scores(
+    db: AsyncSession,
+    scope: str,
+    category: str,
+    limit: int,
+    after: Optional[Tuple[float, float, datetime, UUID]],
+    first_rank: int,
+    now: datetime,
+) -> List[dict]:
+    """排行榜中 ``after`` 之後的 ``limit`` 名（keyset 分頁），名次自 ``first_rank`` 起算"""
+    rows = await best_scores.page(db, scope, category, limit, after, now)
+    return _entries(rows, first_rank, now)
+
+
+async def rolling_scores(db: AsyncSession, scope: str, category: str, limit: int, now: datetime) -> List[dict]:
+    """最近 24 / 168 / 720 小時內每位使用者的最佳成績（合併每小時摘要）"""
+    rows = await best_scores.rolling_top(db, scope, category, limit, now)
+    return _entries(rows, 1, now)
+
+
+async def rank_around(
+    db: AsyncSession, scope: str, category: str, user_id: UUID, neighbours: int, now: datetime
+) -> Tuple[Optional[int], int, List[dict]]:
+    """使用者名次、上榜人數與前後鄰居（Redis 不可用時的 SQL 版本）"""
+    rank, total, rows = await best_scores.rank_of(db, user_id, scope, category, neighbours, now)
+    if rank is None:
+        return None, total, []
+    return rank, total, _entries(rows, max(1, rank - neighbours), now)
+
+
+def _utc(when: datetime) -> datetime:
+    """timestamptz 欄位讀回的是 aware 時間，SQLite 與 utcnow() 則是 naive（視為 UTC）"""
+    return when.replace(tzinfo=timezone.utc) if when.tzinfo is None else when
+
+
+def _entries(rows: List[tuple], first_rank: int, now: datetime) -> List[dict]:
+    return [
+        {
+            "rank": rank,
+            "user_id": str(user_id),
+            "display_name": display_name,
+            "picture": picture,
+            "wpm": float(wpm),
+            "accuracy": float(accuracy),
+            "date": (achieved_at or now).isoformat(),
+        }
+        for rank, (wpm, accuracy, achieved_at, user_id, display_name, picture) in enumerate(rows, first_rank)
+    ]
+
+
+class LeaderboardSnapshotJob:
+    """背景任務：每 ``interval`` 秒重建所有快照
+
+    多個 worker 時以 Redis ``SET NX EX`` 取得本週期的刷新權；Redis 無法連線時
+    各 worker 各自刷新，upsert 結果相同。
+    """
+
+    def __init__(self, interval: int, size: int, lock_key: str = "lb:snapshot:lock"):
+        self.interval = interval
+        self.size = size
+        self.lock_key = lock_key
+        self.refreshed_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def categories(self, db: AsyncSession) -> List[str]:
+        return [OVERALL] + await best_scores.languages(db)
+
+    async def refresh(self, db: AsyncSession, now: Optional[datetime] = None) -> int:
+        """重建所有 (scope, category) 快照，回傳寫入的列數"""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        rows = []
+        for category in await self.categories(db):
+            for scope in SCOPES:
+                entries = await top_scores(db, scope, category, self.size, now)
+                rows.append({
+                    "scope": LeaderboardScope[scope],
+                    "category": category,
+                    "rank_json": {
+                        "bucket": bucket_for(scope, now),
+                        "generated_at": now.isoformat(),
+                        "entries": entries,
+                    },
+                    "updated_at": _utc(now),
+                })
+
+        statement = insert(LeaderboardEntry)
+        statement = statement.on_conflict_do_update(
+            index_elements=[LeaderboardEntry.scope, LeaderboardEntry.category],
+            set_={"rank_json": statement.excluded.rank_json, "updated_at": statement.excluded.updated_at},
+        )
+        await db.execute(statement, rows)
+        await best_scores.prune_hourly(db, now)
+        await db.commit()
+        self.refreshed_at = now
+        leaderboard_snapshot_duration.observe(time.perf_counter() - started)
+        logger.debug("Leaderboard snapshots refreshed", count=len(rows))
+        return len(rows)
+
+    async def seed_store(self, db: AsyncSession, now: Optional[datetime] = None) -> int:
+        """由 user_best_scores 種入尚未種入的 Redis 排行榜（首次部署、新時間桶或新語言），回傳種入的 key 數"""
+        now = now or datetime.utcnow()
+        seeded = 0
+        for category in await self.categories(db):
+            for scope in SCOPES:
+                if await leaderboard_store.is_seeded(scope, category, now):
+                    continue
+                after = None
+                while True:
+                    rows = await best_scores.page(db, scope, category, SEED_BATCH, after, now)
+                    await leaderboard_store.seed(
+                        scope, category, [(user_id, wpm, accuracy, achieved_at) for wpm, accuracy, achieved_at, user_id, *_ in rows], now
+                    )
+                    if len(rows) < SEED_BATCH:
+                        break
+                    after = tuple(rows[-1][:4])
+                await leaderboard_store.mark_seeded(scope, category, now)
+                seeded += 1
+        if seeded:
+            logger.info("Leaderboard store seeded", keys=seeded)
+        return seeded
+
+    async def load(self, db: AsyncSession, scope: str, category: str, now: Optional[datetime] = None) -> Optional[List[dict]]:
+        """讀取快照；時間桶已切換或刷新停擺過久時回傳 None，由呼叫端改用即時查詢"""
+        now = _utc(now or datetime.now(timezone.utc))
+        result = await db.execute(
+            select(LeaderboardEntry.rank_json, LeaderboardEntry.updated_at).where(
+                LeaderboardEntry.scope == LeaderboardScope[scope],
+                LeaderboardEntry.category == category,
+            )
+        )
+        row = result.first()
+        if row is None:
+            return None
+        rank_json, updated_at = row
+        if not rank_json or rank_json.get("bucket") != bucket_for(scope, now):
+            return None
+        if updated_at is not None and _utc(updated_at) < now - timedelta(seconds=3 * self.interval):
+            return None
+        return rank_json.get("entries", [])
+
+    async def _acquire(self) -> bool:
+        try:
+            client = await get_redis_client()
+            return bool(await client.set(self.lock_key, "1", nx=True, ex=self.interval))
+        except Exception as e:
+            logger.debug("Leaderboard snapshot lock unavailable", error=str(e))
+            return True
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._acquire():
+                    async with AsyncSessionLocal() as db:
+                        await self.refresh(db)
+                        try:
+                            await self.seed_store(db)
+                        except Exception as e:
+                            logger.warning("Leaderboard store seeding failed", error=str(e))
+            except Exception as e:
+                logger.warning("Leaderboard snapshot refresh failed", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+leaderboard_snapshots = LeaderboardSnapshotJob(
+    interval=settings.LEADERBOARD_SNAPSHOT_SECONDS,
+    size=settings.LEADERBOARD_SNAPSHOT_SIZE,
+)
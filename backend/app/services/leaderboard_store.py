@@ -0,0 +1,263 @@
+"""
+Redis 有序集合排行榜：每個 (scope, category, 時間桶) 一個 ZSET，成員為 user_id
+
+daily / weekly / monthly 依 UTC 日曆切換 key（20240131、2024W05、202401），
+舊 key 由 TTL 回收，不需要清除工作；alltime 只有一個 key。
+
+寫入路徑只記錄新成績，因此每個 key 需先由 user_best_scores 種入一次（見
+LeaderboardSnapshotJob.seed_store），完成後才有 ``<key>:seeded`` 標記；沒有標記的
+key 讀取時回傳 None，由呼叫端改用資料庫。
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import structlog
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis_client import get_redis_client
+from app.models.sessions import Score, TypingSession
+
+logger = structlog.get_logger()
+
+SCOPES = ("daily", "weekly", "monthly", "alltime")
+OVERALL = "overall"
+
+# 時間桶過期後仍保留一段時間，方便查詢剛結束的週期
+SCOPE_TTL = {
+    "daily": 3 * 86400,
+    "weekly": 15 * 86400,
+    "monthly": 62 * 86400,
+    "alltime": 0,
+}
+
+# 分數編碼：wpm 與 accuracy 各取兩位小數，wpm 優先、accuracy 次之
+_ACCURACY_SPAN = 100000
+
+# 只有在新成績較佳時才更新，並同步更新明細與 TTL
+_RECORD_BEST = """
+local current = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if (not current) or tonumber(ARGV[2]) > tonumber(current) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+end
+if ARGV[4] ~= '0' then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    redis.call('EXPIRE', KEYS[2], ARGV[4])
+end
+return 1
+"""
+
+
+def encode_score(wpm: float, accuracy: float) -> int:
+    return int(round(wpm * 100)) * _ACCURACY_SPAN + int(round(accuracy * 100))
+
+
+def decode_score(value: float) -> Tuple[float, float]:
+    wpm, accuracy = divmod(int(value), _ACCURACY_SPAN)
+    return wpm / 100, accuracy / 100
+
+
+def bucket_start(scope: str, when: datetime) -> Optional[datetime]:
+    """時間桶起點（UTC）；alltime 為 None"""
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    if scope == "daily":
+        return day
+    if scope == "weekly":
+        return day - timedelta(days=day.weekday())
+    if scope == "monthly":
+        return day.replace(day=1)
+    return None
+
+
+def bucket_for(scope: str, when: datetime) -> str:
+    if scope == "daily":
+        return when.strftime("%Y%m%d")
+    if scope == "weekly":
+        year, week, _ = when.isocalendar()
+        return f"{year}W{week:02d}"
+    if scope == "monthly":
+        return when.strftime("%Y%m")
+    return "all"
+
+
+class LeaderboardStore:
+    """寫入時增量更新、讀取時 O(log n + k) 的排行榜"""
+
+    def __init__(self, prefix: str = "lb"):
+        self.prefix = prefix
+        self._script = None
+
+    def key(self, scope: str, category: str, when: datetime) -> str:
+        return f"{self.prefix}:{scope}:{category}:{bucket_for(scope, when)}"
+
+    def details_key(self, key: str) -> str:
+        return f"{key}:details"
+
+    def seeded_key(self, key: str) -> str:
+        return f"{key}:seeded"
+
+    @property
+    def users_key(self) -> str:
+        return f"{self.prefix}:users"
+
+    async def _record_script(self):
+        if self._script is None:
+            client = await get_redis_client()
+            self._script = client.register_script(_RECORD_BEST)
+        return self._script
+
+    async def record_many(self, scores: Iterable[Tuple[str, str, float, float, datetime]]) -> None:
+        """寫入多筆 (user_id, language, wpm, accuracy, created_at)，單一 pipeline"""
+        scores = [s for s in scores if s[0] and s[2] > 0 and s[3] > 0]
+        if not scores:
+            return
+        client = await get_redis_client()
+        script = await self._record_script()
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id, language, wpm, accuracy, created_at in scores:
+                detail = json.dumps({"date": created_at.isoformat()})
+                value = encode_score(wpm, accuracy)
+                for scope in SCOPES:
+                    for category in (OVERALL, language):
+                        key = self.key(scope, category, created_at)
+                        await script(
+                            keys=[key, self.details_key(key)],
+                            args=[str(user_id), value, detail, SCOPE_TTL[scope]],
+                            client=pipe,
+                        )
+            await pipe.execute()
+
+    async def record(self, user_id: str, language: str, wpm: float, accuracy: float, created_at: datetime) -> None:
+        await self.record_many([(user_id, language, wpm, accuracy, created_at)])
+
+    async def is_seeded(self, scope: str, category: str, now: Optional[datetime] = None) -> bool:
+        client = await get_redis_client()
+        return bool(await client.exists(self.seeded_key(self.key(scope, category, now or datetime.utcnow()))))
+
+    async def seed(
+        self, scope: str, category: str, rows: Iterable[Tuple[str, float, float, datetime]], now: Optional[datetime] = None
+    ) -> None:
+        """把 (user_id, wpm, accuracy, achieved_at) 寫入目前時間桶；與寫入路徑相同只保留較佳成績"""
+        rows = list(rows)
+        if not rows:
+            return
+        now = now or datetime.utcnow()
+        key = self.key(scope, category, now)
+        client = await get_redis_client()
+        script = await self._record_script()
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id, wpm, accuracy, achieved_at in rows:
+                await script(
+                    keys=[key, self.details_key(key)],
+                    args=[str(user_id), encode_score(wpm, accuracy), json.dumps({"date": (achieved_at or now).isoformat()}), SCOPE_TTL[scope]],
+                    client=pipe,
+                )
+            await pipe.execute()
+
+    async def mark_seeded(self, scope: str, category: str, now: Optional[datetime] = None) -> None:
+        key = self.key(scope, category, now or datetime.utcnow())
+        client = await get_redis_client()
+        await client.set(self.seeded_key(key), "1", ex=SCOPE_TTL[scope] or None)
+
+    async def remember_users(self, users: Dict[str, dict]) -> None:
+        """快取排行榜顯示用的使用者名稱與頭像"""
+        if not users:
+            return
+        client = await get_redis_client()
+        await client.hset(self.users_key, mapping={k: json.dumps(v) for k, v in users.items()})
+
+    async def top(self, scope: str, category: str, limit: int, now: Optional[datetime] = None) -> Optional[List[dict]]:
+        """前 ``limit`` 名；尚未種入時為 None，使用者資料未快取時 display_name 為 None"""
+        key = self.key(scope, category, now or datetime.utcnow())
+        client = await get_redis_client()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.exists(self.seeded_key(key))
+            pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            seeded, members = await pipe.execute()
+        if not seeded:
+            return None
+        return await self._entries(client, key, members, 1)
+
+    async def rank_of(
+        self, scope: str, category: str, user_id: str, neighbours: int, now: Optional[datetime] = None
+    ) -> Optional[Tuple[Optional[int], int, List[dict]]]:
+        """使用者名次（1 起算，未上榜為 None）、上榜人數與前後各 ``neighbours`` 名；尚未種入時為 None
+
+        ZREVRANK 與 ZCARD 皆為 O(log n) / O(1)，不需計算領先人數。
+        """
+        key = self.key(scope, category, now or datetime.utcnow())
+        client = await get_redis_client()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.exists(self.seeded_key(key))
+            pipe.zrevrank(key, str(user_id))
+            pipe.zcard(key)
+            seeded, rank, total = await pipe.execute()
+        if not seeded:
+            return None
+        if rank is None:
+            return None, total, []
+        start = max(0, rank - neighbours)
+        members = await client.zrevrange(key, start, rank + neighbours, withscores=True)
+        return rank + 1, total, await self._entries(client, key, members, start + 1)
+
+    async def _entries(self, client, key: str, members: List[Tuple[str, float]], first_rank: int) -> List[dict]:
+        if not members:
+            return []
+        user_ids = [member for member, _ in members]
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.hmget(self.details_key(key), user_ids)
+            pipe.hmget(self.users_key, user_ids)
+            details, users = await pipe.execute()
+
+        entries = []
+        for rank, ((user_id, value), detail, user) in enumerate(zip(members, details, users), first_rank):
+            wpm, accuracy = decode_score(value)
+            user = json.loads(user) if user else {}
+            entries.append({
+                "rank": rank,
+                "user_id": user_id,
+                "display_name": user.get("display_name"),
+                "picture": user.get("picture"),
+                "wpm": wpm,
+                "accuracy": accuracy,
+                "date": json.loads(detail)["date"] if detail else None,
+            })
+        return entries
+
+    async def rebuild_user(self, db: AsyncSession, user_id: UUID, language: str, now: Optional[datetime] = None) -> None:
+        """依資料庫重算使用者在目前各時間桶的最佳成績（管理員修改或作廢分數後）"""
+        now = now or datetime.utcnow()
+        client = await get_redis_client()
+        async with client.pipeline(transaction=False) as pipe:
+            for scope in SCOPES:
+                start = bucket_start(scope, now)
+                for category in (OVERALL, language):
+                    query = (
+                        select(Score.wpm, Score.accuracy, Score.created_at)
+                        .join(TypingSession, Score.session_id == TypingSession.id)
+                        .where(TypingSession.user_id == user_id, Score.is_void == False, Score.wpm > 0, Score.accuracy > 0)
+                        .order_by(desc(Score.wpm), desc(Score.accuracy))
+                        .limit(1)
+                    )
+                    if start is not None:
+                        query = query.where(Score.created_at >= start)
+                    if category != OVERALL:
+                        query = query.where(Score.language == category)
+                    best = (await db.execute(query)).first()
+
+                    key = self.key(scope, category, now)
+                    member = str(user_id)
+                    if best is None:
+                        pipe.zrem(key, member)
+                        pipe.hdel(self.details_key(key), member)
+                        continue
+                    wpm, accuracy, created_at = best
+                    pipe.zadd(key, {member: encode_score(wpm, accuracy)})
+                    pipe.hset(self.details_key(key), member, json.dumps({"date": (created_at or now).isoformat()}))
+            await pipe.execute()
+
+
+leaderboard_store = LeaderboardStore()
@@ -47,6 +47,77 @@ accuracy_distribution = Histogram(
     buckets=[50, 60, 70, 80, 85, 90, 95, 98, 100]
 )
 
+# WebSocket 指標
+ws_send_queue_depth = Gauge(
+    'ws_send_queue_depth',
+    'Frames waiting in WebSocket send queues'
+)
+
+ws_send_queue_max_depth = Gauge(
+    'ws_send_queue_max_depth',
+    'Deepest single WebSocket send queue'
+)
+
+ws_slow_consumer_evictions = Counter(
+    'ws_slow_consumer_evictions_total',
+    'WebSocket connections closed because their send queue overflowed'
+)
+
+ws_session_evictions = Counter(
+    'ws_session_evictions_total',
+    'WebSocket sessions evicted by the reaper',
+    ['reason']
+)
+
+ws_messages_received = Counter(
+    'ws_messages_received_total',
+    'WebSocket messages received',
+    ['type']
+)
+
+ws_messages_sent = Counter(
+    'ws_messages_sent_total',
+    'WebSocket messages queued for sending',
+    ['type']
+)
+
+ws_handler_duration = Histogram(
+    'ws_handler_duration_seconds',
+    'WebSocket message handling time',
+    ['type'],
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1]
+)
+
+ws_send_duration = Histogram(
+    'ws_send_duration_seconds',
+    'Time to write one frame to a WebSocket',
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1]
+)
+
+ws_disconnects = Counter(
+    'ws_disconnects_total',
+    'WebSocket connections closed',
+    ['reason']
+)
+
+jwt_cache_lookups = Counter(
+    'jwt_cache_lookups_total',
+    'Verified JWT cache lookups',
+    ['result']
+)
+
+response_cache_lookups = Counter(
+    'response_cache_lookups_total',
+    'Cached HTTP response lookups (fresh, stale or miss) and 304 replies',
+    ['cache', 'result']
+)
+
+leaderboard_snapshot_duration = Histogram(
+    'leaderboard_snapshot_refresh_seconds',
+    'Time to rebuild every materialized leaderboard snapshot',
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+)
+
 error_count = Counter(
     'errors_total',
     'Total errors',
@@ -0,0 +1,144 @@
+"""
+已序列化回應的快取：版本戳記（ETag / Last-Modified）與 stale-while-revalidate
+
+每個 worker 一份 LRU。新鮮期內直接回傳；過期但仍在 stale 期內時回傳舊內容，
+並在背景重建（同一個鍵同時只有一個重建）；完全過期或未命中時才由請求等待重建。
+內容未變時沿用原本的 ETag 與 Last-Modified，客戶端的條件請求因此可持續得到 304。
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+
+import structlog
+
+from app.core.config import settings
+from app.services.monitoring import response_cache_lookups
+
+logger = structlog.get_logger()
+
+Builder = Callable[[], Awaitable[bytes]]
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "last_modified", "built_at")
+
+    def __init__(self, body: bytes, etag: str, last_modified: datetime, built_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.built_at = built_at
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """依條件請求標頭判斷是否可回 304；有 If-None-Match 時忽略 If-Modified-Since"""
+        if if_none_match is not None:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            # 弱比較：W/"x" 與 "x" 視為相同
+            return "*" in tags or self.etag in {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+
+class ResponseCache:
+    """``fresh`` 秒內直接回傳，之後 ``stale`` 秒內回傳舊內容並背景重建"""
+
+    def __init__(self, name: str, capacity: int, fresh: float, stale: float):
+        self.name = name
+        self.capacity = capacity
+        self.fresh = fresh
+        self.stale = stale
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._lookups = {
+            result: response_cache_lookups.labels(cache=name, result=result)
+            for result in ("fresh", "stale", "miss", "not_modified")
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Hashable, build: Builder) -> CachedResponse:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = time.monotonic() - entry.built_at
+            if age < self.fresh:
+                self._lookups["fresh"].inc()
+                return entry
+            if age < self.fresh + self.stale:
+                self._lookups["stale"].inc()
+                self._revalidate(key, build)
+                return entry
+        self._lookups["miss"].inc()
+        return await self._refresh(key, build)
+
+    def count_not_modified(self) -> None:
+        self._lookups["not_modified"].inc()
+
+    def _revalidate(self, key: Hashable, build: Builder) -> None:
+        if key in self._inflight:
+            return
+        task = asyncio.create_task(self._refresh(key, build))
+        self._tasks.add(task)
+        task.add_done_callback(self._revalidated)
+
+    def _revalidated(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # 重建失敗時繼續回傳舊內容，直到 stale 期結束
+            logger.warning("Cached response refresh failed", cache=self.name, error=str(task.exception()))
+
+    async def _refresh(self, key: Hashable, build: Builder) -> CachedResponse:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = self._store(key, await build())
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # 已回報給等待者，避免未取用例外的警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _store(self, key: Hashable, body: bytes) -> CachedResponse:
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        previous = self._entries.get(key)
+        if previous is not None and previous.etag == etag:
+            last_modified = previous.last_modified
+        else:
+            last_modified = datetime.now(timezone.utc)
+        entry = CachedResponse(body, etag, last_modified, time.monotonic())
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+leaderboard_cache = ResponseCache(
+    "leaderboard",
+    capacity=settings.LEADERBOARD_CACHE_SIZE,
+    fresh=settings.LEADERBOARD_CACHE_FRESH_SECONDS,
+    stale=settings.LEADERBOARD_CACHE_STALE_SECONDS,
+)
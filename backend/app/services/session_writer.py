@@ -0,0 +1,148 @@
+"""
+WebSocket 練習結果的延遲寫入（write-behind）服務
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import structlog
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.sessions import Score, TypingSession
+from app.services.best_scores import best_rows, best_scores
+from app.services.leaderboard_store import leaderboard_store
+from app.services.wpm_sketches import wpm_sketches
+
+logger = structlog.get_logger()
+
+
+class SessionWriter:
+    """將完成的練習排入佇列，由背景任務以多列 INSERT 批次寫入
+
+    每筆記錄為 ``{"session": {...}, "score": {...}}``，欄位對應
+    ``typing_sessions`` 與 ``scores``；主鍵由呼叫端預先產生，因此不需要
+    RETURNING 或逐筆 refresh。
+    """
+
+    def __init__(self, max_batch: int, flush_interval: float, max_queue: int):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.queue: "asyncio.Queue[Dict[str, dict]]" = asyncio.Queue(max_queue)
+        self.written = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[Dict[str, dict]] = []
+        self._flushing: Optional[asyncio.Future] = None
+
+    def enqueue(self, record: Dict[str, dict]) -> bool:
+        """排入一筆記錄；佇列已滿時回傳 False，讓客戶端改走 HTTP 提交"""
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Session write-behind queue full", queued=self.queue.qsize())
+            return False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            # 以 shield 保護，關閉時不會中斷寫到一半的批次
+            self._flushing = asyncio.ensure_future(self.flush(batch))
+            await asyncio.shield(self._flushing)
+
+    async def flush(self, batch: List[Dict[str, dict]]):
+        """一次交易內寫入整批；失敗時逐筆重試以隔離壞資料"""
+        if not batch:
+            return
+        try:
+            await self._insert(batch)
+            self.written += len(batch)
+            logger.debug("Session write-behind flushed", count=len(batch))
+            await self._publish(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self.dropped += 1
+                logger.error("Session write-behind failed", exc_info=e, session_id=str(batch[0]["session"]["id"]))
+                return
+            logger.warning("Session write-behind batch failed, retrying one by one", error=str(e), count=len(batch))
+        for record in batch:
+            await self.flush([record])
+
+    async def _publish(self, batch: List[Dict[str, dict]]):
+        """寫入成功後更新排行榜與 WPM 分布；失敗不影響已寫入的資料"""
+        try:
+            for r in batch:
+                wpm_sketches.add(r["score"]["language"], r["session"]["mode_seconds"], r["score"]["wpm"])
+            await leaderboard_store.record_many(
+                (str(r["session"]["user_id"]), r["score"]["language"], r["score"]["wpm"], r["score"]["accuracy"],
+                 self._ended_at(r["session"]))
+                for r in batch
+                if r["session"].get("user_id")
+            )
+        except Exception as e:
+            logger.warning("Leaderboard update failed", error=str(e), count=len(batch))
+
+    @staticmethod
+    def _ended_at(session: dict) -> datetime:
+        """排行榜與個人最佳皆以練習結束時間歸入時段，避免跨日寫入時兩邊不一致"""
+        return session.get("ended_at") or datetime.utcnow()
+
+    @staticmethod
+    def _best_rows(batch: List[Dict[str, dict]]) -> List[dict]:
+        rows = []
+        for r in batch:
+            session, score = r["session"], r["score"]
+            if session.get("user_id"):
+                rows.extend(best_rows(
+                    session["user_id"], score["id"], score["language"], session["mode_seconds"],
+                    score["wpm"], score["accuracy"], SessionWriter._ended_at(session),
+                ))
+        return rows
+
+    async def _insert(self, batch: List[Dict[str, dict]]):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(TypingSession), [r["session"] for r in batch])
+            await db.execute(insert(Score), [r["score"] for r in batch])
+            await best_scores.record(db, self._best_rows(batch))
+            await db.commit()
+
+    async def stop(self):
+        """停止背景任務並寫入剩餘的記錄"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+        pending, self._pending = self._pending, []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for start in range(0, len(pending), self.max_batch):
+            await self.flush(pending[start:start + self.max_batch])
+
+
+session_writer = SessionWriter(
+    max_batch=settings.SESSION_WRITE_BATCH_SIZE,
+    flush_interval=settings.SESSION_WRITE_FLUSH_SECONDS,
+    max_queue=settings.SESSION_WRITE_QUEUE_SIZE,
+)
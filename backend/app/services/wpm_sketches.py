@@ -0,0 +1,298 @@
+"""
+各語言 / 模式的 WPM 分位數 sketch（DDSketch 式對數分桶，相對誤差 1%）
+
+桶索引 i 涵蓋 (γ^(i-1), γ^i]，γ = (1+α)/(1-α)；兩個 sketch 合併只需逐桶相加，
+因此各 worker 把本地增量以 HINCRBY 累加到同一個 Redis hash 即完成合併。
+桶數只與 WPM 範圍有關（1~1000 WPM 約 350 桶），查詢「快過多少人」與分位數
+的成本與成績筆數無關。
+
+由 scores 重建期間持有鎖，合併增量的 Lua 腳本看到鎖就不寫入，增量留在本地
+待鎖釋放後再合併，不會被重建蓋掉。
+"""
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import Numeric, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis_client
+from app.models.sessions import Score, TypingSession
+from app.services.best_scores import ALL_MODES
+from app.services.leaderboard_store import OVERALL
+
+logger = structlog.get_logger()
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+SketchKey = Tuple[str, int]
+
+# 重建鎖的存活時間（秒）；重建異常中止時鎖自動失效
+REBUILD_LOCK_SECONDS = 600
+
+# KEYS[1] 為重建鎖，其餘為 sketch hash；ARGV 依序為每個 hash 的欄位數與 (桶, 增量)
+_FLUSH_UNLESS_REBUILDING = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local arg = 1
+for i = 2, #KEYS do
+    local fields = tonumber(ARGV[arg])
+    arg = arg + 1
+    for _ = 1, fields do
+        redis.call('HINCRBY', KEYS[i], ARGV[arg], ARGV[arg + 1])
+        arg = arg + 2
+    end
+end
+return 1
+"""
+
+
+def bucket_index(value: float) -> int:
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """桶內代表值，與桶內任何值的相對誤差不超過 α"""
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+class WpmSketch:
+    """可合併的分位數 sketch；只接受正值"""
+
+    __slots__ = ("counts", "_indexes", "_cumulative")
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = defaultdict(int, counts or {})
+        self._indexes: Optional[List[int]] = None
+        self._cumulative: List[int] = []
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            return
+        self.counts[bucket_index(value)] += count
+        self._indexes = None
+
+    def merge(self, other: "WpmSketch") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] += count
+        self._indexes = None
+
+    def _prepare(self) -> None:
+        if self._indexes is None:
+            self._indexes = sorted(i for i, c in self.counts.items() if c > 0)
+            total = 0
+            self._cumulative = []
+            for index in self._indexes:
+                total += self.counts[index]
+                self._cumulative.append(total)
+
+    def faster_than(self, value: float) -> float:
+        """低於 ``value`` 的比例（0~1）；同一桶內的成績算一半"""
+        self._prepare()
+        if not self._indexes or value <= 0:
+            return 0.0
+        index = bucket_index(value)
+        position = bisect_left(self._indexes, index)
+        below = self._cumulative[position - 1] if position else 0
+        same = self.counts[index] if position < len(self._indexes) and self._indexes[position] == index else 0
+        return (below + same / 2) / self._cumulative[-1]
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._prepare()
+        if not self._indexes:
+            return None
+        rank = q * (self._cumulative[-1] - 1)
+        position = bisect_left(self._cumulative, math.floor(rank) + 1)
+        return bucket_value(self._indexes[min(position, len(self._indexes) - 1)])
+
+
+def sketch_keys(language: str, mode_seconds: int) -> List[SketchKey]:
+    """一筆成績要計入的 sketch：語言 / overall × 模式 / 全部模式"""
+    return [(category, mode) for category in {language, OVERALL} for mode in {mode_seconds, ALL_MODES}]
+
+
+class WpmSketchStore:
+    """本地累積增量、定期合併進 Redis；讀取時快取合併後的 sketch ``cache_seconds`` 秒
+
+    快取以 LRU 保留最多 ``capacity`` 個 (語言, 模式)，查詢參數來自公開端點，不可無上限成長。
+    """
+
+    def __init__(
+        self,
+        flush_interval: float,
+        cache_seconds: float,
+        capacity: int = 64,
+        reseed_seconds: int = 86400,
+        prefix: str = "sketch:wpm",
+    ):
+        self.flush_interval = flush_interval
+        self.cache_seconds = cache_seconds
+        self.capacity = capacity
+        self.reseed_seconds = reseed_seconds
+        self.prefix = prefix
+        self._pending: Dict[SketchKey, WpmSketch] = defaultdict(WpmSketch)
+        self._cache: "OrderedDict[SketchKey, Tuple[float, WpmSketch]]" = OrderedDict()
+        self._script = None
+        self._task: Optional[asyncio.Task] = None
+
+    def key(self, language: str, mode_seconds: int) -> str:
+        return f"{self.prefix}:{language}:{mode_seconds}"
+
+    @property
+    def seeded_key(self) -> str:
+        return f"{self.prefix}:seeded"
+
+    @property
+    def lock_key(self) -> str:
+        return f"{self.prefix}:rebuilding"
+
+    def add(self, language: str, mode_seconds: int, wpm: float, count: int = 1) -> None:
+        for key in sketch_keys(language, mode_seconds):
+            self._pending[key].add(wpm, count)
+
+    def replace(self, language: str, mode_seconds: int, before: Optional[float], after: Optional[float]) -> None:
+        """管理員修改或作廢成績後修正 sketch：扣除原本計入的值、計入新值（None 表示不計入）"""
+        if before == after:
+            return
+        if before is not None:
+            self.add(language, mode_seconds, before, -1)
+        if after is not None:
+            self.add(language, mode_seconds, after)
+
+    async def flush(self) -> None:
+        """以單一 Lua 腳本合併本地增量；重建中或失敗時保留增量待下次重試"""
+        pending, self._pending = self._pending, defaultdict(WpmSketch)
+        if not pending:
+            return
+        keys, args = [self.lock_key], []
+        for (language, mode_seconds), sketch in pending.items():
+            keys.append(self.key(language, mode_seconds))
+            args.append(len(sketch.counts))
+            for index, count in sketch.counts.items():
+                args.extend((str(index), count))
+        try:
+            client = await get_redis_client()
+            if self._script is None:
+                self._script = client.register_script(_FLUSH_UNLESS_REBUILDING)
+            merged = await self._script(keys=keys, args=args)
+        except Exception as e:
+            logger.warning("WPM sketch flush failed", error=str(e), sketches=len(pending))
+            merged = False
+        if not merged:
+            for key, sketch in pending.items():
+                self._pending[key].merge(sketch)
+
+    async def load(self, language: str, mode_seconds: int) -> WpmSketch:
+        key = (language, mode_seconds)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self.cache_seconds:
+            self._cache.move_to_end(key)
+            return cached[1]
+        client = await get_redis_client()
+        raw = await client.hgetall(self.key(language, mode_seconds))
+        sketch = WpmSketch({int(index): int(count) for index, count in raw.items()})
+        self._cache[key] = (now, sketch)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        return sketch
+
+    async def rebuild(self, db: AsyncSession) -> bool:
+        """由 scores 重建所有 sketch；依 0.1 WPM 預先彙總，不逐筆讀取
+
+        從查詢到換上新 sketch 之間持有重建鎖，其他 worker 的增量暫留本地；
+        已有其他 worker 在重建時回傳 False。
+        """
+        client = await get_redis_client()
+        if not await client.set(self.lock_key, "1", nx=True, ex=REBUILD_LOCK_SECONDS):
+            return False
+        try:
+            count = await self._rebuild(db, client)
+        finally:
+            await client.delete(self.lock_key)
+        logger.info("WPM sketches rebuilt", sketches=count)
+        return True
+
+    async def _rebuild(self, db: AsyncSession, client) -> int:
+        wpm = cast(Score.wpm, Numeric(8, 1))
+        result = await db.execute(
+            select(Score.language, TypingSession.mode_seconds, wpm, func.count())
+            .join(TypingSession, Score.session_id == TypingSession.id)
+            .where(Score.is_void == False, Score.wpm > 0)
+            .group_by(Score.language, TypingSession.mode_seconds, wpm)
+        )
+        sketches: Dict[SketchKey, WpmSketch] = defaultdict(WpmSketch)
+        for language, mode_seconds, wpm, count in result.all():
+            for key in sketch_keys(language, mode_seconds):
+                sketches[key].add(float(wpm), count)
+
+        # 先寫入暫存 key 再 RENAME 蓋過正式 key，讀取端不會看到寫到一半的 sketch
+        async with client.pipeline(transaction=True) as pipe:
+            for (language, mode_seconds), sketch in sketches.items():
+                key = self.key(language, mode_seconds)
+                staging = f"{key}:rebuild"
+                pipe.delete(staging)
+                pipe.hset(staging, mapping={str(index): count for index, count in sketch.counts.items()})
+                pipe.rename(staging, key)
+            await pipe.execute()
+        return len(sketches)
+
+    async def _seed(self) -> None:
+        # 標記每 reseed_seconds 過期一次，屆時第一個取得標記的 worker 重建以修正累積誤差
+        client = await get_redis_client()
+        if await client.set(self.seeded_key, "1", nx=True, ex=self.reseed_seconds):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.rebuild(db)
+            except Exception:
+                await client.delete(self.seeded_key)
+                raise
+
+    async def _run(self):
+        try:
+            await self._seed()
+        except Exception as e:
+            logger.warning("WPM sketch seeding failed", error=str(e))
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            try:
+                await self._seed()
+            except Exception as e:
+                logger.warning("WPM sketch reseeding failed", error=str(e))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止背景任務並合併剩餘的增量"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+wpm_sketches = WpmSketchStore(
+    flush_interval=settings.WPM_SKETCH_FLUSH_SECONDS,
+    cache_seconds=settings.WPM_SKETCH_CACHE_SECONDS,
+    capacity=settings.WPM_SKETCH_CACHE_SIZE,
+    reseed_seconds=settings.WPM_SKETCH_RESEED_SECONDS,
+)
@@ -0,0 +1,153 @@
+"""
+Binary WebSocket frame format for keystroke traffic
+
+All integers are little-endian. Every frame starts with a one-byte type tag.
+Timestamps are uint32 millisecond offsets from the session start.
+
+Client -> server
+    0x01 keystroke        <B tag><I t><I code_point><B flags><I position>
+    0x02 keystroke_batch  <B tag><I seq><H count> then ``count`` records of
+                          <I t><I code_point><B flags><I position>
+
+Server -> client
+    0x81 metrics_update             <B tag><I t><f net_wpm><f gross_wpm><f accuracy>
+                                    <I errors><I total_chars><I correct_chars>
+                                    <f live_wpm><f burst_wpm><f live_accuracy>
+    0x82 keystroke_processed        <B tag><I t><I code_point><B flags><I position>
+    0x83 keystroke_batch_processed  <B tag><I t><I seq><H count><I position>
+                                    <I total_chars><I correct_chars>
+
+``flags`` bit 0 is the correctness flag. A batch ack for a frame without
+keystrokes carries position 0xFFFFFFFF. Control messages (start_session,
+heartbeat, finish_session, ...) stay JSON text frames on binary connections.
+"""
+import struct
+from typing import Optional
+
+BINARY_SUBPROTOCOL = "typeflow.bin.v1"
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+
+TAG_KEYSTROKE = 0x01
+TAG_KEYSTROKE_BATCH = 0x02
+TAG_METRICS_UPDATE = 0x81
+TAG_KEYSTROKE_PROCESSED = 0x82
+TAG_KEYSTROKE_BATCH_PROCESSED = 0x83
+
+FLAG_CORRECT = 0x01
+
+_KEYSTROKE = struct.Struct("<BIIBI")
+_BATCH_HEADER = struct.Struct("<BIH")
+_BATCH_RECORD = struct.Struct("<IIBI")
+_METRICS = struct.Struct("<BIfffIIIfff")
+_BATCH_ACK = struct.Struct("<BIIHIII")
+
+_U32 = 0xFFFFFFFF
+NO_POSITION = _U32
+
+
+class FrameError(ValueError):
+    """Malformed binary frame"""
+
+
+def _char(code_point: int) -> str:
+    try:
+        return chr(code_point) if code_point else ""
+    except (ValueError, OverflowError):
+        raise FrameError(f"invalid code point {code_point}")
+
+
+def decode(frame: bytes) -> dict:
+    """Decode a client binary frame into the equivalent JSON message dict"""
+    if not frame:
+        raise FrameError("empty frame")
+    tag = frame[0]
+
+    if tag == TAG_KEYSTROKE:
+        if len(frame) != _KEYSTROKE.size:
+            raise FrameError("bad keystroke frame length")
+        _, t, code_point, flags, position = _KEYSTROKE.unpack(frame)
+        return {
+            "type": "keystroke",
+            "t": t,
+            "char": _char(code_point),
+            "correct": bool(flags & FLAG_CORRECT),
+            "position": position,
+        }
+
+    if tag == TAG_KEYSTROKE_BATCH:
+        if len(frame) < _BATCH_HEADER.size:
+            raise FrameError("truncated keystroke_batch header")
+        _, seq, count = _BATCH_HEADER.unpack_from(frame)
+        if len(frame) != _BATCH_HEADER.size + count * _BATCH_RECORD.size:
+            raise FrameError("bad keystroke_batch frame length")
+        keystrokes = [
+            {
+                "t": t,
+                "char": _char(code_point),
+                "correct": bool(flags & FLAG_CORRECT),
+                "position": position,
+            }
+            for t, code_point, flags, position in _BATCH_RECORD.iter_unpack(
+                memoryview(frame)[_BATCH_HEADER.size:]
+            )
+        ]
+        return {"type": "keystroke_batch", "seq": seq, "keystrokes": keystrokes}
+
+    raise FrameError(f"unknown frame tag 0x{tag:02x}")
+
+
+def encode_keystroke_batch(seq: int, keystrokes: list) -> bytes:
+    """Build a client keystroke_batch frame from ``(t, char, correct, position)`` tuples"""
+    parts = [_BATCH_HEADER.pack(TAG_KEYSTROKE_BATCH, seq & _U32, len(keystrokes))]
+    for t, char, correct, position in keystrokes:
+        parts.append(_BATCH_RECORD.pack(
+            t, ord(char) if char else 0, FLAG_CORRECT if correct else 0, position
+        ))
+    return b"".join(parts)
+
+
+def encode(message: dict, offset_ms: int) -> Optional[bytes]:
+    """Encode a server message; returns None if the type has no binary form"""
+    message_type = message.get("type")
+    t = min(max(0, offset_ms), _U32)
+
+    if message_type == "metrics_update":
+        m = message.get("metrics") or {}
+        return _METRICS.pack(
+            TAG_METRICS_UPDATE,
+            t,
+            m.get("net_wpm", 0),
+            m.get("gross_wpm", 0),
+            m.get("accuracy", 100),
+            m.get("errors", 0),
+            m.get("total_chars", 0),
+            m.get("correct_chars", 0),
+            m.get("live_wpm", 0),
+            m.get("burst_wpm", 0),
+            m.get("live_accuracy", 100),
+        )
+
+    if message_type == "keystroke_processed":
+        char = message.get("char") or ""
+        return _KEYSTROKE.pack(
+            TAG_KEYSTROKE_PROCESSED,
+            t,
+            ord(char[0]) if char else 0,
+            FLAG_CORRECT if message.get("correct") else 0,
+            (message.get("position") or 0) & _U32,
+        )
+
+    if message_type == "keystroke_batch_processed":
+        position = message.get("position")
+        return _BATCH_ACK.pack(
+            TAG_KEYSTROKE_BATCH_PROCESSED,
+            t,
+            (message.get("seq") or 0) & _U32,
+            message.get("count", 0),
+            NO_POSITION if position is None else position & _U32,
+            message.get("total_chars", 0),
+            message.get("correct_chars", 0),
+        )
+
+    return None
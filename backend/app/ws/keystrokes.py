@@ -0,0 +1,425 @@
+"""
+Compact keystroke storage for real-time typing sessions
+"""
+import base64
+import bisect
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+_MAX_OFFSET_MS = 0xFFFFFFFF
+
+# Compact persisted form, see KeystrokeBuffer.to_compact
+COMPACT_ENCODING = "ks1+zlib+b64"
+# Same layout cut into independently decodable chunks, see KeystrokeBuffer.to_chunked
+CHUNKED_ENCODING = "ks2+zlib+b64"
+REPLAY_CHUNK_SIZE = 512
+# Logged (as incorrect) when the typist deletes the previous keystroke; moves the cursor back
+BACKSPACE = "\b"
+_COMPACT_HEADER = struct.Struct("<I")
+
+
+def _pack(offsets: array, code_points: array, correct: bytes) -> str:
+    """``<I count>``, uint32 offset deltas, uint32 code points, correctness bitmap; zlib + base64"""
+    count = len(offsets)
+    deltas = array("I", offsets)
+    for i in range(count - 1, 0, -1):
+        deltas[i] -= deltas[i - 1]
+    code_points = array("I", code_points)
+    if sys.byteorder != "little":
+        deltas.byteswap()
+        code_points.byteswap()
+    raw = b"".join((_COMPACT_HEADER.pack(count), deltas.tobytes(), code_points.tobytes(), bytes(correct)))
+    return base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+
+
+def _unpack(data: str) -> Tuple[array, array, bytearray]:
+    raw = zlib.decompress(base64.b64decode(data))
+    (count,) = _COMPACT_HEADER.unpack_from(raw)
+    pos = _COMPACT_HEADER.size
+    offsets = array("I", raw[pos:pos + 4 * count])
+    code_points = array("I", raw[pos + 4 * count:pos + 8 * count])
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        code_points.byteswap()
+    for i in range(1, count):
+        offsets[i] += offsets[i - 1]
+    return offsets, code_points, bytearray(raw[pos + 8 * count:pos + 8 * count + (count + 7) // 8])
+
+
+def decode_chunk(data: str) -> Iterator[Tuple[int, str, bool]]:
+    """Yield ``(t, char, correct)`` from one packed chunk (or a whole ks1 blob)"""
+    offsets, code_points, correct = _unpack(data)
+    for i in range(len(offsets)):
+        yield offsets[i], chr(code_points[i]), bool(correct[i >> 3] & (1 << (i & 7)))
+
+
+def first_chunk_at(index: List[list], from_ms: int) -> int:
+    """First chunk of a ks2 ``index`` that can hold a keystroke at or after ``from_ms``"""
+    return bisect.bisect_left([entry[1] for entry in index], from_ms)
+
+
+class KeystrokeBuffer:
+    """Append-only keystroke log backed by parallel typed arrays.
+
+    Each keystroke costs roughly 8 bytes (a ``uint32`` millisecond offset from
+    the session start, a ``uint32`` code point and one bit of correctness)
+    instead of a dict plus a ``datetime`` per keypress.
+    """
+
+    __slots__ = ("start_time", "_offsets", "_code_points", "_correct", "_count", "_correct_count", "_floor")
+
+    def __init__(self, start_time: datetime, floor_ms: int = 0):
+        self.start_time = start_time
+        # Offsets never go below this, so a resumed session keeps counting forward
+        self._floor = floor_ms
+        self._offsets = array("I")
+        self._code_points = array("I")
+        self._correct = bytearray()
+        self._count = 0
+        self._correct_count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def offset_for(self, timestamp: Optional[datetime]) -> int:
+        """Convert a timestamp into a monotonic millisecond offset from ``start_time``"""
+        if timestamp is None:
+            return self.last_offset
+        if timestamp.tzinfo is not None and self.start_time.tzinfo is None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        elif timestamp.tzinfo is None and self.start_time.tzinfo is not None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return self.clamp_offset(int((timestamp - self.start_time).total_seconds() * 1000))
+
+    def clamp_offset(self, offset_ms: int) -> int:
+        """Clamp a client-supplied offset so offsets never go backwards"""
+        return min(max(offset_ms, self.last_offset), _MAX_OFFSET_MS)
+
+    def append(self, char: str, correct: bool, offset_ms: int) -> None:
+        index = self._count
+        if index & 7 == 0:
+            self._correct.append(0)
+        if correct:
+            self._correct[index >> 3] |= 1 << (index & 7)
+            self._correct_count += 1
+        self._offsets.append(offset_ms)
+        self._code_points.append(ord(char[0]) if char else 0)
+        self._count = index + 1
+
+    def append_at(self, char: str, correct: bool, timestamp: Optional[datetime]) -> int:
+        """Append a keystroke stamped with an absolute time; returns its offset"""
+        offset = self.offset_for(timestamp)
+        self.append(char, correct, offset)
+        return offset
+
+    def is_correct(self, index: int) -> bool:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("keystroke index out of range")
+        return bool(self._correct[index >> 3] & (1 << (index & 7)))
+
+    def __getitem__(self, index: int) -> Tuple[int, str, bool]:
+        correct = self.is_correct(index)
+        return self._offsets[index], chr(self._code_points[index]), correct
+
+    def __iter__(self) -> Iterator[Tuple[int, str, bool]]:
+        correct = self._correct
+        for i in range(self._count):
+            yield (
+                self._offsets[i],
+                chr(self._code_points[i]),
+                bool(correct[i >> 3] & (1 << (i & 7))),
+            )
+
+    @property
+    def correct_count(self) -> int:
+        return self._correct_count
+
+    @property
+    def error_count(self) -> int:
+        return self._count - self._correct_count
+
+    @property
+    def last_offset(self) -> int:
+        return self._offsets[-1] if self._count else self._floor
+
+    # Zero-copy views for vectorised metrics, e.g.
+    # ``numpy.frombuffer(buf.offsets, dtype=numpy.uint32)``.
+    # Release a view before the next append, arrays cannot grow while exported.
+    @property
+    def offsets(self) -> memoryview:
+        return memoryview(self._offsets)
+
+    @property
+    def code_points(self) -> memoryview:
+        return memoryview(self._code_points)
+
+    @property
+    def correct_bitmap(self) -> memoryview:
+        """Little-endian bit order: keystroke ``i`` is bit ``i % 8`` of byte ``i // 8``"""
+        return memoryview(self._correct)
+
+    def nbytes(self) -> int:
+        return (
+            self._offsets.itemsize * len(self._offsets)
+            + self._code_points.itemsize * len(self._code_points)
+            + len(self._correct)
+        )
+
+    def to_list(self) -> list:
+        """Expand into JSON-friendly dicts (for persistence / debugging only)"""
+        return [
+            {"t": offset, "char": char, "correct": correct}
+            for offset, char, correct in self
+        ]
+
+    def to_compact(self) -> dict:
+        """JSON-storable compressed form, used for session snapshots.
+
+        Layout before compression: ``<I count>``, ``count`` uint32 offset deltas,
+        ``count`` uint32 code points, then the correctness bitmap, all little-endian.
+        """
+        return {
+            "encoding": COMPACT_ENCODING,
+            "count": self._count,
+            "data": _pack(self._offsets, self._code_points, self._correct),
+        }
+
+    def to_chunked(self, chunk_size: int = REPLAY_CHUNK_SIZE) -> dict:
+        """Persisted form for ``TypingSession.raw_keystrokes_json``.
+
+        Every ``chunk_size`` keystrokes are packed like ``to_compact`` on their
+        own. ``index`` holds ``[first_t, last_t, count]`` per chunk so a replay
+        can seek with a bisect and decode only the chunks it sends.
+        """
+        if chunk_size <= 0 or chunk_size % 8:
+            raise ValueError("chunk_size must be a positive multiple of 8")
+        index, chunks = [], []
+        for start in range(0, self._count, chunk_size):
+            end = min(start + chunk_size, self._count)
+            offsets = self._offsets[start:end]
+            index.append([offsets[0], offsets[-1], end - start])
+            chunks.append(_pack(offsets, self._code_points[start:end], self._correct[start >> 3:(end + 7) >> 3]))
+        return {
+            "encoding": CHUNKED_ENCODING,
+            "count": self._count,
+            "chunk_size": chunk_size,
+            "index": index,
+            "chunks": chunks,
+        }
+
+    @classmethod
+    def from_compact(cls, payload: dict, start_time: datetime) -> "KeystrokeBuffer":
+        encoding = payload.get("encoding")
+        if encoding == COMPACT_ENCODING:
+            parts = [payload["data"]]
+        elif encoding == CHUNKED_ENCODING:
+            parts = payload["chunks"]
+        else:
+            raise ValueError("unsupported keystroke encoding")
+
+        buf = cls(start_time)
+        for data in parts:
+            offsets, code_points, correct = _unpack(data)
+            # Every chunk but the last holds a multiple of 8 keystrokes, so bitmaps concatenate
+            buf._offsets.extend(offsets)
+            buf._code_points.extend(code_points)
+            buf._correct.extend(correct)
+        buf._count = len(buf._offsets)
+        buf._correct_count = sum(bin(byte).count("1") for byte in buf._correct)
+        return buf
+
+
+class SlidingWindow:
+    """Keystroke counts over the last ``window_ms``, kept in a ring of time buckets.
+
+    ``add`` and ``advance`` are O(1) amortised: each bucket is cleared at most
+    once per revolution and running totals are adjusted instead of rescanned.
+    """
+
+    __slots__ = (
+        "window_ms", "bucket_ms", "_total", "_correct", "_head",
+        "total", "correct", "peak_cpm", "_first_offset",
+    )
+
+    def __init__(self, window_ms: int = 10000, buckets: int = 20):
+        self.bucket_ms = max(1, window_ms // buckets)
+        self.window_ms = self.bucket_ms * buckets
+        self._total = array("I", bytes(4 * buckets))
+        self._correct = array("I", bytes(4 * buckets))
+        self._head = -1  # absolute index of the newest bucket
+        self.total = 0
+        self.correct = 0
+        self.peak_cpm = 0.0  # highest windowed chars/minute seen so far
+        self._first_offset: Optional[int] = None
+
+    def advance(self, offset_ms: int) -> None:
+        """Expire buckets that fell out of the window ending at ``offset_ms``"""
+        bucket = offset_ms // self.bucket_ms
+        if bucket <= self._head:
+            return
+        size = len(self._total)
+        for b in range(max(self._head + 1, bucket - size + 1), bucket + 1):
+            slot = b % size
+            self.total -= self._total[slot]
+            self.correct -= self._correct[slot]
+            self._total[slot] = 0
+            self._correct[slot] = 0
+        self._head = bucket
+
+    def add(self, offset_ms: int, correct: bool) -> None:
+        if self._first_offset is None:
+            self._first_offset = offset_ms
+        self.advance(offset_ms)
+        # Offsets are monotonic, so the keystroke always belongs to the head bucket
+        slot = self._head % len(self._total)
+        self._total[slot] += 1
+        self.total += 1
+        if correct:
+            self._correct[slot] += 1
+            self.correct += 1
+
+        # Bursts only count once half a window of typing backs them up
+        span = self._span_ms(offset_ms)
+        if span * 2 >= self.window_ms:
+            cpm = self.total * 60000.0 / span
+            if cpm > self.peak_cpm:
+                self.peak_cpm = cpm
+
+    def _span_ms(self, offset_ms: int) -> int:
+        # Live buckets cover all of the older ones plus the elapsed part of the head
+        head_elapsed = min(self.bucket_ms, max(0, offset_ms - self._head * self.bucket_ms))
+        span = self.window_ms - self.bucket_ms + head_elapsed
+        # Early in a session the window is not full yet; don't dilute the rate
+        if self._first_offset is not None:
+            span = min(span, offset_ms - self._first_offset)
+        return max(self.bucket_ms, span)
+
+    def snapshot(self, offset_ms: int) -> dict:
+        """Windowed metrics as of ``offset_ms`` (ms since session start)"""
+        self.advance(offset_ms)
+        cpm = self.total * 60000.0 / self._span_ms(offset_ms)
+        return {
+            "live_wpm": round(cpm / 5, 1),
+            "burst_wpm": round(max(self.peak_cpm, cpm) / 5, 1),
+            "live_accuracy": round(self.correct / self.total * 100, 1) if self.total else 100,
+        }
+
+
+# Gaps longer than this are pauses, not typing rhythm
+PAUSE_MS = 2000
+# Distinct keys / digraphs tracked per session; rarer ones beyond this are ignored
+MAX_KEYS = 512
+MAX_DIGRAPHS = 2048
+
+
+def _welford(stat: list, value: float, at: int = 0) -> None:
+    """Fold ``value`` into the ``n, mean, m2`` triple at ``stat[at:at + 3]`` in place"""
+    n = stat[at] + 1
+    delta = value - stat[at + 1]
+    mean = stat[at + 1] + delta / n
+    stat[at] = n
+    stat[at + 1] = mean
+    stat[at + 2] += delta * (value - mean)
+
+
+def _timing(n: int, mean: float, m2: float) -> dict:
+    return {
+        "n": n,
+        "mean_ms": round(mean, 1),
+        "stdev_ms": round((m2 / (n - 1)) ** 0.5, 1) if n > 1 else 0.0,
+    }
+
+
+class KeyStats:
+    """Streaming per-key, digraph and inter-key interval statistics.
+
+    Everything is updated in O(1) per keystroke with Welford's algorithm, so
+    the summary never needs the raw keystroke log. Stats are charged to the key
+    the typist should have hit, so a "weak key" is one that is slow or often
+    missed. A key's interval is the time since the previous keystroke; digraph
+    timing only counts pairs typed correctly back to back.
+    """
+
+    __slots__ = ("interval", "keys", "digraphs", "_prev_char", "_prev_offset", "_prev_correct")
+
+    def __init__(self):
+        self.interval = [0, 0.0, 0.0]
+        # char -> [count, errors, n, mean, m2]
+        self.keys = {}
+        # two-char string -> [n, mean, m2]
+        self.digraphs = {}
+        self._prev_char: Optional[str] = None
+        self._prev_offset: Optional[int] = None
+        self._prev_correct = False
+
+    def add(self, char: str, correct: bool, offset_ms: int) -> None:
+        """Count a keystroke against ``char``, the expected key (or the typed one when unknown)"""
+        key = self.keys.get(char)
+        if key is None and len(self.keys) < MAX_KEYS:
+            key = self.keys[char] = [0, 0, 0, 0.0, 0.0]
+        if key is not None:
+            key[0] += 1
+            if not correct:
+                key[1] += 1
+
+        if self._prev_offset is not None:
+            gap = offset_ms - self._prev_offset
+            if gap <= PAUSE_MS:
+                _welford(self.interval, gap)
+                if key is not None:
+                    _welford(key, gap, at=2)
+                if correct and self._prev_correct:
+                    pair = self._prev_char + char
+                    stat = self.digraphs.get(pair)
+                    if stat is None and len(self.digraphs) < MAX_DIGRAPHS:
+                        stat = self.digraphs[pair] = [0, 0.0, 0.0]
+                    if stat is not None:
+                        _welford(stat, gap)
+
+        self._prev_char = char
+        self._prev_offset = offset_ms
+        self._prev_correct = correct
+
+    @classmethod
+    def from_buffer(cls, buffer: KeystrokeBuffer, expected: Optional[array] = None) -> "KeyStats":
+        """Replay a keystroke log, walking the cursor over ``expected`` like the live session did"""
+        stats = cls()
+        cursor = 0
+        for offset, char, correct in buffer:
+            if char == BACKSPACE:
+                cursor = max(0, cursor - 1)
+                continue
+            if expected is not None and cursor < len(expected):
+                char = chr(expected[cursor])
+            stats.add(char, correct, offset)
+            cursor += 1
+        return stats
+
+    def summary(self, min_samples: int = 3, limit: int = 10, max_digraphs: int = 50) -> dict:
+        """JSON-ready stats; ``slow_keys`` / ``slow_digraphs`` rank by mean interval"""
+        keys = {}
+        for char, (count, errors, n, mean, m2) in self.keys.items():
+            keys[char] = {"count": count, "errors": errors, **_timing(n, mean, m2)}
+        digraphs = {
+            pair: _timing(*stat)
+            for pair, stat in sorted(self.digraphs.items(), key=lambda item: -item[1][1])
+            if stat[0] >= min_samples
+        }
+
+        def slowest(stats: dict) -> list:
+            timed = [k for k, v in stats.items() if v["n"] >= min_samples]
+            return sorted(timed, key=lambda k: -stats[k]["mean_ms"])[:limit]
+
+        return {
+            "interval": _timing(*self.interval),
+            "keys": keys,
+            "digraphs": dict(list(digraphs.items())[:max_digraphs]),
+            "slow_keys": slowest(keys),
+            "slow_digraphs": list(digraphs)[:limit],
+        }
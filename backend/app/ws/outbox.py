@@ -0,0 +1,87 @@
+"""
+Per-connection outbound queues for WebSocket fan-out
+"""
+import asyncio
+import time
+from typing import Callable, Optional, Union
+
+import structlog
+from fastapi import WebSocket
+
+from app.services.monitoring import ws_send_duration
+
+logger = structlog.get_logger()
+
+Frame = Union[str, bytes]
+
+# Close code sent to clients that cannot keep up (RFC 6455 "Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class Outbox:
+    """Bounded queue of pre-serialized frames drained by one writer task.
+
+    Producers never await the socket: ``put`` either enqueues immediately or
+    reports overflow, so a stalled client only ever delays itself.
+    """
+
+    __slots__ = ("session_id", "websocket", "queue", "overflowed", "_on_overflow", "_writer")
+
+    def __init__(
+        self,
+        session_id: str,
+        websocket: WebSocket,
+        maxsize: int,
+        on_overflow: Optional[Callable[["Outbox"], None]] = None,
+    ):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Frame]" = asyncio.Queue(maxsize)
+        self.overflowed = False
+        self._on_overflow = on_overflow
+        self._writer = asyncio.create_task(self._drain())
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def put(self, frame: Frame) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            if self._on_overflow is not None:
+                self._on_overflow(self)
+            return False
+
+    async def _drain(self) -> None:
+        websocket = self.websocket
+        observe = ws_send_duration.observe
+        try:
+            while True:
+                frame = await self.queue.get()
+                started = time.perf_counter()
+                if isinstance(frame, bytes):
+                    await websocket.send_bytes(frame)
+                else:
+                    await websocket.send_text(frame)
+                observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The reader side notices the broken socket and cleans up
+            logger.info("WebSocket writer stopped", session_id=self.session_id, error=str(e))
+
+    def close(self) -> None:
+        self._writer.cancel()
+
+    async def evict(self, code: int = SLOW_CONSUMER_CLOSE_CODE) -> None:
+        """Drop pending frames and close the socket"""
+        self.close()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
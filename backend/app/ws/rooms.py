@@ -0,0 +1,190 @@
+"""
+Race rooms: several typists on the same article
+
+The registry only tracks membership and which rooms have progress to report.
+``ConnectionManager`` builds one progress frame per dirty room per tick and
+puts that same frame on every member's outbox. Frames name members by an
+opaque per-room member id; session ids never leave the server, since they are
+what a connection would present to take a session over.
+"""
+from typing import Dict, List, Optional, Set
+
+import structlog
+
+logger = structlog.get_logger()
+
+ROOM_WAITING = "waiting"
+ROOM_RUNNING = "running"
+ROOM_FINISHED = "finished"
+
+
+class RoomError(ValueError):
+    """Join / start rejected; ``reason`` is sent back as room_error"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Room:
+    __slots__ = ("room_id", "article_id", "host", "members", "member_ids", "finished", "status", "seq", "_joined")
+
+    def __init__(self, room_id: str, article_id: Optional[str] = None):
+        self.room_id = room_id
+        self.article_id = article_id
+        self.host: Optional[str] = None
+        # session_id -> user_id, in join order
+        self.members: Dict[str, Optional[str]] = {}
+        # session_id -> member id shown to the other members
+        self.member_ids: Dict[str, str] = {}
+        # session ids in finishing order
+        self.finished: List[str] = []
+        self.status = ROOM_WAITING
+        self.seq = 0
+        self._joined = 0
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def place_of(self, session_id: str) -> Optional[int]:
+        try:
+            return self.finished.index(session_id) + 1
+        except ValueError:
+            return None
+
+    def add(self, session_id: str, user_id: Optional[str]) -> None:
+        self._joined += 1
+        self.members[session_id] = user_id
+        self.member_ids[session_id] = f"m{self._joined}"
+
+    def member_id(self, session_id: Optional[str]) -> Optional[str]:
+        return self.member_ids.get(session_id) if session_id is not None else None
+
+    def roster(self) -> dict:
+        return {
+            "room_id": self.room_id,
+            "article_id": self.article_id,
+            "host": self.member_id(self.host),
+            "status": self.status,
+            "members": [
+                {"member_id": self.member_ids[session_id], "user_id": user_id}
+                for session_id, user_id in self.members.items()
+            ],
+        }
+
+
+class RoomRegistry:
+    """Room membership for one worker; every operation is O(1) in the number of rooms"""
+
+    def __init__(self, max_members: int):
+        self.max_members = max_members
+        self.rooms: Dict[str, Room] = {}
+        self.room_of: Dict[str, str] = {}  # session_id -> room_id
+        self._dirty: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def room_for(self, session_id: str) -> Optional[Room]:
+        room_id = self.room_of.get(session_id)
+        return self.rooms.get(room_id) if room_id is not None else None
+
+    def join(self, room_id: str, session_id: str, user_id: Optional[str] = None, article_id: Optional[str] = None) -> Room:
+        current = self.room_for(session_id)
+        if current is not None and current.room_id == room_id:
+            return current
+
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = Room(room_id, article_id)
+        elif room.status != ROOM_WAITING:
+            raise RoomError("already_started")
+        elif len(room) >= self.max_members:
+            raise RoomError("full")
+
+        if current is not None:
+            self.leave(session_id)
+        self.rooms[room_id] = room
+        room.add(session_id, user_id)
+        if room.host is None:
+            room.host = session_id
+        self.room_of[session_id] = room_id
+        return room
+
+    def leave(self, session_id: str) -> Optional[Room]:
+        """Remove a member; returns the room if anyone is left in it"""
+        room = self.room_for(session_id)
+        if room is None:
+            return None
+        del self.room_of[session_id]
+        del room.members[session_id]
+        del room.member_ids[session_id]
+        if not room.members:
+            del self.rooms[room.room_id]
+            self._dirty.discard(room.room_id)
+            return None
+        if room.host == session_id:
+            room.host = next(iter(room.members))
+        self._dirty.add(room.room_id)
+        return room
+
+    def rebind(self, old_session_id: str, new_session_id: str) -> None:
+        """Carry membership over when a connection resumes another session id"""
+        room = self.room_for(old_session_id)
+        if room is None:
+            return
+        self.leave(new_session_id)
+        # Rebuild to keep the roster order
+        room.members = {
+            new_session_id if sid == old_session_id else sid: user_id
+            for sid, user_id in room.members.items()
+        }
+        room.member_ids[new_session_id] = room.member_ids.pop(old_session_id)
+        room.finished = [new_session_id if sid == old_session_id else sid for sid in room.finished]
+        if room.host == old_session_id:
+            room.host = new_session_id
+        del self.room_of[old_session_id]
+        self.room_of[new_session_id] = room.room_id
+
+    def start(self, session_id: str) -> Room:
+        room = self.room_for(session_id)
+        if room is None:
+            raise RoomError("not_in_room")
+        if room.host != session_id:
+            raise RoomError("not_host")
+        if room.status != ROOM_WAITING:
+            raise RoomError("already_started")
+        room.status = ROOM_RUNNING
+        self._dirty.add(room.room_id)
+        return room
+
+    def mark_dirty(self, session_id: str) -> None:
+        room_id = self.room_of.get(session_id)
+        if room_id is not None:
+            self._dirty.add(room_id)
+
+    def finish(self, session_id: str) -> Optional[int]:
+        """Record a member crossing the line; returns their place"""
+        room = self.room_for(session_id)
+        if room is None or room.status != ROOM_RUNNING:
+            return None
+        if session_id not in room.finished:
+            room.finished.append(session_id)
+        if len(room.finished) == len(room.members):
+            room.status = ROOM_FINISHED
+        self._dirty.add(room.room_id)
+        return room.place_of(session_id)
+
+    def take_dirty(self, room_ids: List[str]) -> List[Room]:
+        """Return the given rooms that changed since their last tick and clear the flag"""
+        dirty = []
+        for room_id in room_ids:
+            if room_id in self._dirty:
+                self._dirty.discard(room_id)
+                room = self.rooms.get(room_id)
+                if room is not None:
+                    dirty.append(room)
+        return dirty
@@ -1,43 +1,285 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Tuple
 import json
+import secrets
 import uuid
+from array import array
 import asyncio
 import structlog
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import time
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import verify_token
 from app.models.users import User
+from app.services.article_cache import article_cache
+from app.services.monitoring import (
+    active_connections,
+    ws_disconnects,
+    ws_handler_duration,
+    ws_messages_received,
+    ws_messages_sent,
+    ws_send_queue_depth,
+    ws_send_queue_max_depth,
+    ws_session_evictions,
+    ws_slow_consumer_evictions,
+)
+from app.services.session_writer import session_writer
+from app.ws import codec
+from app.ws.keystrokes import BACKSPACE, COMPACT_ENCODING, KeyStats, KeystrokeBuffer, SlidingWindow
+from app.ws.outbox import Frame, Outbox
+from app.ws.rooms import ROOM_FINISHED, Room, RoomError, RoomRegistry
+from app.ws.scheduler import MetricsTicker
+from app.ws.state import create_session_store
 
 logger = structlog.get_logger()
 
 # Session data storage for real-time calculations
 session_data = {}
 
+# Checkpoints shared across workers (in-process unless WS_SESSION_BACKEND=redis)
+session_store = create_session_store()
+
+# Fixed per-session overhead (objects, window ring, dict entries) for memory accounting
+SESSION_BASE_BYTES = 4096
+# Rough cost of one per-key or digraph entry in KeyStats
+KEY_STAT_BYTES = 200
+
+# Close codes for server-initiated disconnects
+IDLE_CLOSE_CODE = 1001  # going away
+SUPERSEDED_CLOSE_CODE = 4000  # replaced by a newer connection for the same session
+FORBIDDEN_CLOSE_CODE = 4003  # session id held by another user, or its resume token is missing
+
+# Keystroke acknowledgement modes
+ACK_NONE = "none"      # never acknowledge keystrokes
+ACK_BATCH = "batch"    # one ack per keystroke / keystroke_batch frame
+ACK_SAMPLED = "sampled"  # ack every WS_KEYSTROKE_ACK_SAMPLE_EVERY-th frame
+ACK_MODES = {ACK_NONE, ACK_BATCH, ACK_SAMPLED}
+
+# Inbound types with their own metric label; anything else a client sends counts as "other"
+INBOUND_MESSAGE_TYPES = (
+    "start_session", "keystroke", "keystroke_batch", "heartbeat", "pong", "finish_session",
+    "resume_session", "join_room", "leave_room", "start_race", "other",
+)
+# Label children resolved once, the hot path only calls inc / observe
+_received_by_type = {t: ws_messages_received.labels(type=t) for t in INBOUND_MESSAGE_TYPES}
+_handler_duration_by_type = {t: ws_handler_duration.labels(type=t) for t in INBOUND_MESSAGE_TYPES}
+_sent_by_type = {}
+
+def _count_sent(message_type: str, count: int = 1):
+    counter = _sent_by_type.get(message_type)
+    if counter is None:
+        # Outbound types are fixed by the server, so this stays small
+        counter = _sent_by_type[message_type] = ws_messages_sent.labels(type=message_type)
+    counter.inc(count)
+
 class SessionData:
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, user_id: Optional[str] = None, start_time: Optional[datetime] = None, floor_ms: int = 0):
         self.session_id = session_id
-        self.start_time = datetime.utcnow()
-        self.keystrokes = []
+        self.user_id = user_id
+        self.start_time = start_time or datetime.utcnow()
+        self.keystrokes = KeystrokeBuffer(self.start_time, floor_ms)
+        self.window = SlidingWindow(settings.WS_LIVE_WINDOW_SECONDS * 1000)
+        self.key_stats = KeyStats()
         self.correct_chars = 0
         self.total_chars = 0
         self.errors = 0
-        self.last_update = datetime.utcnow()
+        self.last_update = time.monotonic()  # last keystroke, drives the idle sweep
+        self.ack_mode = settings.WS_KEYSTROKE_ACK_MODE
+        self.frames_received = 0
+        # What is being typed; needed to persist the result on finish
+        self.article_id: Optional[str] = None
+        self.article_version: Optional[int] = None
+        self.mode_seconds: Optional[int] = None
+        self.language: Optional[str] = None
+        # Lets a dropped client rebind to this session, see resume_session
+        self.resume_token = secrets.token_urlsafe(18)
+        # Article text as code points; when set, correctness is decided server-side
+        self.expected: Optional[array] = None
+        # Where the next keystroke lands; owned by the server, the client's position is only checked
+        self.cursor = 0
+        self.position_mismatches = 0
     
-    def add_keystroke(self, char: str, correct: bool, timestamp: datetime):
-        self.keystrokes.append({
-            "char": char,
-            "correct": correct,
-            "timestamp": timestamp
-        })
+    def should_ack(self, ack_mode: Optional[str] = None) -> bool:
+        """Count a keystroke frame and decide whether it gets an acknowledgement"""
+        self.frames_received += 1
+        mode = ack_mode if ack_mode in ACK_MODES else self.ack_mode
+        if mode == ACK_NONE:
+            return False
+        if mode == ACK_SAMPLED:
+            return self.frames_received % max(1, settings.WS_KEYSTROKE_ACK_SAMPLE_EVERY) == 0
+        return True
+    
+    def judge(self, char: str, position: int, claimed: bool) -> bool:
+        """Server-side correctness against the article text; trusts the client only without one"""
+        expected = self.expected
+        if expected is None:
+            return bool(claimed)
+        return bool(char) and 0 <= position < len(expected) and ord(char[0]) == expected[position]
+    
+    def expected_char(self, position: int) -> Optional[str]:
+        expected = self.expected
+        if expected is None or not 0 <= position < len(expected):
+            return None
+        return chr(expected[position])
+    
+    def backspace(self, timestamp: Optional[datetime] = None, offset_ms: Optional[int] = None):
+        """Log a deletion for replays and move the cursor back; counters and stats are untouched"""
+        if offset_ms is not None:
+            self.keystrokes.append(BACKSPACE, False, self.keystrokes.clamp_offset(offset_ms))
+        else:
+            self.keystrokes.append_at(BACKSPACE, False, timestamp)
+        self.cursor = max(0, self.cursor - 1)
+        self.last_update = time.monotonic()
+    
+    def elapsed_ms(self, now: Optional[datetime] = None) -> int:
+        """Milliseconds since ``start_time`` on the server clock"""
+        return max(0, int(((now or datetime.utcnow()) - self.start_time).total_seconds() * 1000))
+    
+    def over_time(self, received_ms: Optional[int] = None) -> bool:
+        """Whether the mode's duration (plus WS_MODE_GRACE_SECONDS) has run out"""
+        if not self.mode_seconds:
+            return False
+        elapsed_ms = self.elapsed_ms() if received_ms is None else received_ms
+        return elapsed_ms > (self.mode_seconds + settings.WS_MODE_GRACE_SECONDS) * 1000
+    
+    def add_keystroke(
+        self,
+        char: str,
+        correct: bool,
+        timestamp: Optional[datetime] = None,
+        offset_ms: Optional[int] = None,
+        received_ms: Optional[int] = None,
+        target: Optional[str] = None,
+    ):
+        """Record a keystroke; the log keeps the client's timing, the live window the server's.
+        
+        ``calculate_metrics`` reads the window on the server clock, so feeding it
+        client offsets would expire every keystroke when the client clock lags.
+        Key stats are charged to ``target``, the expected char, when it is known.
+        """
+        if offset_ms is not None:
+            offset_ms = self.keystrokes.clamp_offset(offset_ms)
+            self.keystrokes.append(char, correct, offset_ms)
+        else:
+            offset_ms = self.keystrokes.append_at(char, correct, timestamp)
+        self.window.add(self.elapsed_ms() if received_ms is None else received_ms, correct)
+        self.key_stats.add(target or char, correct, offset_ms)
+        self.last_update = time.monotonic()
         self.total_chars += 1
         if correct:
             self.correct_chars += 1
         else:
             self.errors += 1
     
+    def progress(self, now: datetime) -> dict:
+        """Cheap per-tick race standing; calculate_metrics is too heavy for every member"""
+        elapsed_minutes = (now - self.start_time).total_seconds() / 60.0
+        net_wpm = (self.correct_chars / 5) / elapsed_minutes if elapsed_minutes > 0 else 0
+        return {
+            "position": self.cursor,
+            "net_wpm": round(net_wpm, 1),
+            "accuracy": round(self.correct_chars / self.total_chars * 100, 1) if self.total_chars else 100,
+        }
+    
+    def estimated_bytes(self) -> int:
+        """Rough resident size, used for the WS_MEMORY_BUDGET_MB accounting"""
+        stats = len(self.key_stats.keys) + len(self.key_stats.digraphs)
+        return SESSION_BASE_BYTES + self.keystrokes.nbytes() + stats * KEY_STAT_BYTES
+    
+    def to_checkpoint(self, with_keystrokes: bool = False) -> dict:
+        """Compact counters that are enough to rebuild calculate_metrics elsewhere.
+        
+        ``with_keystrokes`` adds the compressed keystroke log so a resumed
+        session still persists complete raw keystrokes.
+        """
+        return {
+            "start_ms": int(self.start_time.replace(tzinfo=timezone.utc).timestamp() * 1000),
+            "total_chars": self.total_chars,
+            "correct_chars": self.correct_chars,
+            "errors": self.errors,
+            "last_offset": self.keystrokes.last_offset,
+            "user_id": self.user_id,
+            "article_id": self.article_id,
+            "article_version": self.article_version,
+            "mode_seconds": self.mode_seconds,
+            "language": self.language,
+            "cursor": self.cursor,
+            "resume_token": self.resume_token,
+            "keystrokes": self.keystrokes.to_compact()["data"] if with_keystrokes else None,
+        }
+    
+    @classmethod
+    def from_checkpoint(cls, session_id: str, checkpoint: dict) -> "SessionData":
+        start_time = datetime.utcfromtimestamp(checkpoint["start_ms"] / 1000)
+        data = cls(session_id, checkpoint.get("user_id"), start_time, checkpoint["last_offset"])
+        if checkpoint.get("keystrokes"):
+            # Key stats are rebuilt by the caller once the article text is loaded
+            data.keystrokes = KeystrokeBuffer.from_compact(
+                {"encoding": COMPACT_ENCODING, "data": checkpoint["keystrokes"]}, start_time
+            )
+        if checkpoint.get("resume_token"):
+            data.resume_token = checkpoint["resume_token"]
+        data.total_chars = checkpoint["total_chars"]
+        data.correct_chars = checkpoint["correct_chars"]
+        data.errors = checkpoint["errors"]
+        data.article_id = checkpoint.get("article_id")
+        data.article_version = checkpoint.get("article_version")
+        data.mode_seconds = checkpoint.get("mode_seconds")
+        data.language = checkpoint.get("language")
+        data.cursor = checkpoint.get("cursor") or 0
+        return data
+    
+    def to_records(self, final_metrics: dict, ended_at: datetime, key_stats: Optional[dict] = None) -> Optional[Dict[str, dict]]:
+        """Build the typing_sessions / scores rows, or None if the session is not persistable.
+        
+        Sessions shorter than WS_MIN_SESSION_SECONDS or with fewer than
+        WS_MIN_SESSION_CHARS typed characters are dropped. WPM is taken over the
+        elapsed time capped at the mode's duration; keystrokes past it are not counted.
+        """
+        if not (self.article_id and self.article_version and self.mode_seconds and self.language):
+            return None
+        elapsed = (ended_at - self.start_time).total_seconds()
+        if elapsed < settings.WS_MIN_SESSION_SECONDS or self.total_chars < settings.WS_MIN_SESSION_CHARS:
+            return None
+        minutes = min(elapsed, self.mode_seconds) / 60.0
+        net_wpm = round(self.correct_chars / 5 / minutes, 1)
+        gross_wpm = round(self.total_chars / 5 / minutes, 1)
+        try:
+            article_id = uuid.UUID(str(self.article_id))
+            user_id = uuid.UUID(str(self.user_id)) if self.user_id else None
+        except ValueError:
+            return None
+        
+        record_id = uuid.uuid4()
+        return {
+            "session": {
+                "id": record_id,
+                "user_id": user_id,
+                "article_id": article_id,
+                "article_version": self.article_version,
+                "mode_seconds": self.mode_seconds,
+                "started_at": self.start_time.replace(tzinfo=timezone.utc),
+                "ended_at": ended_at.replace(tzinfo=timezone.utc),
+                "raw_keystrokes_json": self.keystrokes.to_chunked(),
+                "key_stats_json": key_stats,
+                "focus_blur_count": 0,
+            },
+            "score": {
+                "id": uuid.uuid4(),
+                "session_id": record_id,
+                "wpm": net_wpm,
+                "accuracy": final_metrics["accuracy"],
+                "gross_wpm": gross_wpm,
+                "net_wpm": net_wpm,
+                "correct_keystrokes": self.correct_chars,
+                "error_keystrokes": self.errors,
+                "language": self.language,
+                "is_void": False,
+            },
+        }
+    
     def calculate_metrics(self):
         """Calculate current WPM and accuracy"""
         now = datetime.utcnow()
@@ -58,7 +300,7 @@ class SessionData:
         # Calculate accuracy
         accuracy = (self.correct_chars / self.total_chars * 100) if self.total_chars > 0 else 100
         
-        return {
+        metrics = {
             "net_wpm": round(max(0, net_wpm), 1),
             "gross_wpm": round(gross_wpm, 1),
             "accuracy": round(accuracy, 1),
@@ -66,32 +308,95 @@ class SessionData:
             "total_chars": self.total_chars,
             "correct_chars": self.correct_chars
         }
+        
+        # Live WPM / burst WPM / accuracy over the last WS_LIVE_WINDOW_SECONDS
+        metrics.update(self.window.snapshot(self.elapsed_ms(now)))
+        return metrics
 
 router = APIRouter()
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        self.outboxes: Dict[str, Outbox] = {}  # session_id -> bounded send queue
         self.user_sessions: Dict[str, str] = {}  # user_id -> session_id
-        self.update_tasks: Dict[str, asyncio.Task] = {}  # session_id -> update task
+        self.encodings: Dict[str, str] = {}  # session_id -> wire encoding
+        self.connection_users: Dict[str, Optional[str]] = {}  # session_id -> user_id
+        # session_id -> (session_ended reply, final race progress) once finished
+        self.finished: Dict[str, Tuple[dict, Optional[dict]]] = {}
+        self.last_seen: Dict[str, float] = {}  # session_id -> monotonic time of last inbound frame
+        self.pinged: Set[str] = set()
+        self.evictions = 0
+        self._background: Set[asyncio.Task] = set()
+        self._reaper: Optional[asyncio.Task] = None
+        # One shared ticker drives the periodic metrics push for every session
+        self.metrics_ticker = MetricsTicker(
+            self.send_metrics_updates,
+            interval=settings.WS_METRICS_INTERVAL_SECONDS,
+            tick=settings.WS_METRICS_TICK_SECONDS,
+        )
+        # Race rooms; one ticker fans out progress for every running room
+        self.rooms = RoomRegistry(settings.WS_ROOM_MAX_MEMBERS)
+        self.room_ticker = MetricsTicker(
+            self.send_room_ticks,
+            interval=settings.WS_RACE_TICK_SECONDS,
+            tick=settings.WS_RACE_TICK_SECONDS,
+        )
     
-    async def connect(self, websocket: WebSocket, session_id: str, user_id: Optional[str] = None):
-        await websocket.accept()
+    async def connect(
+        self,
+        websocket: WebSocket,
+        session_id: str,
+        user_id: Optional[str] = None,
+        encoding: str = codec.ENCODING_JSON,
+        subprotocol: Optional[str] = None,
+    ):
+        await websocket.accept(subprotocol=subprotocol)
+        previous = self.outboxes.get(session_id)
+        if previous is not None:
+            # Same session reconnected before the old socket was noticed as gone
+            ws_disconnects.labels(reason="superseded").inc()
+            self._run_in_background(previous.evict(SUPERSEDED_CLOSE_CODE))
         self.active_connections[session_id] = websocket
+        self.outboxes[session_id] = Outbox(
+            session_id, websocket, settings.WS_SEND_QUEUE_SIZE, self._evict_slow_consumer
+        )
+        self.encodings[session_id] = encoding
+        self.connection_users[session_id] = user_id
+        self.touch(session_id)
         if user_id:
             self.user_sessions[user_id] = session_id
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_forever())
         logger.info("WebSocket connected", session_id=session_id, user_id=user_id)
     
-    def disconnect(self, session_id: str, user_id: Optional[str] = None):
+    def disconnect(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        websocket: Optional[WebSocket] = None,
+        reason: str = "client",
+    ):
+        if websocket is not None and self.active_connections.get(session_id) is not websocket:
+            # A newer connection owns this session now; leave its state alone
+            return
         if session_id in self.active_connections:
             del self.active_connections[session_id]
-        if user_id and user_id in self.user_sessions:
+        outbox = self.outboxes.pop(session_id, None)
+        if outbox is not None:
+            outbox.close()
+            ws_disconnects.labels(reason="slow_consumer" if outbox.overflowed else reason).inc()
+        self.encodings.pop(session_id, None)
+        self.connection_users.pop(session_id, None)
+        self.finished.pop(session_id, None)
+        self.last_seen.pop(session_id, None)
+        self.pinged.discard(session_id)
+        if user_id and self.user_sessions.get(user_id) == session_id:
             del self.user_sessions[user_id]
         
-        # Cancel update task if exists
-        if session_id in self.update_tasks:
-            self.update_tasks[session_id].cancel()
-            del self.update_tasks[session_id]
+        # Stop periodic metrics updates
+        self.metrics_ticker.unschedule(session_id)
+        self.leave_room(session_id)
         
         # Clean up session data
         if session_id in session_data:
@@ -99,47 +404,254 @@ class ConnectionManager:
             
         logger.info("WebSocket disconnected", session_id=session_id, user_id=user_id)
     
+    def rebind(self, websocket: WebSocket, old_session_id: str, new_session_id: str):
+        """Move a live connection onto another session id (used by resume_session)"""
+        if old_session_id == new_session_id:
+            return
+        previous = self.outboxes.get(new_session_id)
+        if previous is not None and self.active_connections.get(new_session_id) is not websocket:
+            ws_disconnects.labels(reason="superseded").inc()
+            self._run_in_background(previous.evict(SUPERSEDED_CLOSE_CODE))
+        
+        self.metrics_ticker.unschedule(old_session_id)
+        session_data.pop(old_session_id, None)
+        self.finished.pop(old_session_id, None)
+        self.rooms.rebind(old_session_id, new_session_id)
+        self.active_connections[new_session_id] = self.active_connections.pop(old_session_id)
+        outbox = self.outboxes.pop(old_session_id)
+        outbox.session_id = new_session_id
+        self.outboxes[new_session_id] = outbox
+        self.encodings[new_session_id] = self.encodings.pop(old_session_id, codec.ENCODING_JSON)
+        user_id = self.connection_users.pop(old_session_id, None)
+        self.connection_users[new_session_id] = user_id
+        self.last_seen[new_session_id] = self.last_seen.pop(old_session_id, time.monotonic())
+        self.pinged.discard(old_session_id)
+        if user_id:
+            self.user_sessions[user_id] = new_session_id
+    
+    def _run_in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    def _evict_slow_consumer(self, outbox: Outbox):
+        """Close a connection whose send queue overflowed; the reader loop cleans up"""
+        self.evictions += 1
+        ws_slow_consumer_evictions.inc()
+        logger.warning("Evicting slow WebSocket consumer", session_id=outbox.session_id, queued=outbox.depth)
+        self._run_in_background(outbox.evict())
+    
+    def touch(self, session_id: str):
+        """Record inbound traffic; any frame answers an outstanding ping"""
+        self.last_seen[session_id] = time.monotonic()
+        self.pinged.discard(session_id)
+    
+    def sweep(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """Send due pings and pick the (session_id, reason) pairs to evict"""
+        now = time.monotonic() if now is None else now
+        victims: Dict[str, str] = {}
+        
+        ping = None
+        for session_id, seen in self.last_seen.items():
+            silent = now - seen
+            if silent >= settings.WS_IDLE_TIMEOUT_SECONDS:
+                victims[session_id] = "idle"
+            elif silent >= settings.WS_PING_INTERVAL_SECONDS and session_id not in self.pinged:
+                if ping is None:
+                    ping = json.dumps({"type": "ping", "timestamp": datetime.utcnow().isoformat()})
+                self.pinged.add(session_id)
+                self.send_frame(ping, session_id)
+                _count_sent("ping")
+        
+        # Sessions that stopped typing but never sent finish_session
+        for session_id, data in session_data.items():
+            if session_id not in victims and now - data.last_update >= settings.WS_SESSION_IDLE_SECONDS:
+                victims[session_id] = "session_idle"
+        
+        # Global memory budget: drop the longest-idle sessions first
+        budget = settings.WS_MEMORY_BUDGET_MB * 1024 * 1024
+        used = sum(data.estimated_bytes() for data in session_data.values())
+        if used > budget:
+            survivors = [d for sid, d in session_data.items() if sid not in victims]
+            survivors.sort(key=lambda d: d.last_update)
+            for data in survivors:
+                if used <= budget:
+                    break
+                victims[data.session_id] = "memory"
+                used -= data.estimated_bytes()
+        
+        return list(victims.items())
+    
+    async def evict(self, session_id: str, reason: str):
+        """Checkpoint, forget and close a session without waiting for its reader"""
+        ws_session_evictions.labels(reason=reason).inc()
+        logger.info("Evicting WebSocket session", session_id=session_id, reason=reason)
+        await checkpoint_session(session_id, snapshot=True)
+        
+        outbox = self.outboxes.get(session_id)
+        user_id = self.connection_users.get(session_id)
+        self.disconnect(session_id, user_id, reason=reason)
+        if outbox is not None:
+            # A half-open socket may never finish the close handshake
+            self._run_in_background(asyncio.wait_for(outbox.evict(IDLE_CLOSE_CODE), 10))
+    
+    async def reap(self):
+        for session_id, reason in self.sweep():
+            await self.evict(session_id, reason)
+    
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(settings.WS_REAP_INTERVAL_SECONDS)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error("WebSocket reaper failed", exc_info=e)
+    
+    def stop(self):
+        self.metrics_ticker.stop()
+        self.room_ticker.stop()
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+    
+    def queue_depth(self) -> int:
+        return sum(outbox.depth for outbox in self.outboxes.values())
+    
+    def max_queue_depth(self) -> int:
+        return max((outbox.depth for outbox in self.outboxes.values()), default=0)
+    
+    def send_frame(self, frame: Frame, session_id: str) -> bool:
+        """Queue an already-serialized frame; never waits on the socket"""
+        outbox = self.outboxes.get(session_id)
+        if outbox is None:
+            return False
+        return outbox.put(frame)
+    
     async def send_personal_message(self, message: dict, session_id: str):
-        if session_id in self.active_connections:
-            websocket = self.active_connections[session_id]
-            await websocket.send_text(json.dumps(message))
+        if session_id not in self.outboxes:
+            return
+        _count_sent(message.get("type"))
+        if self.encodings.get(session_id) == codec.ENCODING_BINARY:
+            frame = codec.encode(message, _session_offset_ms(session_id))
+            if frame is not None:
+                self.send_frame(frame, session_id)
+                return
+        self.send_frame(json.dumps(message), session_id)
     
     async def broadcast(self, message: dict):
-        for websocket in self.active_connections.values():
-            await websocket.send_text(json.dumps(message))
+        # Serialize once; each connection's writer delivers at its own pace
+        frame = json.dumps(message)
+        _count_sent(message.get("type"), len(self.outboxes))
+        for outbox in list(self.outboxes.values()):
+            outbox.put(frame)
+    
+    def fan_out(self, room: Room, message: dict):
+        """Serialize once and queue the same frame for every room member"""
+        frame = json.dumps(message)
+        _count_sent(message.get("type"), len(room.members))
+        for session_id in room.members:
+            self.send_frame(frame, session_id)
+    
+    def leave_room(self, session_id: str):
+        room_id = self.rooms.room_of.get(session_id)
+        if room_id is None:
+            return
+        room = self.rooms.leave(session_id)
+        if room is None:
+            self.room_ticker.unschedule(room_id)
+            return
+        self.fan_out(room, {"type": "room_update", **room.roster(), "timestamp": datetime.utcnow().isoformat()})
+    
+    def room_progress(self, room: Room, now: datetime) -> dict:
+        players = []
+        for session_id, user_id in room.members.items():
+            data = session_data.get(session_id)
+            player = {"member_id": room.member_ids[session_id], "user_id": user_id, "place": room.place_of(session_id)}
+            if data is not None:
+                player.update(data.progress(now))
+            else:
+                finished = self.finished.get(session_id)
+                player.update(finished and finished[1] or {"position": 0, "net_wpm": 0, "accuracy": 100})
+            players.append(player)
+        room.seq += 1
+        return {
+            "type": "race_progress",
+            "room_id": room.room_id,
+            "seq": room.seq,
+            "status": room.status,
+            "players": players,
+            "timestamp": now.isoformat()
+        }
+    
+    async def send_room_ticks(self, room_ids: List[str]):
+        """One progress frame per room that changed since its last tick"""
+        now = datetime.utcnow()
+        for room_id in room_ids:
+            if self.rooms.get(room_id) is None:
+                self.room_ticker.unschedule(room_id)
+        for room in self.rooms.take_dirty(room_ids):
+            self.fan_out(room, self.room_progress(room, now))
+            if room.status == ROOM_FINISHED:
+                self.room_ticker.unschedule(room.room_id)
     
     async def start_metrics_updates(self, session_id: str):
-        """Start periodic metrics updates every 30 seconds"""
-        
-        async def update_metrics():
-            while session_id in self.active_connections and session_id in session_data:
-                await asyncio.sleep(30)  # Update every 30 seconds
-                
-                if session_id not in session_data:
-                    break
-                    
-                data = session_data[session_id]
-                metrics = data.calculate_metrics()
-                
-                response = {
-                    "type": "metrics_update",
-                    "metrics": metrics,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                
-                await self.send_personal_message(response, session_id)
-                logger.info("Metrics updated", session_id=session_id, metrics=metrics)
+        """Schedule periodic metrics updates every WS_METRICS_INTERVAL_SECONDS"""
+        self.metrics_ticker.schedule(session_id)
+    
+    async def send_metrics_updates(self, session_ids: List[str]):
+        """Push a metrics_update to every due session in one batch"""
+        timestamp = datetime.utcnow().isoformat()
+        sent = 0
+        checkpoints = []
+        for session_id in session_ids:
+            data = session_data.get(session_id)
+            if data is None or session_id not in self.active_connections:
+                self.metrics_ticker.unschedule(session_id)
+                continue
+            checkpoints.append((session_id, data.to_checkpoint()))
+            response = {
+                "type": "metrics_update",
+                "metrics": data.calculate_metrics(),
+                "timestamp": timestamp
+            }
+            await self.send_personal_message(response, session_id)
+            sent += 1
         
-        task = asyncio.create_task(update_metrics())
-        self.update_tasks[session_id] = task
+        try:
+            await session_store.save_many(checkpoints)
+        except Exception as e:
+            logger.warning("Session checkpoint batch failed", error=str(e), count=len(checkpoints))
+        logger.debug("Metrics tick", sent=sent)
+
+def _session_offset_ms(session_id: str) -> int:
+    data = session_data.get(session_id)
+    if data is None:
+        return 0
+    return data.elapsed_ms()
 
 manager = ConnectionManager()
 
+# Sampled at scrape time, nothing to update on the send path
+active_connections.set_function(lambda: len(manager.active_connections))
+ws_send_queue_depth.set_function(manager.queue_depth)
+ws_send_queue_max_depth.set_function(manager.max_queue_depth)
+
+def _negotiate_encoding(websocket: WebSocket, encoding: Optional[str]):
+    """Pick the wire encoding from ?encoding= or the offered subprotocols"""
+    offered = websocket.scope.get("subprotocols") or []
+    if codec.BINARY_SUBPROTOCOL in offered:
+        return codec.ENCODING_BINARY, codec.BINARY_SUBPROTOCOL
+    if encoding == codec.ENCODING_BINARY:
+        return codec.ENCODING_BINARY, None
+    return codec.ENCODING_JSON, None
+
 @router.websocket("/")
 async def websocket_endpoint(
     websocket: WebSocket,
     session_id: Optional[str] = Query(None),
-    token: Optional[str] = Query(None)
+    token: Optional[str] = Query(None),
+    encoding: Optional[str] = Query(None, description="json (default) or binary"),
+    resume_token: Optional[str] = Query(None, description="Resume a dropped session")
 ):
     """WebSocket endpoint for real-time typing sessions"""
     
@@ -153,21 +665,153 @@ async def websocket_endpoint(
     # Generate session ID if not provided
     if not session_id:
         session_id = str(uuid.uuid4())
+    elif not await may_claim_session(session_id, user_id, resume_token):
+        # Refuse the handshake instead of evicting the session's holder
+        logger.warning("WebSocket session claim refused", session_id=session_id, user_id=user_id)
+        await websocket.close(code=FORBIDDEN_CLOSE_CODE)
+        return
     
-    await manager.connect(websocket, session_id, user_id)
+    wire_encoding, subprotocol = _negotiate_encoding(websocket, encoding)
+    await manager.connect(websocket, session_id, user_id, wire_encoding, subprotocol)
     
     try:
+        if resume_token:
+            session_id = await resume_session(websocket, session_id, user_id, resume_token)
+        
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            manager.touch(session_id)
+            
+            if frame.get("bytes") is not None:
+                try:
+                    message = codec.decode(frame["bytes"])
+                except codec.FrameError as e:
+                    logger.warning("Invalid binary frame", error=str(e), session_id=session_id)
+                    continue
+            else:
+                message = json.loads(frame["text"])
             
-            await handle_websocket_message(websocket, session_id, user_id, message)
+            message_type = message.get("type")
+            if message_type not in _received_by_type:
+                message_type = "other"
+            _received_by_type[message_type].inc()
+            started = time.perf_counter()
+            
+            if message_type == "resume_session":
+                # May rebind this connection to the resumed session's id
+                session_id = await resume_session(websocket, session_id, user_id, message.get("resume_token"))
+            else:
+                await handle_websocket_message(websocket, session_id, user_id, message)
+            _handler_duration_by_type[message_type].observe(time.perf_counter() - started)
             
     except WebSocketDisconnect:
-        manager.disconnect(session_id, user_id)
+        await release_connection(websocket, session_id, user_id)
     except Exception as e:
         logger.error("WebSocket error", exc_info=e, session_id=session_id)
-        manager.disconnect(session_id, user_id)
+        await release_connection(websocket, session_id, user_id, reason="error")
+
+async def release_connection(websocket: WebSocket, session_id: str, user_id: Optional[str], reason: str = "client"):
+    """Reader-side cleanup; a no-op if the reaper or a newer connection got there first"""
+    if manager.active_connections.get(session_id) is not websocket:
+        return
+    await checkpoint_session(session_id, snapshot=True)
+    manager.disconnect(session_id, user_id, websocket, reason)
+
+async def checkpoint_session(session_id: str, snapshot: bool = False):
+    """Save the session's counters so another worker can pick it up.
+    
+    A snapshot (taken when the socket goes away) also carries the compressed
+    keystroke log and is kept for WS_RESUME_GRACE_SECONDS.
+    """
+    data = session_data.get(session_id)
+    if data is None:
+        return
+    try:
+        if snapshot:
+            await session_store.save(session_id, data.to_checkpoint(with_keystrokes=True), settings.WS_RESUME_GRACE_SECONDS)
+        else:
+            await session_store.save(session_id, data.to_checkpoint())
+    except Exception as e:
+        logger.warning("Session checkpoint failed", error=str(e), session_id=session_id)
+
+def _split_resume_token(resume_token: str) -> Tuple[str, str]:
+    session_id, _, secret = resume_token.rpartition(".")
+    return session_id, secret
+
+async def may_claim_session(session_id: str, user_id: Optional[str], resume_token: Optional[str]) -> bool:
+    """Whether a new connection may take ``session_id`` over from whoever holds it.
+    
+    An id with no live connection, session data or checkpoint is free. Otherwise
+    a session started by a signed-in user goes only to that user, and an
+    anonymous one only to a client presenting its resume token.
+    """
+    data = session_data.get(session_id)
+    if data is not None:
+        owner, secret = data.user_id, data.resume_token
+    else:
+        try:
+            checkpoint = await session_store.load(session_id)
+        except Exception as e:
+            logger.warning("Session checkpoint load failed", error=str(e), session_id=session_id)
+            checkpoint = None
+        if checkpoint is not None:
+            owner, secret = checkpoint.get("user_id"), checkpoint.get("resume_token")
+        elif session_id in manager.outboxes:
+            owner, secret = manager.connection_users.get(session_id), None
+        else:
+            return True
+    if owner:
+        return owner == user_id
+    target, presented = _split_resume_token(resume_token or "")
+    return bool(secret) and target == session_id and secrets.compare_digest(secret, presented)
+
+async def resume_session(websocket: WebSocket, session_id: str, user_id: Optional[str], resume_token: Optional[str]) -> str:
+    """Rehydrate a snapshot from ``resume_token`` and return the session id now served"""
+    
+    async def fail(reason: str) -> str:
+        await manager.send_personal_message({"type": "resume_failed", "reason": reason}, session_id)
+        logger.info("Session resume failed", session_id=session_id, reason=reason)
+        return session_id
+    
+    target, secret = _split_resume_token(resume_token or "")
+    if not target or not secret:
+        return await fail("invalid_token")
+    
+    data = session_data.get(target)
+    restored = data is None or manager.active_connections.get(target) is websocket
+    if restored:
+        checkpoint = await session_store.load(target)
+        if checkpoint is None:
+            return await fail("expired")
+        data = SessionData.from_checkpoint(target, checkpoint)
+    if not secrets.compare_digest(data.resume_token, secret):
+        return await fail("invalid_token")
+    if data.user_id != user_id:
+        return await fail("forbidden")
+    
+    manager.rebind(websocket, session_id, target)
+    if data.article_id and data.expected is None:
+        await load_expected_text(data)
+    if restored:
+        data.key_stats = KeyStats.from_buffer(data.keystrokes, data.expected)
+    session_data[target] = data
+    await manager.start_metrics_updates(target)
+    
+    # Everything counted so far is acknowledged; the client resends from here
+    response = {
+        "type": "session_resumed",
+        "session_id": target,
+        "resume_token": f"{target}.{data.resume_token}",
+        "position": data.cursor,
+        "keystrokes_received": data.total_chars,
+        "metrics": data.calculate_metrics(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    await manager.send_personal_message(response, target)
+    logger.info("Session resumed", session_id=target, user_id=user_id)
+    return target
 
 async def handle_websocket_message(
     websocket: WebSocket, 
@@ -183,10 +827,20 @@ async def handle_websocket_message(
         await handle_start_session(websocket, session_id, user_id, message)
     elif message_type == "keystroke":
         await handle_keystroke(websocket, session_id, user_id, message)
+    elif message_type == "keystroke_batch":
+        await handle_keystroke_batch(websocket, session_id, user_id, message)
     elif message_type == "heartbeat":
         await handle_heartbeat(websocket, session_id, user_id, message)
+    elif message_type == "pong":
+        pass  # Liveness is recorded for every inbound frame
     elif message_type == "finish_session":
         await handle_finish_session(websocket, session_id, user_id, message)
+    elif message_type == "join_room":
+        await handle_join_room(websocket, session_id, user_id, message)
+    elif message_type == "leave_room":
+        manager.leave_room(session_id)
+    elif message_type == "start_race":
+        await handle_start_race(websocket, session_id, user_id, message)
     else:
         logger.warning("Unknown message type", type=message_type, session_id=session_id)
 
@@ -194,7 +848,23 @@ async def handle_start_session(websocket: WebSocket, session_id: str, user_id: O
     """Handle session start"""
     
     # Initialize session data
-    session_data[session_id] = SessionData(session_id)
+    data = SessionData(session_id, user_id)
+    ack_mode = message.get("ack_mode")
+    if ack_mode in ACK_MODES:
+        data.ack_mode = ack_mode
+    data.article_id = message.get("article_id")
+    data.article_version = _as_int(message.get("article_version"))
+    mode_seconds = _as_int(message.get("mode_seconds"))
+    # Any other duration is not a practice mode and is never persisted
+    data.mode_seconds = mode_seconds if mode_seconds in settings.PRACTICE_DURATIONS else None
+    # Replaced by the article's own language once the text resolves
+    data.language = message.get("language")
+    manager.finished.pop(session_id, None)
+    if data.article_id and not await load_expected_text(data):
+        # Unknown article: nothing to check against and nothing to persist
+        data.article_id = None
+    session_data[session_id] = data
+    await checkpoint_session(session_id)
     
     # Start metrics update task
     await manager.start_metrics_updates(session_id)
@@ -202,30 +872,104 @@ async def handle_start_session(websocket: WebSocket, session_id: str, user_id: O
     response = {
         "type": "session_started",
         "session_id": session_id,
+        "ack_mode": data.ack_mode,
+        "verified": data.expected is not None,
+        "resume_token": f"{session_id}.{data.resume_token}",
         "timestamp": datetime.utcnow().isoformat()
     }
     
     await manager.send_personal_message(response, session_id)
     logger.info("Session started", session_id=session_id, user_id=user_id)
 
+async def load_expected_text(data: SessionData) -> bool:
+    """Attach the article's code points from the per-process cache.
+    
+    A missing or unknown version resolves to another one (usually the current
+    content); ``article_version`` becomes the version actually judged against
+    and ``language`` the article's, whatever the client claimed.
+    """
+    try:
+        text = await article_cache.get(data.article_id, data.article_version)
+    except Exception as e:
+        logger.warning("Article text load failed", error=str(e), article_id=data.article_id)
+        return False
+    if text is None:
+        return False
+    data.article_version = text.version
+    data.language = text.language
+    data.expected = text.code_points
+    return True
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _parse_timestamp(timestamp_str: Optional[str]) -> datetime:
+    if not timestamp_str:
+        return datetime.utcnow()
+    try:
+        return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return datetime.utcnow()
+
+def _owned_session(session_id: str, user_id: Optional[str]) -> Optional[SessionData]:
+    """The session's data, or None unless this connection's user started it"""
+    data = session_data.get(session_id)
+    if data is not None and data.user_id != user_id:
+        logger.warning("Session not owned by connection", session_id=session_id, user_id=user_id)
+        return None
+    return data
+
+def _add_keystroke(data: SessionData, keystroke: dict, received_ms: Optional[int] = None) -> Tuple[bool, int]:
+    """Record one keystroke and return its (server-judged) correctness and position.
+    
+    ``t`` (ms offset from session start) wins over ``timestamp``. The position
+    is the server-side cursor; a client ``position`` that disagrees is only
+    counted, never used, so it cannot steer which character gets compared.
+    A backspace moves the cursor back and is not counted as typed; a ``char``
+    longer than one code point, or arriving after the mode has run out, is dropped.
+    """
+    char = keystroke.get("char", "")
+    if not isinstance(char, str) or len(char) > 1 or data.over_time(received_ms):
+        return False, data.cursor
+    
+    offset = keystroke.get("t")
+    if not isinstance(offset, int):
+        offset = None
+    if char == BACKSPACE:
+        data.backspace(_parse_timestamp(keystroke.get("timestamp")), offset)
+        return False, data.cursor
+    
+    position = data.cursor
+    claimed = keystroke.get("position")
+    if isinstance(claimed, int) and claimed != position:
+        data.position_mismatches += 1
+    correct = data.judge(char, position, keystroke.get("correct", False))
+    data.cursor = position + 1
+    
+    target = data.expected_char(position)
+    if offset is not None:
+        data.add_keystroke(char, correct, offset_ms=offset, received_ms=received_ms, target=target)
+    else:
+        data.add_keystroke(char, correct, _parse_timestamp(keystroke.get("timestamp")), received_ms=received_ms, target=target)
+    return correct, position
+
 async def handle_keystroke(websocket: WebSocket, session_id: str, user_id: Optional[str], message: dict):
     """Handle keystroke event"""
     
     # Extract keystroke data
     char = message.get("char", "")
-    correct = message.get("correct", False)
-    position = message.get("position", 0)
-    timestamp_str = message.get("timestamp", datetime.utcnow().isoformat())
-    
-    try:
-        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-    except:
-        timestamp = datetime.utcnow()
     
     # Update session data
-    if session_id in session_data:
-        data = session_data[session_id]
-        data.add_keystroke(char, correct, timestamp)
+    data = _owned_session(session_id, user_id)
+    if data is not None:
+        correct, position = _add_keystroke(data, message)
+        manager.rooms.mark_dirty(session_id)
+        
+        if not data.should_ack(message.get("ack")):
+            return
         
         # Send immediate feedback
         response = {
@@ -237,7 +981,38 @@ async def handle_keystroke(websocket: WebSocket, session_id: str, user_id: Optio
         }
         
         await manager.send_personal_message(response, session_id)
+
+async def handle_keystroke_batch(websocket: WebSocket, session_id: str, user_id: Optional[str], message: dict):
+    """Handle several keystrokes carried in one frame"""
+    
+    data = _owned_session(session_id, user_id)
+    if data is None:
+        return
+    
+    keystrokes = (message.get("keystrokes") or [])[:settings.WS_KEYSTROKE_BATCH_MAX]
+    position = None
+    received_ms = data.elapsed_ms()
+    for keystroke in keystrokes:
+        if not isinstance(keystroke, dict):
+            continue
+        _, position = _add_keystroke(data, keystroke, received_ms)
+    manager.rooms.mark_dirty(session_id)
     
+    if not data.should_ack(message.get("ack")):
+        return
+    
+    # One coalesced ack for the whole frame
+    response = {
+        "type": "keystroke_batch_processed",
+        "seq": message.get("seq"),
+        "count": len(keystrokes),
+        "position": position,
+        "total_chars": data.total_chars,
+        "correct_chars": data.correct_chars,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    await manager.send_personal_message(response, session_id)
 
 
 async def handle_heartbeat(websocket: WebSocket, session_id: str, user_id: Optional[str], message: dict):
@@ -251,14 +1026,39 @@ async def handle_heartbeat(websocket: WebSocket, session_id: str, user_id: Optio
     await manager.send_personal_message(response, session_id)
 
 async def handle_finish_session(websocket: WebSocket, session_id: str, user_id: Optional[str], message: dict):
-    """Handle session completion"""
+    """Handle session completion; a repeated finish_session gets the stored result back"""
+    
+    finished = manager.finished.get(session_id)
+    if finished is not None:
+        await manager.send_personal_message(finished[0], session_id)
+        return
+    if session_id in session_data and _owned_session(session_id, user_id) is None:
+        return
     
     # Calculate final metrics
     final_metrics = {"net_wpm": 0, "gross_wpm": 0, "accuracy": 100, "errors": 0}
+    key_stats = None
+    record_id = None
+    progress = None
+    place = manager.rooms.finish(session_id)
     
-    if session_id in session_data:
-        data = session_data[session_id]
+    # Forget the session first so nothing else can persist or tick it again
+    data = session_data.pop(session_id, None)
+    manager.metrics_ticker.unschedule(session_id)
+    if data is not None:
         final_metrics = data.calculate_metrics()
+        key_stats = data.key_stats.summary()
+        progress = data.progress(datetime.utcnow())
+        
+        # Persist asynchronously; the reply does not wait for the database
+        record = data.to_records(final_metrics, datetime.utcnow(), key_stats)
+        if record is not None and session_writer.enqueue(record):
+            record_id = str(record["session"]["id"])
+    
+    try:
+        await session_store.delete(session_id)
+    except Exception as e:
+        logger.warning("Session checkpoint delete failed", error=str(e), session_id=session_id)
     
     # Process final results
     final_text = message.get("text", "")
@@ -268,8 +1068,54 @@ async def handle_finish_session(websocket: WebSocket, session_id: str, user_id:
         "type": "session_ended",
         "session_id": session_id,
         "final_results": final_metrics,
+        "key_stats": key_stats,
+        "record_id": record_id,
         "timestamp": datetime.utcnow().isoformat()
     }
+    if place is not None:
+        response["place"] = place
+    manager.finished[session_id] = (response, progress)
     
     await manager.send_personal_message(response, session_id)
-    logger.info("Session finished", session_id=session_id, user_id=user_id, final_results=final_metrics)
\ No newline at end of file
+    logger.info(
+        "Session finished",
+        session_id=session_id,
+        user_id=user_id,
+        final_results=final_metrics,
+        position_mismatches=data.position_mismatches if data is not None else 0,
+    )
+
+async def handle_join_room(websocket: WebSocket, session_id: str, user_id: Optional[str], message: dict):
+    """Join (or create) a race room; every member gets the new roster"""
+    
+    room_id = message.get("room_id") or str(uuid.uuid4())
+    try:
+        room = manager.rooms.join(str(room_id), session_id, user_id, message.get("article_id"))
+    except RoomError as e:
+        await manager.send_personal_message({"type": "room_error", "reason": e.reason}, session_id)
+        return
+    
+    # Only the joiner learns which member id is theirs
+    await manager.send_personal_message(
+        {"type": "room_joined", "room_id": room.room_id, "member_id": room.member_id(session_id)}, session_id
+    )
+    manager.fan_out(room, {"type": "room_update", **room.roster(), "timestamp": datetime.utcnow().isoformat()})
+    logger.info("Room joined", room_id=room.room_id, session_id=session_id, members=len(room))
+
+async def handle_start_race(websocket: WebSocket, session_id: str, user_id: Optional[str], message: dict):
+    """Host starts the race; progress frames follow every WS_RACE_TICK_SECONDS"""
+    
+    try:
+        room = manager.rooms.start(session_id)
+    except RoomError as e:
+        await manager.send_personal_message({"type": "room_error", "reason": e.reason}, session_id)
+        return
+    
+    manager.room_ticker.schedule(room.room_id)
+    manager.fan_out(room, {
+        "type": "race_started",
+        "room_id": room.room_id,
+        "article_id": room.article_id,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+    logger.info("Race started", room_id=room.room_id, members=len(room))
@@ -0,0 +1,84 @@
+"""
+Shared periodic scheduler for WebSocket sessions
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import structlog
+
+logger = structlog.get_logger()
+
+TickCallback = Callable[[List[str]], Awaitable[None]]
+
+
+class MetricsTicker:
+    """Timing wheel that fires a callback for every session once per interval.
+
+    The wheel has ``interval / tick`` slots and exactly one slot is due per
+    tick. Because a full revolution equals the interval, a session stays in the
+    slot it was scheduled into, so scheduling and cancelling are O(1) and a
+    tick only touches the sessions that are due. A single asyncio task serves
+    every connection on the worker.
+    """
+
+    def __init__(self, callback: TickCallback, interval: float = 30.0, tick: float = 1.0):
+        if tick <= 0 or interval < tick:
+            raise ValueError("interval must be >= tick > 0")
+        self.callback = callback
+        self.tick = tick
+        self.slot_count = max(1, round(interval / tick))
+        self._slots: List[Set[str]] = [set() for _ in range(self.slot_count)]
+        self._slot_of: Dict[str, int] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._slot_of
+
+    def schedule(self, session_id: str) -> None:
+        """Fire for ``session_id`` one full interval from now, then every interval"""
+        self.unschedule(session_id)
+        # The slot that was just processed comes round again after exactly one interval
+        slot = (self._cursor - 1) % self.slot_count
+        self._slots[slot].add(session_id)
+        self._slot_of[session_id] = slot
+        self._ensure_running()
+
+    def unschedule(self, session_id: str) -> None:
+        slot = self._slot_of.pop(session_id, None)
+        if slot is not None:
+            self._slots[slot].discard(session_id)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def advance(self) -> List[str]:
+        """Move the wheel by one slot and return the sessions that are due"""
+        due = list(self._slots[self._cursor])
+        self._cursor = (self._cursor + 1) % self.slot_count
+        return due
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.tick
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            due = self.advance()
+            if not due:
+                continue
+            try:
+                await self.callback(due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Metrics tick failed", exc_info=e, due=len(due))
@@ -0,0 +1,133 @@
+"""
+Shared session state for the WebSocket layer
+
+A checkpoint is the compact set of counters needed to rebuild a session's
+``calculate_metrics`` output on any worker: start time, keystroke counters and
+the last keystroke offset. The in-process store is the default; the Redis
+store lets ``/ws`` run on several uvicorn workers.
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+CHECKPOINT_FIELDS = ("start_ms", "total_chars", "correct_chars", "errors", "last_offset")
+OPTIONAL_INT_FIELDS = ("article_version", "mode_seconds", "cursor")
+OPTIONAL_STR_FIELDS = ("user_id", "article_id", "language", "resume_token", "keystrokes")
+
+
+class SessionStateStore(ABC):
+    """Interface for session checkpoint storage"""
+
+    async def save(self, session_id: str, checkpoint: dict, ttl: Optional[int] = None) -> None:
+        await self.save_many([(session_id, checkpoint)], ttl)
+
+    @abstractmethod
+    async def save_many(self, checkpoints: Iterable[Tuple[str, dict]], ttl: Optional[int] = None) -> None:
+        """Store checkpoints; ``ttl`` overrides the store's default expiry"""
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+
+class InMemorySessionStore(SessionStateStore):
+    """Process-local store; checkpoints expire after ``ttl`` seconds"""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        # session_id -> (expires_at, checkpoint), roughly in expiry order
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _purge(self, now: float) -> None:
+        # Shorter TTLs can sit behind longer ones; those go on load or a later purge
+        while self._entries:
+            session_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[session_id]
+
+    async def save_many(self, checkpoints: Iterable[Tuple[str, dict]], ttl: Optional[int] = None) -> None:
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        for session_id, checkpoint in checkpoints:
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = (expires_at, dict(checkpoint))
+        self._purge(now)
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        entry = self._entries.get(session_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return dict(entry[1])
+
+    async def delete(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+
+
+class RedisSessionStore(SessionStateStore):
+    """One small hash per session, written in a single pipeline per batch"""
+
+    def __init__(self, ttl: int, prefix: str = "ws:session:"):
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    async def save_many(self, checkpoints: Iterable[Tuple[str, dict]], ttl: Optional[int] = None) -> None:
+        checkpoints = list(checkpoints)
+        if not checkpoints:
+            return
+        client = await get_redis_client()
+        async with client.pipeline(transaction=False) as pipe:
+            for session_id, checkpoint in checkpoints:
+                key = self._key(session_id)
+                mapping = {k: v for k, v in checkpoint.items() if v is not None}
+                cleared = [k for k, v in checkpoint.items() if v is None]
+                pipe.hset(key, mapping=mapping)
+                if cleared:
+                    pipe.hdel(key, *cleared)
+                pipe.expire(key, self.ttl if ttl is None else ttl)
+            await pipe.execute()
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        client = await get_redis_client()
+        raw: Dict[str, str] = await client.hgetall(self._key(session_id))
+        if not raw:
+            return None
+        checkpoint: dict = {k: int(v) for k, v in raw.items() if k in CHECKPOINT_FIELDS}
+        if len(checkpoint) != len(CHECKPOINT_FIELDS):
+            return None
+        for field in OPTIONAL_INT_FIELDS:
+            checkpoint[field] = int(raw[field]) if field in raw else None
+        for field in OPTIONAL_STR_FIELDS:
+            checkpoint[field] = raw.get(field)
+        return checkpoint
+
+    async def delete(self, session_id: str) -> None:
+        client = await get_redis_client()
+        await client.delete(self._key(session_id))
+
+
+def create_session_store() -> SessionStateStore:
+    backend = settings.WS_SESSION_BACKEND.lower()
+    if backend == "redis":
+        return RedisSessionStore(settings.WS_SESSION_STATE_TTL_SECONDS)
+    if backend != "memory":
+        logger.warning("Unknown WS_SESSION_BACKEND, using memory", backend=backend)
+    return InMemorySessionStore(settings.WS_SESSION_STATE_TTL_SECONDS)
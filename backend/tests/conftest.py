@@ -124,3 +124,217 @@ def admin_headers(admin_token: str) -> dict:
     """生成管理員認證 headers"""
     return {"Authorization": f"Bearer {admin_token}"}
 
+
+@pytest.fixture
+def ws_client():
+    """只掛載 WebSocket 路由的測試客戶端"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.ws.router import router as ws_router
+
+    ws_app = FastAPI()
+    ws_app.include_router(ws_router, prefix="/ws")
+    with TestClient(ws_app) as client:
+        yield client
+
+
+# SQLite 無法產生 UUID 欄位的 DDL，排行榜相關表改以等價的 CHAR(32) 建立
+SCORE_TABLES_DDL = (
+    "CREATE TABLE users (id CHAR(32) PRIMARY KEY, display_name VARCHAR, picture VARCHAR)",
+    "CREATE TABLE typing_sessions (id CHAR(32) PRIMARY KEY, user_id CHAR(32), mode_seconds INTEGER)",
+    "CREATE TABLE scores (id CHAR(32) PRIMARY KEY, session_id CHAR(32), wpm FLOAT, accuracy FLOAT, "
+    "language VARCHAR(10), created_at DATETIME, is_void BOOLEAN)",
+    "CREATE TABLE user_best_scores (user_id CHAR(32), language VARCHAR(10), mode_seconds INTEGER, "
+    "period VARCHAR(10), bucket VARCHAR(8), score_id CHAR(32), wpm FLOAT, accuracy FLOAT, achieved_at DATETIME, "
+    "PRIMARY KEY (user_id, language, mode_seconds, period))",
+    "CREATE TABLE user_hourly_best_scores (user_id CHAR(32), language VARCHAR(10), hour DATETIME, "
+    "score_id CHAR(32), wpm FLOAT, accuracy FLOAT, achieved_at DATETIME, PRIMARY KEY (user_id, language, hour))",
+    "CREATE TABLE leaderboards (id CHAR(32) PRIMARY KEY, scope VARCHAR(7), category VARCHAR(20), "
+    "rank_json JSON, updated_at DATETIME)",
+    "CREATE UNIQUE INDEX uq_leaderboards_scope_category ON leaderboards(scope, category)",
+)
+
+
+@pytest.fixture
+def score_db(tmp_path):
+    """建立排行榜相關資料表的 SQLite session maker"""
+    from sqlalchemy import text
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'scores.db'}")
+
+    async def setup():
+        async with engine.begin() as conn:
+            for statement in SCORE_TABLES_DDL:
+                await conn.execute(text(statement))
+
+    asyncio.run(setup())
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def add_score():
+    """新增一筆練習與成績，回傳 score id"""
+    import uuid
+    from sqlalchemy import text
+
+    async def add(db, user_id, wpm, accuracy, language, created_at, mode_seconds=60):
+        session_id, score_id = uuid.uuid4(), uuid.uuid4()
+        await db.execute(
+            text("INSERT INTO typing_sessions VALUES (:id, :user_id, :mode)"),
+            {"id": session_id.hex, "user_id": user_id.hex, "mode": mode_seconds},
+        )
+        await db.execute(
+            text("INSERT INTO scores VALUES (:id, :session_id, :wpm, :accuracy, :language, :created_at, 0)"),
+            {"id": score_id.hex, "session_id": session_id.hex, "wpm": wpm, "accuracy": accuracy,
+             "language": language, "created_at": created_at},
+        )
+        return score_id
+
+    return add
+
+
+class FakeRedis:
+    """只實作排行榜與 WPM sketch 用到的 Redis 指令；fail 為 True 時 pipeline 執行失敗"""
+
+    def __init__(self, zsets=None, hashes=None, strings=None):
+        self.zsets = zsets if zsets is not None else {}
+        self.hashes = hashes if hashes is not None else {}
+        self.strings = strings if strings is not None else {}
+        self.fail = False
+
+    def _ranked(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: -item[1])
+
+    async def zrevrange(self, key, start, stop, withscores=False):
+        return self._ranked(key)[start:stop + 1]
+
+    async def exists(self, key):
+        return int(key in self.strings)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def delete(self, key):
+        self.strings.pop(key, None)
+        self.hashes.pop(key, None)
+        self.zsets.pop(key, None)
+
+    async def hgetall(self, key):
+        return {k: str(v) for k, v in self.hashes.get(key, {}).items()}
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self.hashes.setdefault(key, {}).update(mapping or {field: value})
+
+    def register_script(self, source):
+        from app.services.wpm_sketches import _FLUSH_UNLESS_REBUILDING
+
+        if source == _FLUSH_UNLESS_REBUILDING:
+            return FakeFlushScript(self)
+        return FakeRecordScript(self)
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakeRecordScript:
+    """排行榜的 _RECORD_BEST：只在分數較高時更新"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def __call__(self, keys, args, client):
+        def run():
+            zset = self.client.zsets.setdefault(keys[0], {})
+            member, value, detail = args[0], float(args[1]), args[2]
+            if member not in zset or value > zset[member]:
+                zset[member] = value
+                self.client.hashes.setdefault(keys[1], {})[member] = detail
+        client.commands.append(run)
+
+
+class FakeFlushScript:
+    """WPM sketch 的 _FLUSH_UNLESS_REBUILDING：重建鎖存在時不寫入"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def __call__(self, keys, args):
+        if self.client.fail:
+            raise ConnectionError("redis down")
+        if keys[0] in self.client.strings:
+            return 0
+        args = iter(args)
+        for key in keys[1:]:
+            fields = self.client.hashes.setdefault(key, {})
+            for _ in range(next(args)):
+                field, amount = next(args), next(args)
+                fields[field] = fields.get(field, 0) + amount
+        return 1
+
+
+class FakePipeline:
+    """指令於 execute 時依序執行，回傳各指令結果"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hmget(self, key, fields):
+        self.commands.append(lambda: [self.client.hashes.get(key, {}).get(f) for f in fields])
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self.commands.append(lambda: self.client.hashes.setdefault(key, {}).update(mapping or {field: value}))
+
+    def delete(self, key):
+        self.commands.append(lambda: self.client.hashes.pop(key, None))
+
+    def rename(self, source, destination):
+        self.commands.append(lambda: self.client.hashes.__setitem__(destination, self.client.hashes.pop(source)))
+
+    def exists(self, key):
+        self.commands.append(lambda: int(key in self.client.strings))
+
+    def zrevrange(self, key, start, stop, withscores=False):
+        self.commands.append(lambda: self.client._ranked(key)[start:stop + 1])
+
+    def zrevrank(self, key, member):
+        def run():
+            members = [m for m, _ in self.client._ranked(key)]
+            return members.index(member) if member in members else None
+        self.commands.append(run)
+
+    def zcard(self, key):
+        self.commands.append(lambda: len(self.client.zsets.get(key, {})))
+
+    async def execute(self):
+        if self.client.fail:
+            raise ConnectionError("redis down")
+        return [command() for command in self.commands]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """建立 FakeRedis 並替換指定模組的 get_redis_client"""
+
+    def install(*modules, zsets=None, hashes=None, strings=None):
+        client = FakeRedis(zsets, hashes, strings)
+
+        async def get_client():
+            return client
+
+        for module in modules:
+            monkeypatch.setattr(module, "get_redis_client", get_client)
+        return client
+
+    return install
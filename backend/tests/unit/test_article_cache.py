@@ -0,0 +1,84 @@
+"""
+文章內容快取測試
+"""
+import asyncio
+
+from app.services.article_cache import ArticleTextCache, to_code_points
+
+
+class TestArticleTextCache:
+    """ArticleTextCache 測試"""
+
+    def test_to_code_points(self):
+        """測試轉換為 code point"""
+        assert list(to_code_points("a字\r\nb")) == [ord("a"), ord("字"), ord("\n"), ord("b")]
+
+    def test_concurrent_misses_load_once(self):
+        """測試同時查詢只讀取一次"""
+        calls = []
+
+        async def loader(article_id, version):
+            calls.append((article_id, version))
+            await asyncio.sleep(0.01)
+            return version, "hello", "en"
+
+        async def scenario():
+            cache = ArticleTextCache(4, loader)
+            results = await asyncio.gather(*[cache.get("a1", 2) for _ in range(10)])
+            again = await cache.get("a1", 2)
+            return cache, results, again
+
+        cache, results, again = asyncio.run(scenario())
+        assert calls == [("a1", 2)]
+        assert all(list(r.code_points) == list(map(ord, "hello")) for r in results)
+        assert again is results[0]
+        assert cache.hits == 1
+
+    def test_lru_eviction(self):
+        """測試超過容量時淘汰最久未用的項目"""
+        async def loader(article_id, version):
+            return version, article_id, "en"
+
+        async def scenario():
+            cache = ArticleTextCache(2, loader)
+            await cache.get("a", 1)
+            await cache.get("b", 1)
+            await cache.get("a", 1)
+            await cache.get("c", 1)
+            return cache
+
+        cache = asyncio.run(scenario())
+        assert len(cache) == 2
+        assert ("b", 1) not in cache._entries
+        assert ("a", 1) in cache._entries
+
+    def test_latest_and_missing_lookups_are_reused(self, monkeypatch):
+        """測試未指定版本、未知版本與查無文章的結果在期限內不再查詢資料庫"""
+        from app.services import article_cache as cache_module
+
+        calls = []
+        clock = [100.0]
+
+        async def loader(article_id, version):
+            calls.append((article_id, version))
+            return None if article_id == "gone" else (3, "text", "en")
+
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock[0])
+
+        async def scenario():
+            cache = ArticleTextCache(4, loader, alias_ttl=30)
+            latest = [await cache.get("a1") for _ in range(3)]
+            unknown = [await cache.get("a1", 9) for _ in range(2)]
+            exact = await cache.get("a1", 3)
+            missing = [await cache.get("gone") for _ in range(2)]
+            clock[0] += 31
+            await cache.get("a1")
+            return latest, unknown, exact, missing
+
+        latest, unknown, exact, missing = asyncio.run(scenario())
+        assert latest[0] is latest[2]
+        assert unknown[0] is unknown[1] is exact
+        # 未知版本回傳實際比對的版本
+        assert unknown[0].version == 3
+        assert missing == [None, None]
+        assert calls == [("a1", None), ("a1", 9), ("gone", None), ("a1", None)]
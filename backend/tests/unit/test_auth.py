@@ -71,6 +71,42 @@ class TestJWTToken:
         """測試驗證過期 Token"""
         # 這需要模擬時間，暫時跳過
         pass
+    
+    def test_verified_payload_is_cached(self, monkeypatch):
+        """測試已驗證的 Token 由快取回應，不再解碼"""
+        from app.core import security
+        
+        token = create_access_token(data={"sub": "cached@example.com"})
+        security.token_cache.clear()
+        assert verify_token(token)["sub"] == "cached@example.com"
+        
+        def fail_decode(*args, **kwargs):
+            raise AssertionError("decoded again")
+        
+        monkeypatch.setattr(security.jwt, "decode", fail_decode)
+        payload = verify_token(token)
+        assert payload["sub"] == "cached@example.com"
+        # 回傳副本，呼叫端修改不影響快取
+        payload["sub"] = "changed"
+        assert verify_token(token)["sub"] == "cached@example.com"
+    
+    def test_cache_honours_exp_and_capacity(self, monkeypatch):
+        """測試快取依 exp 過期且有容量上限"""
+        from app.core.security import TokenCache
+        
+        cache = TokenCache(capacity=2)
+        cache.put("a", {"sub": "a", "exp": 1000})
+        cache.put("b", {"sub": "b", "exp": 2000})
+        cache.put("no-exp", {"sub": "x"})
+        assert len(cache) == 2
+        
+        monkeypatch.setattr("app.core.security.time.time", lambda: 1500)
+        assert cache.get("a") is None
+        assert cache.get("b")["sub"] == "b"
+        
+        cache.put("c", {"sub": "c", "exp": 3000})
+        cache.put("d", {"sub": "d", "exp": 3000})
+        assert cache.get("b") is None
 
 
 class TestAuthEndpoints:
@@ -0,0 +1,222 @@
+"""
+每位使用者最佳成績表測試
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.services.best_scores import ALL_MODES, best_rows, best_scores
+
+NOW = datetime(2024, 1, 31, 12, 0)
+
+
+class TestBestRows:
+    """候選列產生測試"""
+
+    def test_rows_per_period_language_and_mode(self):
+        """測試每個週期產生語言 / overall × 模式 / 全部模式四列"""
+        rows = best_rows(uuid.uuid4(), uuid.uuid4(), "en", 60, 80.0, 95.0, NOW)
+        assert len(rows) == 16
+        keys = {(r["period"], r["language"], r["mode_seconds"]) for r in rows}
+        assert ("daily", "overall", ALL_MODES) in keys
+        assert ("alltime", "en", 60) in keys
+        assert {r["bucket"] for r in rows if r["period"] == "weekly"} == {"2024W05"}
+        assert best_rows(uuid.uuid4(), uuid.uuid4(), "en", 60, 0.0, 95.0, NOW) == []
+
+
+class TestBestScoreTable:
+    """upsert 與查詢測試"""
+
+    def test_record_keeps_best_and_resets_on_new_bucket(self, score_db):
+        """測試較差成績不覆蓋、同批取最佳、時間桶切換後直接覆蓋"""
+        user = uuid.uuid4()
+        tomorrow = datetime(2024, 2, 1, 9, 0)
+
+        async def best(db, period):
+            result = await db.execute(text(
+                "SELECT wpm, bucket FROM user_best_scores "
+                "WHERE period = :period AND language = 'overall' AND mode_seconds = 0"
+            ), {"period": period})
+            return tuple(result.one())
+
+        async def run():
+            async with score_db() as db:
+                await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 80.0, 95.0, NOW))
+                # 同一批出現同一主鍵兩次
+                await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 70.0, 99.0, NOW)
+                                         + best_rows(user, uuid.uuid4(), "en", 60, 85.0, 90.0, NOW))
+                first = await best(db, "daily")
+                await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 50.0, 90.0, tomorrow))
+                return first, await best(db, "daily"), await best(db, "alltime")
+
+        first, next_day, alltime = asyncio.run(run())
+        assert first == (85.0, "20240131")
+        assert next_day == (50.0, "20240201")
+        assert alltime == (85.0, "all")
+
+    def test_late_flush_does_not_overwrite_newer_bucket(self, score_db):
+        """測試延遲寫入的前一天成績不會覆蓋今天時間桶的列"""
+        user = uuid.uuid4()
+        tomorrow = datetime(2024, 2, 1, 9, 0)
+
+        async def run():
+            async with score_db() as db:
+                await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 50.0, 90.0, tomorrow))
+                await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 120.0, 99.0, NOW))
+                result = await db.execute(text(
+                    "SELECT period, wpm, bucket FROM user_best_scores "
+                    "WHERE language = 'overall' AND mode_seconds = 0"
+                ))
+                return {period: (wpm, bucket) for period, wpm, bucket in result.all()}
+
+        best = asyncio.run(run())
+        assert best["daily"] == (50.0, "20240201")
+        assert best["monthly"] == (50.0, "202402")
+        # 同一時間桶仍取較好的成績
+        assert best["alltime"] == (120.0, "all")
+
+    def test_rebuild_after_void_and_ranked_reads(self, score_db, add_score):
+        """測試作廢後重算，以及依名次讀取"""
+        alice, bob = uuid.uuid4(), uuid.uuid4()
+
+        async def run():
+            async with score_db() as db:
+                await db.execute(text("INSERT INTO users VALUES (:a, 'alice', NULL), (:b, 'bob', NULL)"),
+                                 {"a": alice.hex, "b": bob.hex})
+                voided = await add_score(db, alice, 120.0, 99.0, "en", NOW)
+                await add_score(db, alice, 90.0, 95.0, "en", NOW, mode_seconds=180)
+                await add_score(db, bob, 100.0, 97.0, "zh-TW", NOW)
+                await best_scores.rebuild_user(db, alice)
+                await best_scores.rebuild_user(db, bob)
+                before = await best_scores.top(db, "daily", "overall", 10, NOW)
+
+                await db.execute(text("UPDATE scores SET is_void = 1 WHERE id = :id"), {"id": voided.hex})
+                await best_scores.rebuild_user(db, alice)
+                after = await best_scores.top(db, "daily", "overall", 10, NOW)
+                by_mode = await best_scores.top(db, "alltime", "en", 10, NOW, mode_seconds=60)
+                group = await best_scores.for_users(db, [alice], now=NOW)
+                return before, after, by_mode, group, await best_scores.languages(db)
+
+        before, after, by_mode, group, languages = asyncio.run(run())
+        assert [(row[4], row[0]) for row in before] == [("alice", 120.0), ("bob", 100.0)]
+        assert [(row[4], row[0]) for row in after] == [("bob", 100.0), ("alice", 90.0)]
+        assert by_mode == []
+        assert [(row[4], row[0]) for row in group] == [("alice", 90.0)]
+        assert languages == ["en", "zh-TW"]
+
+    def test_rank_of_counts_users_ahead(self, score_db, add_score):
+        """測試 SQL 版名次：領先人數與鄰居"""
+        users = [uuid.uuid4() for _ in range(5)]
+
+        async def run():
+            async with score_db() as db:
+                for i, user in enumerate(users):
+                    await db.execute(text("INSERT INTO users VALUES (:id, :name, NULL)"), {"id": user.hex, "name": f"u{i}"})
+                    await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 100.0 - i, 95.0, NOW))
+                return (
+                    await best_scores.rank_of(db, users[0], "daily", "overall", 1, NOW),
+                    await best_scores.rank_of(db, users[3], "daily", "overall", 1, NOW),
+                    await best_scores.rank_of(db, uuid.uuid4(), "daily", "overall", 1, NOW),
+                )
+
+        first, fourth, missing = asyncio.run(run())
+        assert first[:2] == (1, 5)
+        assert [row[4] for row in first[2]] == ["u0", "u1"]
+        assert fourth[:2] == (4, 5)
+        assert [row[4] for row in fourth[2]] == ["u2", "u3", "u4"]
+        assert missing == (None, 5, [])
+
+    def test_rank_of_breaks_ties_like_neighbours(self, score_db):
+        """測試同分時名次與鄰居使用相同的排序鍵，使用者恰好位於鄰居列的中間"""
+        users = [uuid.uuid4() for _ in range(4)]
+
+        async def run():
+            async with score_db() as db:
+                for i, user in enumerate(users):
+                    await db.execute(text("INSERT INTO users VALUES (:id, :name, NULL)"), {"id": user.hex, "name": f"u{i}"})
+                    # 全部同分，越早達成者 achieved_at 越小、名次越後
+                    await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 90.0, 95.0,
+                                                           NOW - timedelta(minutes=i)))
+                return [await best_scores.rank_of(db, user, "daily", "overall", 1, NOW) for user in users]
+
+        ranks = asyncio.run(run())
+        assert [rank for rank, _, _ in ranks] == [1, 2, 3, 4]
+        assert [[row[4] for row in rows] for _, _, rows in ranks] == [
+            ["u0", "u1"], ["u0", "u1", "u2"], ["u1", "u2", "u3"], ["u2", "u3"],
+        ]
+
+    def test_rolling_window_merges_hourly_bests(self, score_db):
+        """測試滾動 24 小時與日曆日的差異，以及過期小時的清除"""
+        alice, bob = uuid.uuid4(), uuid.uuid4()
+        # 前一天晚上：不在日曆日內，但在最近 24 小時內
+        yesterday = NOW - timedelta(hours=15)
+
+        async def run():
+            async with score_db() as db:
+                await db.execute(text("INSERT INTO users VALUES (:a, 'alice', NULL), (:b, 'bob', NULL)"),
+                                 {"a": alice.hex, "b": bob.hex})
+                await best_scores.record(db, best_rows(alice, uuid.uuid4(), "en", 60, 110.0, 95.0, yesterday))
+                await best_scores.record(db, best_rows(alice, uuid.uuid4(), "en", 60, 60.0, 95.0, NOW))
+                await best_scores.record(db, best_rows(bob, uuid.uuid4(), "en", 60, 80.0, 95.0, NOW))
+                await best_scores.record(db, best_rows(bob, uuid.uuid4(), "en", 60, 85.0, 90.0, NOW + timedelta(minutes=5)))
+                calendar = await best_scores.top(db, "daily", "overall", 10, NOW)
+                rolling = await best_scores.rolling_top(db, "daily", "overall", 10, NOW)
+                hours = (await db.execute(text("SELECT COUNT(*) FROM user_hourly_best_scores"))).scalar()
+                await best_scores.prune_hourly(db, NOW + timedelta(days=31))
+                pruned = (await db.execute(text("SELECT COUNT(*) FROM user_hourly_best_scores"))).scalar()
+                return calendar, rolling, hours, pruned
+
+        calendar, rolling, hours, pruned = asyncio.run(run())
+        assert [(row[4], row[0]) for row in calendar] == [("bob", 85.0), ("alice", 60.0)]
+        assert [(row[4], row[0]) for row in rolling] == [("alice", 110.0), ("bob", 85.0)]
+        # 每個 (使用者, 語言, 小時) 一列：alice 兩個小時 × 2，bob 一個小時 × 2；清除後只剩目前這一小時
+        assert hours == 6
+        assert pruned == 4
+
+
+class TestLeaderboardPages:
+    """keyset 分頁測試"""
+
+    def test_cursor_walks_every_rank_once(self, score_db, monkeypatch):
+        """測試依 next_cursor 逐頁讀完整個排行榜，同分者不重複也不遺漏"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from app.api import leaderboard as leaderboard_api
+        from app.services.response_cache import leaderboard_cache
+
+        users = [uuid.uuid4() for _ in range(7)]
+        now = datetime.utcnow()
+
+        async def setup():
+            async with score_db() as db:
+                for i, user in enumerate(users):
+                    await db.execute(text("INSERT INTO users VALUES (:id, :name, NULL)"), {"id": user.hex, "name": f"u{i}"})
+                    # 兩兩同分，只能靠 achieved_at / user_id 區分
+                    await best_scores.record(db, best_rows(user, uuid.uuid4(), "en", 60, 100.0 - i // 2, 95.0, now))
+                await db.commit()
+
+        asyncio.run(setup())
+        monkeypatch.setattr(leaderboard_api, "AsyncSessionLocal", score_db)
+        leaderboard_cache.clear()
+        app = FastAPI()
+        app.include_router(leaderboard_api.router, prefix="/api/leaderboard")
+
+        seen, cursors = [], []
+        with TestClient(app) as client:
+            params = {"scope": "alltime", "limit": 3}
+            while True:
+                page = client.get("/api/leaderboard/page", params=params).json()
+                seen.extend((entry["rank"], entry["wpm"]) for entry in page["entries"])
+                if page["next_cursor"] is None:
+                    break
+                cursors.append(page["next_cursor"])
+                params["cursor"] = page["next_cursor"]
+            assert client.get("/api/leaderboard/page", params={"cursor": "bogus"}).status_code == 400
+        leaderboard_cache.clear()
+
+        assert [rank for rank, _ in seen] == list(range(1, 8))
+        assert [wpm for _, wpm in seen] == [100.0, 100.0, 99.0, 99.0, 98.0, 98.0, 97.0]
+        assert len(cursors) == 2
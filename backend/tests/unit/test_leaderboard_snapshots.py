@@ -0,0 +1,100 @@
+"""
+排行榜快照測試
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.services.best_scores import best_scores
+from app.services.leaderboard_snapshots import LeaderboardSnapshotJob, top_scores
+
+NOW = datetime(2024, 1, 31, 12, 0)
+
+
+@pytest.fixture
+def session_maker(score_db, add_score):
+    """建立使用者、成績與每人最佳成績"""
+    alice, bob = uuid.uuid4(), uuid.uuid4()
+    scores = [
+        # (user, wpm, accuracy, language, created_at)
+        (alice, 90.0, 95.0, "en", datetime(2024, 1, 31, 8)),
+        (alice, 70.0, 99.0, "zh-TW", datetime(2024, 1, 31, 9)),
+        (bob, 80.0, 97.0, "en", datetime(2024, 1, 31, 10)),
+        # 前一天的成績只計入週、月與總排行
+        (bob, 120.0, 98.0, "en", datetime(2024, 1, 30, 10)),
+    ]
+
+    async def setup():
+        async with score_db() as db:
+            await db.execute(text("INSERT INTO users VALUES (:a, 'alice', NULL), (:b, 'bob', NULL)"), {"a": alice.hex, "b": bob.hex})
+            for user_id, wpm, accuracy, language, created_at in scores:
+                await add_score(db, user_id, wpm, accuracy, language, created_at)
+            for user_id in (alice, bob):
+                await best_scores.rebuild_user(db, user_id)
+            await db.commit()
+
+    asyncio.run(setup())
+    return score_db
+
+
+class TestLeaderboardSnapshots:
+    """快照計算與讀取測試"""
+
+    def test_top_scores_best_per_user_in_bucket(self, session_maker):
+        """測試每位使用者只取目前時間桶內的最佳成績"""
+        async def run():
+            async with session_maker() as db:
+                daily = await top_scores(db, "daily", "overall", 10, NOW)
+                weekly = await top_scores(db, "weekly", "en", 10, NOW)
+                return daily, weekly
+
+        daily, weekly = asyncio.run(run())
+        assert [(row["display_name"], row["wpm"]) for row in daily] == [("alice", 90.0), ("bob", 80.0)]
+        assert [(row["rank"], row["display_name"], row["wpm"]) for row in weekly] == [(1, "bob", 120.0), (2, "alice", 90.0)]
+
+    def test_refresh_upserts_and_load_checks_bucket(self, session_maker):
+        """測試重建快照為 upsert，且時間桶切換後不再使用舊快照"""
+        job = LeaderboardSnapshotJob(interval=60, size=1)
+
+        async def run():
+            async with session_maker() as db:
+                written = await job.refresh(db, NOW)
+                await job.refresh(db, NOW)
+                count = (await db.execute(text("SELECT COUNT(*) FROM leaderboards"))).scalar()
+                daily = await job.load(db, "daily", "overall", NOW)
+                categories = await job.categories(db)
+                tomorrow = await job.load(db, "daily", "overall", datetime(2024, 2, 1, 0, 0, 30))
+                stale = await job.load(db, "alltime", "overall", datetime(2024, 1, 31, 12, 5))
+                return written, count, daily, categories, tomorrow, stale
+
+        written, count, daily, categories, tomorrow, stale = asyncio.run(run())
+        assert categories == ["overall", "en", "zh-TW"]
+        assert written == count == 12
+        assert [(row["display_name"], row["wpm"]) for row in daily] == [("alice", 90.0)]
+        assert tomorrow is None
+        # 超過三個刷新週期未更新
+        assert stale is None
+
+    def test_load_with_aware_timestamps(self):
+        """測試 PostgreSQL timestamptz 讀回的 aware 時間可與 naive / aware 的 now 比較"""
+        job = LeaderboardSnapshotJob(interval=60, size=1)
+        updated_at = datetime(2024, 1, 31, 12, 0, tzinfo=timezone.utc)
+        rank_json = {"bucket": "20240131", "entries": [{"user_id": "u1"}]}
+
+        class Result:
+            def first(self):
+                return rank_json, updated_at
+
+        class FakeSession:
+            async def execute(self, statement):
+                return Result()
+
+        async def run(now):
+            return await job.load(FakeSession(), "daily", "overall", now)
+
+        assert asyncio.run(run(datetime(2024, 1, 31, 12, 1))) == [{"user_id": "u1"}]
+        assert asyncio.run(run(datetime(2024, 1, 31, 12, 1, tzinfo=timezone.utc))) == [{"user_id": "u1"}]
+        assert asyncio.run(run(datetime(2024, 1, 31, 20, 5, tzinfo=timezone(timedelta(hours=8))))) is None
@@ -0,0 +1,121 @@
+"""
+Redis 排行榜測試
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.services import leaderboard_store as store_module
+from app.services.leaderboard_store import LeaderboardStore, bucket_for, bucket_start, decode_score, encode_score
+
+
+class TestScoreEncoding:
+    """分數編碼與時間桶測試"""
+
+    def test_encoding_orders_by_wpm_then_accuracy(self):
+        """測試 wpm 優先、accuracy 次之"""
+        assert encode_score(80.0, 90.0) > encode_score(79.99, 100.0)
+        assert encode_score(80.0, 95.5) > encode_score(80.0, 95.49)
+        assert decode_score(encode_score(123.45, 98.76)) == (123.45, 98.76)
+
+    def test_calendar_buckets(self):
+        """測試日、週、月時間桶"""
+        when = datetime(2024, 1, 31, 23, 59)
+        assert bucket_for("daily", when) == "20240131"
+        assert bucket_for("weekly", when) == "2024W05"
+        assert bucket_for("monthly", when) == "202401"
+        assert bucket_for("alltime", when) == "all"
+        assert bucket_start("weekly", when) == datetime(2024, 1, 29)
+        assert bucket_start("alltime", when) is None
+
+
+class TestLeaderboardRead:
+    """排行榜讀取測試"""
+
+    def test_top_joins_details_and_users(self, fake_redis):
+        """測試前 N 名附帶日期與使用者資料"""
+        store = LeaderboardStore()
+        now = datetime(2024, 1, 31, 12)
+        key = store.key("daily", "en", now)
+        fake_redis(
+            store_module,
+            zsets={key: {"u1": encode_score(70, 95), "u2": encode_score(90, 97)}},
+            hashes={
+                f"{key}:details": {"u1": json.dumps({"date": "2024-01-31T08:00:00"})},
+                store.users_key: {"u2": json.dumps({"display_name": "Bo", "picture": None})},
+            },
+            strings={store.seeded_key(key): "1"},
+        )
+        rows = asyncio.run(store.top("daily", "en", 10, now))
+        assert [(r["rank"], r["user_id"], r["wpm"]) for r in rows] == [(1, "u2", 90.0), (2, "u1", 70.0)]
+        assert rows[0]["display_name"] == "Bo"
+        assert rows[1]["display_name"] is None
+        assert rows[1]["date"] == "2024-01-31T08:00:00"
+
+    def test_rank_of_returns_neighbours(self, fake_redis):
+        """測試名次與前後鄰居"""
+        store = LeaderboardStore()
+        now = datetime(2024, 1, 31, 12)
+        key = store.key("weekly", "overall", now)
+        fake_redis(
+            store_module,
+            zsets={key: {f"u{i}": encode_score(100 - i, 95) for i in range(6)}},
+            strings={store.seeded_key(key): "1"},
+        )
+        rank, total, rows = asyncio.run(store.rank_of("weekly", "overall", "u4", 1, now))
+        assert (rank, total) == (5, 6)
+        assert [(r["rank"], r["user_id"]) for r in rows] == [(4, "u3"), (5, "u4"), (6, "u5")]
+        assert asyncio.run(store.rank_of("weekly", "overall", "nobody", 1, now)) == (None, 6, [])
+
+    def test_unseeded_key_is_not_served(self, fake_redis):
+        """測試尚未由資料庫種入的 key 回傳 None，由呼叫端改查資料庫"""
+        store = LeaderboardStore()
+        now = datetime(2024, 1, 31, 12)
+        key = store.key("alltime", "overall", now)
+        # 部署後第一筆成績只寫入了新使用者
+        fake_redis(store_module, zsets={key: {"newcomer": encode_score(40, 90)}})
+        assert asyncio.run(store.top("alltime", "overall", 10, now)) is None
+        assert asyncio.run(store.rank_of("alltime", "overall", "newcomer", 1, now)) is None
+
+
+class TestLeaderboardSeeding:
+    """由 user_best_scores 種入 Redis 排行榜測試"""
+
+    def test_seed_store_backfills_history_once(self, score_db, add_score, fake_redis, monkeypatch):
+        """測試種入歷史最佳成績、保留較佳的新成績，且已種入的 key 不再重做"""
+        from app.services import leaderboard_snapshots as snapshots_module
+        from app.services.best_scores import best_scores
+        from app.services.leaderboard_snapshots import LeaderboardSnapshotJob
+
+        store = LeaderboardStore()
+        fake_redis(store_module)
+        monkeypatch.setattr(snapshots_module, "leaderboard_store", store)
+        monkeypatch.setattr(snapshots_module, "SEED_BATCH", 2)
+        now = datetime(2024, 1, 31, 12)
+        users = [uuid.uuid4() for _ in range(3)]
+        job = LeaderboardSnapshotJob(interval=60, size=10)
+
+        async def run():
+            async with score_db() as db:
+                for i, user_id in enumerate(users):
+                    await db.execute(text("INSERT INTO users VALUES (:id, :name, NULL)"), {"id": user_id.hex, "name": f"u{i}"})
+                    await add_score(db, user_id, 100.0 - i * 10, 95.0, "en", datetime(2023, 5, 1))
+                    await best_scores.rebuild_user(db, user_id)
+                await db.commit()
+                # 種入前已由寫入路徑記錄一筆較佳的新成績
+                await store.record(str(users[2]), "en", 95.0, 99.0, now)
+                seeded = await job.seed_store(db, now)
+                again = await job.seed_store(db, now)
+            return seeded, again, await store.top("alltime", "en", 10, now), await store.top("daily", "en", 10, now)
+
+        seeded, again, alltime, daily = asyncio.run(run())
+        # 2 個分類 × 4 個時間範圍
+        assert (seeded, again) == (8, 0)
+        assert [(row["user_id"], row["wpm"]) for row in alltime] == [
+            (str(users[0]), 100.0), (str(users[2]), 95.0), (str(users[1]), 90.0),
+        ]
+        assert [row["user_id"] for row in daily] == [str(users[2])]
+
@@ -0,0 +1,106 @@
+"""
+回應快取與條件請求測試
+"""
+import asyncio
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import leaderboard as leaderboard_api
+from app.services.response_cache import ResponseCache, leaderboard_cache
+
+
+class TestResponseCache:
+    """新鮮 / 過期 / 背景重建測試"""
+
+    def test_stale_entry_served_while_refreshing(self):
+        """測試過期內容立即回傳，背景只重建一次"""
+        cache = ResponseCache("test", capacity=8, fresh=0, stale=60)
+        bodies = iter([b"v1", b"v2"])
+        builds = []
+
+        async def build():
+            builds.append(1)
+            await asyncio.sleep(0)
+            return next(bodies)
+
+        async def run():
+            first = await cache.get("k", build)
+            stale = [await cache.get("k", build) for _ in range(3)]
+            await asyncio.gather(*cache._tasks)
+            cache.fresh = 60
+            return first, stale, await cache.get("k", build)
+
+        first, stale, refreshed = asyncio.run(run())
+        assert [entry.body for entry in stale] == [b"v1"] * 3
+        assert refreshed.body == b"v2"
+        assert refreshed.etag != first.etag
+        assert len(builds) == 2
+
+    def test_unchanged_body_keeps_version(self):
+        """測試內容未變時 ETag 與 Last-Modified 不變"""
+        cache = ResponseCache("test", capacity=8, fresh=0, stale=0)
+
+        async def build():
+            return b"same"
+
+        async def run():
+            return await cache.get("k", build), await cache.get("k", build)
+
+        first, second = asyncio.run(run())
+        assert second is not first
+        assert (second.etag, second.last_modified) == (first.etag, first.last_modified)
+
+    def test_conditional_headers(self):
+        """測試 If-None-Match 與 If-Modified-Since"""
+        cache = ResponseCache("test", capacity=8, fresh=60, stale=0)
+
+        async def build():
+            return b"body"
+
+        entry = asyncio.run(cache.get("k", build))
+        assert entry.not_modified(entry.etag, None)
+        assert entry.not_modified(f'"other", W/{entry.etag}', None)
+        assert not entry.not_modified('"other"', None)
+        assert entry.not_modified(None, "Fri, 01 Jan 2100 00:00:00 GMT")
+        assert not entry.not_modified(None, "Mon, 01 Jan 2001 00:00:00 GMT")
+        assert not entry.not_modified(None, "not a date")
+
+
+class TestLeaderboardCaching:
+    """排行榜 API 的快取標頭測試"""
+
+    def test_etag_roundtrip_returns_304(self, monkeypatch):
+        """測試回應帶版本戳記，條件請求得到 304"""
+        calls = []
+
+        async def compute(db, scope, category, limit, window):
+            calls.append((scope, category, limit, window))
+            return leaderboard_api.LeaderboardResponse(entries=[
+                leaderboard_api.LeaderboardItem(
+                    rank=1, user_id="u1", display_name="Ann", wpm=90.0, accuracy=98.0, date=datetime(2024, 1, 31),
+                ),
+            ], total_count=1)
+
+        monkeypatch.setattr(leaderboard_api, "_compute_leaderboard", compute)
+        leaderboard_cache.clear()
+        app = FastAPI()
+        app.include_router(leaderboard_api.router, prefix="/api/leaderboard")
+        with TestClient(app) as client:
+            first = client.get("/api/leaderboard/", params={"scope": "weekly", "category": "OVERALL"})
+            assert first.status_code == 200
+            assert first.json()["entries"][0]["display_name"] == "Ann"
+            assert "stale-while-revalidate=" in first.headers["cache-control"]
+
+            again = client.get("/api/leaderboard/", params={"scope": "weekly"}, headers={"If-None-Match": first.headers["etag"]})
+            assert again.status_code == 304
+            assert again.headers["etag"] == first.headers["etag"]
+            assert again.content == b""
+
+            since = client.get("/api/leaderboard/", params={"scope": "weekly"}, headers={"If-Modified-Since": first.headers["last-modified"]})
+            assert since.status_code == 304
+            # 未知的 scope 與 /page 一樣回 400，不會快取空排行榜
+            assert client.get("/api/leaderboard/", params={"scope": "yearly"}).status_code == 400
+        assert calls == [("weekly", "overall", 10, "calendar")]
+        leaderboard_cache.clear()
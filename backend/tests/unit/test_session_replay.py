@@ -0,0 +1,135 @@
+"""
+按鍵重播串流測試
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api import sessions as sessions_api
+from app.core.database import get_db
+from app.core.deps import get_current_user
+from app.models.sessions import TypingSession
+from app.models.users import User, UserRole
+from app.ws.keystrokes import KeystrokeBuffer, first_chunk_at
+
+
+def _buffer(count: int) -> KeystrokeBuffer:
+    buf = KeystrokeBuffer(datetime(2024, 1, 1))
+    for i in range(count):
+        buf.append("abc"[i % 3], i % 5 != 0, i * 100)
+    return buf
+
+
+class TestChunkedEncoding:
+    """分段壓縮格式測試"""
+
+    def test_roundtrip_and_seek_index(self):
+        """測試分段還原與依時間定位"""
+        buf = _buffer(21)
+        payload = buf.to_chunked(chunk_size=8)
+        assert [entry[2] for entry in payload["index"]] == [8, 8, 5]
+        assert list(KeystrokeBuffer.from_compact(payload, buf.start_time)) == list(buf)
+        # 第 8 筆（t=800）起屬於第二段
+        assert first_chunk_at(payload["index"], 750) == 1
+        assert first_chunk_at(payload["index"], 5000) == 3
+
+        with pytest.raises(ValueError):
+            buf.to_chunked(chunk_size=10)
+
+
+@pytest.fixture
+def replay_client(tmp_path, monkeypatch):
+    """以 SQLite 建立 typing_sessions 的重播測試客戶端"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replay.db'}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    buf = _buffer(21)
+    session_ids = {"chunked": uuid.uuid4(), "legacy": uuid.uuid4()}
+    owner = User(id=uuid.uuid4(), display_name="Owner", role=UserRole.USER)
+    caller = {"user": owner}
+
+    async def setup():
+        async with engine.begin() as conn:
+            # SQLite 無法產生 UUID 欄位的 DDL，改以等價的 CHAR(32) 建表
+            await conn.execute(text(
+                "CREATE TABLE typing_sessions (id CHAR(32) PRIMARY KEY, user_id CHAR(32), "
+                "article_id CHAR(32), article_version INTEGER, mode_seconds INTEGER, "
+                "started_at DATETIME, ended_at DATETIME, raw_keystrokes_json JSON, "
+                "key_stats_json JSON, focus_blur_count INTEGER)"
+            ))
+            for name, raw in (("chunked", buf.to_chunked(chunk_size=8)), ("legacy", buf.to_compact())):
+                await conn.execute(insert(TypingSession).values(
+                    id=session_ids[name],
+                    user_id=owner.id,
+                    article_id=uuid.uuid4(),
+                    article_version=1,
+                    mode_seconds=60,
+                    started_at=datetime(2024, 1, 1),
+                    raw_keystrokes_json=raw,
+                ))
+
+    asyncio.run(setup())
+
+    async def override_get_db():
+        async with session_maker() as session:
+            yield session
+
+    monkeypatch.setattr(sessions_api, "AsyncSessionLocal", session_maker)
+    app = FastAPI()
+    app.include_router(sessions_api.router, prefix="/api/sessions")
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: caller["user"]
+    with TestClient(app) as client:
+        client.caller = caller
+        yield client, session_ids, buf
+    asyncio.run(engine.dispose())
+
+
+class TestReplayEndpoint:
+    """重播 API 測試"""
+
+    def _lines(self, response):
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_stream_whole_session(self, replay_client):
+        """測試依時間順序分段串流全部按鍵"""
+        client, session_ids, buf = replay_client
+        response = client.get(f"/api/sessions/{session_ids['chunked']}/replay")
+        assert response.status_code == 200
+        header, *chunks = self._lines(response)
+        assert header["count"] == 21
+        assert len(chunks) == 3
+        keystrokes = [tuple(k) for chunk in chunks for k in chunk["keystrokes"]]
+        assert keystrokes == list(buf)
+
+    def test_seek_range(self, replay_client):
+        """測試以 from_ms / to_ms 定位"""
+        client, session_ids, _ = replay_client
+        for name in ("chunked", "legacy"):
+            response = client.get(f"/api/sessions/{session_ids[name]}/replay?from_ms=850&to_ms=1700")
+            _, *chunks = self._lines(response)
+            offsets = [k[0] for chunk in chunks for k in chunk["keystrokes"]]
+            assert offsets == list(range(900, 1800, 100))
+
+    def test_unknown_session(self, replay_client):
+        """測試不存在的工作階段"""
+        client, _, _ = replay_client
+        assert client.get(f"/api/sessions/{uuid.uuid4()}/replay").status_code == 404
+
+    def test_only_owner_or_admin(self, replay_client):
+        """測試只有本人或管理員可以下載按鍵紀錄"""
+        client, session_ids, _ = replay_client
+        url = f"/api/sessions/{session_ids['chunked']}/replay"
+        client.caller["user"] = None
+        assert client.get(url).status_code == 401
+        client.caller["user"] = User(id=uuid.uuid4(), display_name="Other", role=UserRole.USER)
+        assert client.get(url).status_code == 403
+        client.caller["user"] = User(id=uuid.uuid4(), display_name="Admin", role=UserRole.ORG_ADMIN)
+        assert client.get(url).status_code == 200
+
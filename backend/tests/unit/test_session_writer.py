@@ -0,0 +1,87 @@
+"""
+練習結果延遲寫入測試
+"""
+import asyncio
+import uuid
+from datetime import datetime
+
+from app.services import session_writer
+from app.services.session_writer import SessionWriter
+
+
+class RecordingWriter(SessionWriter):
+    """以記憶體取代資料庫的寫入器"""
+
+    def __init__(self, *args, bad_ids=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+        self.bad_ids = set(bad_ids)
+
+    async def _insert(self, batch):
+        if any(r["session"]["id"] in self.bad_ids for r in batch):
+            raise RuntimeError("integrity error")
+        self.batches.append([r["session"]["id"] for r in batch])
+
+
+def _record(record_id):
+    return {"session": {"id": record_id}, "score": {"session_id": record_id}}
+
+
+class TestSessionWriter:
+    """SessionWriter 測試"""
+
+    def test_batches_up_to_max_size(self):
+        """測試依批次大小合併寫入"""
+        async def scenario():
+            writer = RecordingWriter(max_batch=2, flush_interval=0.01, max_queue=100)
+            for i in range(5):
+                assert writer.enqueue(_record(i))
+            await asyncio.sleep(0.05)
+            await writer.stop()
+            return writer
+
+        writer = asyncio.run(scenario())
+        assert writer.batches == [[0, 1], [2, 3], [4]]
+        assert writer.written == 5
+
+    def test_bad_record_is_isolated(self):
+        """測試壞資料不影響同批其他記錄"""
+        async def scenario():
+            writer = RecordingWriter(max_batch=10, flush_interval=0.01, max_queue=100, bad_ids={1})
+            for i in range(3):
+                writer.enqueue(_record(i))
+            await writer.stop()
+            return writer
+
+        writer = asyncio.run(scenario())
+        assert sorted(sum(writer.batches, [])) == [0, 2]
+        assert writer.dropped == 1
+
+    def test_full_queue_rejects(self):
+        """測試佇列已滿時拒絕"""
+        async def scenario():
+            writer = RecordingWriter(max_batch=10, flush_interval=1, max_queue=1)
+            accepted = [writer.enqueue(_record(uuid.uuid4())) for _ in range(3)]
+            await writer.stop()
+            return accepted
+
+        assert asyncio.run(scenario()) == [True, False, False]
+
+    def test_leaderboard_uses_session_end_time(self, monkeypatch):
+        """測試排行榜以練習結束時間記錄，與個人最佳的時段一致"""
+        recorded = []
+
+        async def record_many(entries):
+            recorded.extend(entries)
+
+        monkeypatch.setattr(session_writer.leaderboard_store, "record_many", record_many)
+        monkeypatch.setattr(session_writer.wpm_sketches, "add", lambda *args: None)
+        ended_at = datetime(2024, 1, 31, 23, 59, 59)
+        record = {
+            "session": {"id": 1, "user_id": "u1", "mode_seconds": 60, "ended_at": ended_at},
+            "score": {"id": 2, "language": "en", "wpm": 80.0, "accuracy": 98.0},
+        }
+
+        asyncio.run(SessionWriter(max_batch=1, flush_interval=1, max_queue=1)._publish([record]))
+        assert recorded == [("u1", "en", 80.0, 98.0, ended_at)]
+        assert {row["achieved_at"] for row in SessionWriter._best_rows([record])} == {ended_at}
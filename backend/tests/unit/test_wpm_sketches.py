@@ -0,0 +1,195 @@
+"""
+WPM 分位數 sketch 測試
+"""
+import asyncio
+import random
+import uuid
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.services import wpm_sketches as sketch_module
+from app.services.wpm_sketches import RELATIVE_ACCURACY, WpmSketch, WpmSketchStore
+
+
+class TestWpmSketch:
+    """sketch 精度與合併測試"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """測試分位數相對誤差不超過 1%，「快過多少人」接近實際比例"""
+        rng = random.Random(7)
+        values = sorted(max(1.0, rng.gauss(65, 20)) for _ in range(5000))
+        sketch = WpmSketch()
+        for value in values:
+            sketch.add(value)
+
+        assert len(sketch) == 5000
+        for q in (0.1, 0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            assert abs(sketch.quantile(q) - exact) <= RELATIVE_ACCURACY * exact * 1.01
+        exact_below = sum(1 for value in values if value < 72) / len(values)
+        assert abs(sketch.faster_than(72) - exact_below) < 0.01
+        assert WpmSketch().faster_than(72) == 0.0
+        assert WpmSketch().quantile(0.5) is None
+
+    def test_merge_matches_single_sketch(self):
+        """測試兩個 sketch 合併後與單一 sketch 相同"""
+        left, right, whole = WpmSketch(), WpmSketch(), WpmSketch()
+        for i, value in enumerate(range(10, 200, 3)):
+            (left if i % 2 else right).add(value)
+            whole.add(value)
+        left.merge(right)
+        assert dict(left.counts) == dict(whole.counts)
+        assert left.quantile(0.5) == whole.quantile(0.5)
+
+
+class TestWpmSketchStore:
+    """跨 worker 合併與重建測試"""
+
+    def test_workers_merge_through_redis(self, fake_redis):
+        """測試兩個 worker 的增量合併到同一份 sketch，失敗時保留增量"""
+        client = fake_redis(sketch_module)
+        first = WpmSketchStore(flush_interval=10, cache_seconds=0)
+        second = WpmSketchStore(flush_interval=10, cache_seconds=0)
+
+        async def run():
+            first.add("zh-TW", 60, 50)
+            second.add("zh-TW", 180, 90)
+            client.fail = True
+            await first.flush()
+            client.fail = False
+            await first.flush()
+            await second.flush()
+            return (
+                await first.load("zh-TW", 0),
+                await first.load("zh-TW", 60),
+                await second.load("overall", 180),
+            )
+
+        merged, by_mode, overall = asyncio.run(run())
+        assert len(merged) == 2
+        assert merged.faster_than(72) == 0.5
+        assert len(by_mode) == 1
+        assert len(overall) == 1
+
+    def test_rebuild_from_scores(self, score_db, add_score, fake_redis):
+        """測試由 scores 彙總重建並整份換掉舊 sketch，作廢與零分成績不計入"""
+        store_key = WpmSketchStore(flush_interval=10, cache_seconds=0).key("en", 60)
+        client = fake_redis(sketch_module, hashes={store_key: {"1": 99}})
+        store = WpmSketchStore(flush_interval=10, cache_seconds=0)
+        user = uuid.uuid4()
+        now = datetime(2024, 1, 31, 12)
+
+        async def run():
+            async with score_db() as db:
+                for wpm in (40.0, 60.0, 60.04, 80.0):
+                    await add_score(db, user, wpm, 95.0, "en", now)
+                await add_score(db, user, 0.0, 0.0, "en", now)
+                await add_score(db, user, 120.0, 95.0, "ja", now, mode_seconds=180)
+                voided = await add_score(db, user, 200.0, 95.0, "en", now)
+                await db.execute(text("UPDATE scores SET is_void = 1 WHERE id = :id"), {"id": voided.hex})
+                await store.rebuild(db)
+            return await store.load("en", 60), await store.load("overall", 0)
+
+        english, overall = asyncio.run(run())
+        assert len(english) == 4
+        assert not [key for key in client.hashes if key.endswith(":rebuild")]
+        assert len(overall) == 5
+        assert overall.faster_than(100) == 0.8
+
+    def test_flush_waits_for_rebuild(self, score_db, add_score, fake_redis):
+        """測試重建期間合併的增量暫留本地，重建完成後才寫入，不會被新 sketch 蓋掉"""
+        client = fake_redis(sketch_module)
+        rebuilder = WpmSketchStore(flush_interval=10, cache_seconds=0)
+        other = WpmSketchStore(flush_interval=10, cache_seconds=0)
+        user = uuid.uuid4()
+
+        async def run():
+            async with score_db() as db:
+                await add_score(db, user, 40.0, 95.0, "en", datetime(2024, 1, 31, 12))
+                original = rebuilder._rebuild
+
+                async def rebuild_while_flushing(db, redis):
+                    # 查詢後、換上新 sketch 前，另一個 worker 合併了一筆新成績
+                    other.add("en", 60, 80.0)
+                    await other.flush()
+                    assert other._pending
+                    return await original(db, redis)
+
+                rebuilder._rebuild = rebuild_while_flushing
+                assert await rebuilder.rebuild(db) is True
+            await other.flush()
+            return await rebuilder.load("en", 60)
+
+        english = asyncio.run(run())
+        assert len(english) == 2
+        assert english.faster_than(60) == 0.5
+        assert rebuilder.lock_key not in client.strings
+
+    def test_replace_after_edit_and_void(self, fake_redis):
+        """測試管理員修改與作廢成績後，sketch 扣回原值並計入新值"""
+        fake_redis(sketch_module)
+        store = WpmSketchStore(flush_interval=10, cache_seconds=0)
+
+        async def run():
+            store.add("en", 60, 40)
+            store.add("en", 60, 120)
+            await store.flush()
+            # 120 改為 60，接著作廢 40
+            store.replace("en", 60, 120, 60)
+            store.replace("en", 60, 40, None)
+            store.replace("en", 60, None, None)
+            await store.flush()
+            return await store.load("en", 60), await store.load("overall", 0)
+
+        english, overall = asyncio.run(run())
+        assert len(english) == 1
+        assert abs(english.quantile(0.5) - 60) <= 60 * RELATIVE_ACCURACY
+        assert len(overall) == 1
+
+    def test_cache_is_bounded(self, fake_redis):
+        """測試快取只保留最近使用的 ``capacity`` 個 sketch"""
+        fake_redis(sketch_module)
+        store = WpmSketchStore(flush_interval=10, cache_seconds=60, capacity=2)
+
+        async def run():
+            for language in ("en", "ja", "en", "zh-TW"):
+                await store.load(language, 60)
+
+        asyncio.run(run())
+        assert list(store._cache) == [("en", 60), ("zh-TW", 60)]
+
+
+class TestPercentileApi:
+    """/api/leaderboard/percentile 測試"""
+
+    def test_unknown_keys_and_empty_sketch(self, fake_redis, monkeypatch):
+        """測試未知模式被拒、未知語言與空 sketch 回傳零樣本，且有樣本時回傳分位數"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from app.api import leaderboard as leaderboard_api
+
+        fake_redis(sketch_module)
+        store = WpmSketchStore(flush_interval=10, cache_seconds=0, capacity=4)
+        monkeypatch.setattr(leaderboard_api, "wpm_sketches", store)
+        app = FastAPI()
+        app.include_router(leaderboard_api.router, prefix="/api/leaderboard")
+
+        with TestClient(app) as client:
+            bad_mode = client.get("/api/leaderboard/percentile", params={"wpm": 60, "mode_seconds": 45})
+            too_long = client.get("/api/leaderboard/percentile", params={"wpm": 60, "language": "x" * 11})
+            unknown = client.get("/api/leaderboard/percentile", params={"wpm": 60, "language": "tlh"}).json()
+            empty = client.get("/api/leaderboard/percentile", params={"wpm": 60}).json()
+            store.add("en", 60, 40)
+            store.add("en", 60, 80)
+            asyncio.run(store.flush())
+            filled = client.get("/api/leaderboard/percentile", params={"wpm": 60, "mode_seconds": 60}).json()
+
+        assert bad_mode.status_code == 400
+        assert too_long.status_code == 422
+        assert (unknown["language"], unknown["sample_count"], unknown["faster_than"]) == ("tlh", 0, 0.0)
+        assert empty["sample_count"] == 0
+        assert empty["quantiles"] == {"p50": None, "p90": None, "p99": None}
+        assert (filled["language"], filled["sample_count"], filled["faster_than"]) == ("overall", 2, 50.0)
+        assert len(store._cache) <= 4
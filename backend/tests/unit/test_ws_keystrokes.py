@@ -0,0 +1,186 @@
+"""
+WebSocket 按鍵緩衝區測試
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.ws.keystrokes import KeyStats, KeystrokeBuffer, SlidingWindow
+
+
+class TestKeystrokeBuffer:
+    """KeystrokeBuffer 測試"""
+
+    def test_append_and_iterate(self):
+        """測試新增與迭代"""
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        buf = KeystrokeBuffer(start)
+        buf.append_at("a", True, start + timedelta(milliseconds=120))
+        buf.append_at("中", False, start + timedelta(milliseconds=250))
+
+        assert len(buf) == 2
+        assert list(buf) == [(120, "a", True), (250, "中", False)]
+        assert buf.correct_count == 1
+        assert buf.error_count == 1
+
+    def test_offsets_never_go_backwards(self):
+        """測試時間偏移量單調遞增"""
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        buf = KeystrokeBuffer(start)
+        buf.append_at("a", True, start + timedelta(seconds=2))
+        buf.append_at("b", True, start + timedelta(seconds=1))
+        buf.append_at("c", True, start - timedelta(seconds=5))
+
+        assert list(buf.offsets) == [2000, 2000, 2000]
+
+    def test_aware_timestamp_against_naive_start(self):
+        """測試含時區的時間戳記"""
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        buf = KeystrokeBuffer(start)
+        ts = datetime(2025, 1, 1, 20, 0, 1, tzinfo=timezone(timedelta(hours=8)))
+
+        assert buf.append_at("x", True, ts) == 1000
+
+    def test_correct_bitmap_layout(self):
+        """測試正確性位元圖"""
+        buf = KeystrokeBuffer(datetime(2025, 1, 1))
+        for i in range(10):
+            buf.append("x", i % 3 == 0, i)
+
+        bitmap = bytes(buf.correct_bitmap)
+        assert len(bitmap) == 2
+        assert [buf.is_correct(i) for i in range(10)] == [i % 3 == 0 for i in range(10)]
+        assert bitmap[0] == 0b01001001
+        with pytest.raises(IndexError):
+            buf.is_correct(10)
+
+    def test_memory_footprint(self):
+        """測試記憶體用量"""
+        buf = KeystrokeBuffer(datetime(2025, 1, 1))
+        for i in range(1000):
+            buf.append("a", True, i)
+
+        assert buf.nbytes() < 1000 * 9
+
+    def test_compact_roundtrip(self):
+        """測試壓縮格式還原"""
+        start = datetime(2025, 1, 1)
+        buf = KeystrokeBuffer(start)
+        for i, char in enumerate("hello 世界"):
+            buf.append(char, i != 3, i * 110)
+
+        payload = buf.to_compact()
+        restored = KeystrokeBuffer.from_compact(payload, start)
+        assert payload["count"] == len(buf)
+        assert list(restored) == list(buf)
+        assert restored.correct_count == buf.correct_count
+
+
+class TestSlidingWindow:
+    """滑動視窗即時 WPM 測試"""
+
+    def test_live_wpm_tracks_recent_pace(self):
+        """測試即時 WPM 反映近期速度"""
+        window = SlidingWindow(window_ms=10000, buckets=10)
+        # 60 秒內每 200ms 一鍵 = 300 CPM = 60 WPM
+        for i in range(300):
+            window.add(i * 200, True)
+        assert window.snapshot(60000)["live_wpm"] == pytest.approx(60, abs=2)
+
+        # 接著放慢到每 1s 一鍵 = 12 WPM
+        for i in range(1, 21):
+            window.add(60000 + i * 1000, i % 2 == 0)
+        snap = window.snapshot(80000)
+        assert snap["live_wpm"] == pytest.approx(12, abs=2)
+        assert snap["burst_wpm"] == pytest.approx(60, abs=4)
+        assert snap["live_accuracy"] == pytest.approx(50, abs=10)
+
+    def test_idle_window_empties(self):
+        """測試閒置後視窗歸零"""
+        window = SlidingWindow(window_ms=5000, buckets=5)
+        window.add(0, True)
+        window.add(100, True)
+        snap = window.snapshot(60000)
+        assert snap["live_wpm"] == 0
+        assert snap["live_accuracy"] == 100
+        assert window.total == 0
+
+
+class TestKeyStats:
+    """逐鍵與雙字母組合統計測試"""
+
+    def test_welford_matches_batch_statistics(self):
+        """測試串流平均與標準差等同整批計算"""
+        import statistics
+
+        stats = KeyStats()
+        offsets = [0, 120, 260, 350, 530, 640]
+        for offset in offsets:
+            stats.add("a", True, offset)
+        gaps = [b - a for a, b in zip(offsets, offsets[1:])]
+
+        summary = stats.summary()
+        assert summary["interval"]["n"] == len(gaps)
+        assert summary["interval"]["mean_ms"] == pytest.approx(statistics.mean(gaps), abs=0.05)
+        assert summary["interval"]["stdev_ms"] == pytest.approx(statistics.stdev(gaps), abs=0.05)
+        assert summary["keys"]["a"]["count"] == 6
+
+    def test_errors_pauses_and_digraphs(self):
+        """測試錯誤計數、停頓排除與雙字母只計正確連打"""
+        stats = KeyStats()
+        typed = [("t", True, 0), ("h", True, 100), ("e", False, 300), ("t", True, 5000), ("h", True, 1000 + 5000)]
+        for char, correct, offset in typed:
+            stats.add(char, correct, offset)
+
+        summary = stats.summary(min_samples=1)
+        assert summary["keys"]["e"]["errors"] == 1
+        # 5 秒停頓不計入節奏
+        assert summary["keys"]["t"]["n"] == 0
+        assert summary["interval"]["n"] == 3
+        assert set(summary["digraphs"]) == {"th"}
+        assert summary["digraphs"]["th"]["n"] == 2
+        assert summary["slow_digraphs"] == ["th"]
+        assert summary["slow_keys"][0] == "h"
+
+    def test_rebuilt_from_buffer(self):
+        """測試由按鍵緩衝區重建統計"""
+        start = datetime(2024, 1, 1)
+        buf = KeystrokeBuffer(start)
+        stats = KeyStats()
+        for char, correct, offset in [("a", True, 0), ("b", False, 90), ("a", True, 210)]:
+            buf.append(char, correct, offset)
+            stats.add(char, correct, offset)
+        assert KeyStats.from_buffer(buf).summary() == stats.summary()
+
+    def test_rebuilt_against_expected_text(self):
+        """測試重建時依游標（含退格）把統計計在應打的字上，與即時結果相同"""
+        from app.services.article_cache import to_code_points
+        from app.ws.keystrokes import BACKSPACE
+
+        expected = to_code_points("abc")
+        buf = KeystrokeBuffer(datetime(2024, 1, 1))
+        live = KeyStats()
+        # 打 a、x（應為 b）、退格、b、c
+        for char, target, correct, offset in [
+            ("a", "a", True, 0), ("x", "b", False, 100), (BACKSPACE, None, False, 200),
+            ("b", "b", True, 300), ("c", "c", True, 400),
+        ]:
+            buf.append(char, correct, offset)
+            if target is not None:
+                live.add(target, correct, offset)
+
+        rebuilt = KeyStats.from_buffer(buf, expected)
+        assert rebuilt.summary() == live.summary()
+        assert set(rebuilt.keys) == {"a", "b", "c"}
+        assert rebuilt.keys["b"][:2] == [2, 1]
+
+    def test_distinct_keys_are_capped(self):
+        """測試不同按鍵數量有上限"""
+        from app.ws.keystrokes import MAX_KEYS
+
+        stats = KeyStats()
+        for i in range(MAX_KEYS + 10):
+            stats.add(chr(0x4E00 + i), True, i * 100)
+        assert len(stats.keys) == MAX_KEYS
+        assert stats.interval[0] == MAX_KEYS + 9
+
@@ -0,0 +1,123 @@
+"""
+競速房間測試
+"""
+import asyncio
+
+import pytest
+
+from app.ws.rooms import ROOM_FINISHED, ROOM_RUNNING, RoomError, RoomRegistry
+
+
+class TestRoomRegistry:
+    """房間成員管理測試"""
+
+    def test_join_leave_and_host_handover(self):
+        """測試加入、離開與房主轉移"""
+        rooms = RoomRegistry(max_members=2)
+        rooms.join("r1", "a", "u1")
+        room = rooms.join("r1", "b", "u2")
+        assert room.host == "a"
+        assert room.roster()["members"] == [{"member_id": "m1", "user_id": "u1"}, {"member_id": "m2", "user_id": "u2"}]
+        assert room.roster()["host"] == "m1"
+
+        with pytest.raises(RoomError) as exc:
+            rooms.join("r1", "c")
+        assert exc.value.reason == "full"
+
+        assert rooms.leave("a") is room
+        assert room.host == "b"
+        assert rooms.leave("b") is None
+        assert len(rooms) == 0
+
+    def test_start_requires_host(self):
+        """測試只有房主能開始比賽"""
+        rooms = RoomRegistry(max_members=4)
+        rooms.join("r1", "a")
+        rooms.join("r1", "b")
+        with pytest.raises(RoomError):
+            rooms.start("b")
+        assert rooms.start("a").status == ROOM_RUNNING
+        with pytest.raises(RoomError) as exc:
+            rooms.join("r1", "late")
+        assert exc.value.reason == "already_started"
+
+    def test_dirty_rooms_and_finish_order(self):
+        """測試只回報有進度的房間與完賽名次"""
+        rooms = RoomRegistry(max_members=4)
+        rooms.join("r1", "a")
+        rooms.join("r1", "b")
+        rooms.join("r2", "c")
+        rooms.start("a")
+        assert [r.room_id for r in rooms.take_dirty(["r1", "r2"])] == ["r1"]
+        assert rooms.take_dirty(["r1", "r2"]) == []
+
+        rooms.mark_dirty("c")
+        assert [r.room_id for r in rooms.take_dirty(["r1", "r2"])] == ["r2"]
+
+        assert rooms.finish("b") == 1
+        assert rooms.finish("a") == 2
+        assert rooms.get("r1").status == ROOM_FINISHED
+
+
+class TestRoomFanOut:
+    """房間進度廣播測試"""
+
+    def test_progress_frame_serialized_once(self, monkeypatch):
+        """測試同一房間所有成員收到同一個訊框物件"""
+        import app.ws.router as ws_router_module
+
+        monkeypatch.setattr(ws_router_module, "session_data", {
+            sid: ws_router_module.SessionData(sid) for sid in ("a", "b", "c")
+        })
+
+        async def scenario():
+            manager = ws_router_module.ConnectionManager()
+            sent = []
+            monkeypatch.setattr(manager, "send_frame", lambda frame, sid: sent.append((sid, frame)))
+            for sid in ("a", "b", "c"):
+                manager.rooms.join("race", sid)
+            manager.rooms.start("a")
+            await manager.send_room_ticks(["race"])
+            # 沒有新進度時不重送
+            await manager.send_room_ticks(["race"])
+            return sent
+
+        sent = asyncio.run(scenario())
+        assert [sid for sid, _ in sent] == ["a", "b", "c"]
+        assert sent[0][1] is sent[1][1] is sent[2][1]
+        assert '"race_progress"' in sent[0][1]
+
+    def test_race_over_socket(self, ws_client):
+        """測試兩位玩家透過 WebSocket 進行競速"""
+        with ws_client.websocket_connect("/ws/?session_id=p1") as p1, \
+                ws_client.websocket_connect("/ws/?session_id=p2") as p2:
+            for ws in (p1, p2):
+                ws.send_json({"type": "start_session", "ack_mode": "none"})
+                ws.receive_json()
+
+            p1.send_json({"type": "join_room", "room_id": "race"})
+            assert p1.receive_json() == {"type": "room_joined", "room_id": "race", "member_id": "m1"}
+            assert p1.receive_json()["members"] == [{"member_id": "m1", "user_id": None}]
+            p2.send_json({"type": "join_room", "room_id": "race"})
+            assert p2.receive_json()["member_id"] == "m2"
+            roster = p1.receive_json()
+            assert len(roster["members"]) == 2
+            assert p2.receive_json()["host"] == "m1"
+            # 其他成員的 session_id 不會送出
+            assert "p2" not in str(roster)
+
+            p2.send_json({"type": "start_race"})
+            assert p2.receive_json() == {"type": "room_error", "reason": "not_host"}
+
+            p1.send_json({"type": "start_race"})
+            assert p1.receive_json()["type"] == "race_started"
+            assert p2.receive_json()["type"] == "race_started"
+
+            p2.send_json({"type": "keystroke", "char": "a", "correct": True})
+            progress = p1.receive_json()
+            while progress["type"] != "race_progress":
+                progress = p1.receive_json()
+            positions = {p["member_id"]: p["position"] for p in progress["players"]}
+            assert positions["m1"] == 0
+            assert positions["m2"] in (0, 1)
+            assert "p1" not in str(progress) and "p2" not in str(progress)
@@ -0,0 +1,571 @@
+"""
+WebSocket 協定測試
+"""
+import pytest
+
+from app.services.article_cache import ArticleTextCache
+
+
+class TestKeystrokeProtocol:
+    """按鍵訊息協定測試"""
+
+    def test_single_keystroke_still_acknowledged(self, ws_client):
+        """測試舊版單一按鍵訊息"""
+        with ws_client.websocket_connect("/ws/?session_id=legacy") as ws:
+            ws.send_json({"type": "start_session"})
+            assert ws.receive_json()["type"] == "session_started"
+
+            ws.send_json({"type": "keystroke", "char": "a", "correct": True, "position": 0})
+            ack = ws.receive_json()
+            assert ack["type"] == "keystroke_processed"
+            assert ack["char"] == "a"
+
+    def test_batch_gets_one_ack(self, ws_client):
+        """測試批次按鍵只回覆一次"""
+        with ws_client.websocket_connect("/ws/?session_id=batch") as ws:
+            ws.send_json({"type": "start_session"})
+            ws.receive_json()
+
+            ws.send_json({
+                "type": "keystroke_batch",
+                "seq": 7,
+                "keystrokes": [
+                    {"char": "a", "correct": True, "position": 0},
+                    {"char": "b", "correct": False, "position": 1},
+                    {"char": "c", "correct": True, "position": 2},
+                ],
+            })
+            ack = ws.receive_json()
+            assert ack["type"] == "keystroke_batch_processed"
+            assert ack["seq"] == 7
+            assert ack["count"] == 3
+            assert ack["position"] == 2
+            assert ack["total_chars"] == 3
+            assert ack["correct_chars"] == 2
+
+    def test_ack_mode_none(self, ws_client):
+        """測試不回覆模式"""
+        with ws_client.websocket_connect("/ws/?session_id=quiet") as ws:
+            ws.send_json({"type": "start_session", "ack_mode": "none"})
+            assert ws.receive_json()["ack_mode"] == "none"
+
+            ws.send_json({"type": "keystroke_batch", "keystrokes": [{"char": "a", "correct": True}]})
+            ws.send_json({"type": "keystroke", "char": "b", "correct": True})
+            ws.send_json({"type": "heartbeat"})
+            assert ws.receive_json()["type"] == "heartbeat_ack"
+
+    def test_sampled_ack(self):
+        """測試抽樣回覆模式"""
+        from app.core.config import settings
+        from app.ws.router import SessionData, ACK_SAMPLED
+
+        data = SessionData("sampled")
+        data.ack_mode = ACK_SAMPLED
+        acks = [data.should_ack() for _ in range(settings.WS_KEYSTROKE_ACK_SAMPLE_EVERY * 3)]
+        assert sum(acks) == 3
+
+    def test_live_wpm_uses_server_clock(self):
+        """測試客戶端時鐘落後時即時 WPM 仍以伺服器收到時間計算"""
+        from datetime import datetime, timedelta
+        from app.ws.router import SessionData
+
+        now = datetime.utcnow()
+        data = SessionData("lagging", start_time=now - timedelta(seconds=30))
+        for i in range(25):
+            data.add_keystroke("a", True, now - timedelta(minutes=1, seconds=i))
+        assert data.keystrokes.last_offset == 0
+        assert data.calculate_metrics()["live_wpm"] > 0
+
+
+    def test_client_position_cannot_pick_the_compared_char(self, ws_client, monkeypatch):
+        """測試以客戶端 position 偽造正確率無效，位置由伺服器游標決定"""
+        import app.ws.router as ws_router_module
+
+        async def fake_loader(article_id, version):
+            return 1, "hello world", "en"
+
+        monkeypatch.setattr(ws_router_module, "article_cache", ArticleTextCache(4, fake_loader))
+        with ws_client.websocket_connect("/ws/?session_id=forged") as ws:
+            ws.send_json({"type": "start_session", "article_id": "5f0c6d2e-8a43-4d1b-9a57-3f7f0c2b9e10", "article_version": 1})
+            assert ws.receive_json()["verified"] is True
+
+            ws.send_json({"type": "keystroke_batch", "keystrokes": [
+                {"char": "l", "correct": True, "position": 2} for _ in range(10)
+            ]})
+            ack = ws.receive_json()
+            assert (ack["position"], ack["correct_chars"], ack["total_chars"]) == (9, 3, 10)
+            data = ws_router_module.session_data["forged"]
+            assert (data.errors, data.position_mismatches) == (7, 9)
+
+            # 退格讓游標後退，重打的字依原位置判定
+            ws.send_json({"type": "keystroke_batch", "keystrokes": [{"char": "\b"}] * 10 + [{"char": "h"}]})
+            ack = ws.receive_json()
+            assert (ack["position"], ack["correct_chars"], ack["total_chars"]) == (0, 4, 11)
+            assert data.cursor == 1
+
+
+    def test_multi_char_keystrokes_are_dropped(self, ws_client):
+        """測試超過一個字元的 char 不被記錄"""
+        from app.ws.router import session_data
+
+        with ws_client.websocket_connect("/ws/?session_id=long-char") as ws:
+            ws.send_json({"type": "start_session"})
+            ws.receive_json()
+            ws.send_json({"type": "keystroke_batch", "keystrokes": [{"char": "ab" * 100}, {"char": "a"}]})
+            ack = ws.receive_json()
+            assert (ack["total_chars"], ack["position"]) == (1, 0)
+            assert list(session_data["long-char"].key_stats.keys) == ["a"]
+
+
+class TestSessionState:
+    """工作階段狀態共享測試"""
+
+    def test_checkpoint_roundtrip(self):
+        """測試檢查點還原指標"""
+        from app.ws.router import SessionData
+
+        data = SessionData("cp", user_id="u1")
+        data.add_keystroke("a", True, offset_ms=100)
+        data.add_keystroke("b", False, offset_ms=200)
+
+        restored = SessionData.from_checkpoint("cp", data.to_checkpoint())
+        assert restored.user_id == "u1"
+        assert abs((restored.start_time - data.start_time).total_seconds()) < 0.001
+        assert restored.calculate_metrics()["total_chars"] == 2
+        assert restored.calculate_metrics()["accuracy"] == 50.0
+        assert restored.keystrokes.last_offset == 200
+        assert restored.resume_token == data.resume_token
+        assert len(restored.keystrokes) == 0
+
+        snapshot = SessionData.from_checkpoint("cp", data.to_checkpoint(with_keystrokes=True))
+        assert list(snapshot.keystrokes) == list(data.keystrokes)
+
+    def test_reconnect_resumes_session(self, ws_client):
+        """測試以 resume_token 重新連線後延續工作階段（含按鍵紀錄）"""
+        from app.ws.router import session_data
+
+        with ws_client.websocket_connect("/ws/?session_id=resume") as ws:
+            ws.send_json({"type": "start_session"})
+            token = ws.receive_json()["resume_token"]
+            ws.send_json({"type": "keystroke_batch", "keystrokes": [
+                {"char": "a", "correct": True},
+                {"char": "b", "correct": True},
+            ]})
+            ws.receive_json()
+
+        with ws_client.websocket_connect("/ws/?session_id=temp") as ws:
+            ws.send_json({"type": "resume_session", "resume_token": token})
+            resumed = ws.receive_json()
+            assert resumed["type"] == "session_resumed"
+            assert resumed["session_id"] == "resume"
+            assert resumed["keystrokes_received"] == 2
+            assert resumed["metrics"]["total_chars"] == 2
+            assert [k[1] for k in session_data["resume"].keystrokes] == ["a", "b"]
+
+            ws.send_json({"type": "keystroke", "char": "c", "correct": True})
+            assert ws.receive_json()["type"] == "keystroke_processed"
+            assert session_data["resume"].total_chars == 3
+
+    def test_resume_rejects_bad_token(self, ws_client):
+        """測試錯誤的 resume_token 會被拒絕"""
+        with ws_client.websocket_connect("/ws/?session_id=victim") as ws:
+            ws.send_json({"type": "start_session"})
+            ws.receive_json()
+
+        with ws_client.websocket_connect("/ws/?session_id=attacker&resume_token=victim.guess") as ws:
+            failed = ws.receive_json()
+            assert failed == {"type": "resume_failed", "reason": "invalid_token"}
+
+    def test_live_session_cannot_be_taken_over(self, ws_client):
+        """測試只有同一使用者或持有 resume_token 者能接手進行中的工作階段"""
+        from starlette.websockets import WebSocketDisconnect
+
+        from app.core.security import create_access_token
+        from app.ws.router import FORBIDDEN_CLOSE_CODE, session_data
+
+        owner = create_access_token(data={"sub": "owner-user"})
+        other = create_access_token(data={"sub": "other-user"})
+        with ws_client.websocket_connect(f"/ws/?session_id=owned&token={owner}") as ws:
+            ws.send_json({"type": "start_session"})
+            ws.receive_json()
+            for query in ("session_id=owned", f"session_id=owned&token={other}"):
+                with pytest.raises(WebSocketDisconnect) as refused:
+                    with ws_client.websocket_connect(f"/ws/?{query}"):
+                        pass
+                assert refused.value.code == FORBIDDEN_CLOSE_CODE
+            assert session_data["owned"].user_id == "owner-user"
+        # 同一使用者可以重新連線接手
+        with ws_client.websocket_connect(f"/ws/?session_id=owned&token={owner}") as ws:
+            ws.send_json({"type": "heartbeat"})
+            assert ws.receive_json()["type"] == "heartbeat_ack"
+
+        with ws_client.websocket_connect("/ws/?session_id=anon") as ws:
+            ws.send_json({"type": "start_session"})
+            token = ws.receive_json()["resume_token"]
+        with pytest.raises(WebSocketDisconnect):
+            with ws_client.websocket_connect("/ws/?session_id=anon"):
+                pass
+        # 匿名工作階段需持有 resume_token
+        with ws_client.websocket_connect(f"/ws/?session_id=anon&resume_token={token}") as ws:
+            assert ws.receive_json()["type"] == "session_resumed"
+
+    def test_handlers_check_session_owner(self, monkeypatch):
+        """測試其他使用者的連線不能替工作階段打字、結束或續接"""
+        import asyncio
+
+        import app.ws.router as ws_router_module
+
+        data = ws_router_module.SessionData("mine", user_id="owner-user")
+        monkeypatch.setattr(ws_router_module, "session_data", {"mine": data})
+        sent = []
+
+        async def record(message, session_id):
+            sent.append(message)
+
+        monkeypatch.setattr(ws_router_module.manager, "send_personal_message", record)
+
+        async def run():
+            await ws_router_module.handle_keystroke(None, "mine", None, {"char": "a"})
+            await ws_router_module.handle_keystroke_batch(None, "mine", "other-user", {"keystrokes": [{"char": "a"}]})
+            await ws_router_module.handle_finish_session(None, "mine", "other-user", {})
+            await ws_router_module.resume_session(object(), "mine", "other-user", f"mine.{data.resume_token}")
+
+        asyncio.run(run())
+        assert data.total_chars == 0
+        assert ws_router_module.session_data["mine"] is data
+        assert sent == [{"type": "resume_failed", "reason": "forbidden"}]
+
+
+class TestBinaryProtocol:
+    """二進位訊框協定測試"""
+
+    def test_decode_batch_roundtrip(self):
+        """測試批次訊框編解碼"""
+        from app.ws import codec
+
+        frame = codec.encode_keystroke_batch(3, [(10, "a", True, 0), (25, "字", False, 1)])
+        message = codec.decode(frame)
+        assert message["type"] == "keystroke_batch"
+        assert message["seq"] == 3
+        assert message["keystrokes"] == [
+            {"t": 10, "char": "a", "correct": True, "position": 0},
+            {"t": 25, "char": "字", "correct": False, "position": 1},
+        ]
+
+        with pytest.raises(codec.FrameError):
+            codec.decode(frame[:-1])
+
+    def test_binary_batch_over_socket(self, ws_client):
+        """測試以二進位傳送批次按鍵"""
+        import struct
+        from app.ws import codec
+
+        with ws_client.websocket_connect("/ws/?session_id=bin&encoding=binary") as ws:
+            ws.send_json({"type": "start_session"})
+            assert ws.receive_json()["type"] == "session_started"
+
+            ws.send_bytes(codec.encode_keystroke_batch(1, [(5, "a", True, 0), (9, "b", True, 1)]))
+            ack = ws.receive_bytes()
+            tag, _t, seq, count, position, total, correct = struct.unpack("<BIIHIII", ack)
+            assert tag == codec.TAG_KEYSTROKE_BATCH_PROCESSED
+            assert (seq, count, position, total, correct) == (1, 2, 1, 2, 2)
+
+    def test_batch_ack_position_is_unsigned(self):
+        """測試 2^31 以上的位置可編碼，空批次以 0xFFFFFFFF 表示"""
+        import struct
+        from app.ws import codec
+
+        message = {"type": "keystroke_batch_processed", "seq": 1, "count": 1, "position": 2 ** 31}
+        assert struct.unpack("<BIIHIII", codec.encode(message, 0))[4] == 2 ** 31
+        message["position"] = None
+        assert struct.unpack("<BIIHIII", codec.encode(message, 0))[4] == codec.NO_POSITION
+
+    def test_subprotocol_negotiation(self, ws_client):
+        """測試子協定協商"""
+        from app.ws import codec
+
+        with ws_client.websocket_connect("/ws/?session_id=sub", subprotocols=[codec.BINARY_SUBPROTOCOL]) as ws:
+            assert ws.accepted_subprotocol == codec.BINARY_SUBPROTOCOL
+
+
+class TestOutbox:
+    """連線送出佇列測試"""
+
+    def test_stalled_consumer_is_evicted_without_blocking_others(self):
+        """測試卡住的客戶端被踢除且不影響其他連線"""
+        import asyncio
+        from app.ws.outbox import Outbox, SLOW_CONSUMER_CLOSE_CODE
+
+        class StalledSocket:
+            def __init__(self):
+                self.closed_with = None
+
+            async def send_text(self, frame):
+                await asyncio.Event().wait()
+
+            async def close(self, code=1000):
+                self.closed_with = code
+
+        class FastSocket:
+            def __init__(self):
+                self.frames = []
+
+            async def send_text(self, frame):
+                self.frames.append(frame)
+
+        async def scenario():
+            overflowed = []
+            stalled, fast = StalledSocket(), FastSocket()
+            slow_box = Outbox("slow", stalled, 2, overflowed.append)
+            fast_box = Outbox("fast", fast, 2, overflowed.append)
+            for i in range(5):
+                slow_box.put(str(i))
+                fast_box.put(str(i))
+                await asyncio.sleep(0)
+            await overflowed[0].evict()
+            fast_box.close()
+            return overflowed, stalled, fast
+
+        overflowed, stalled, fast = asyncio.run(scenario())
+        assert [box.session_id for box in overflowed] == ["slow"]
+        assert stalled.closed_with == SLOW_CONSUMER_CLOSE_CODE
+        assert fast.frames == ["0", "1", "2", "3", "4"]
+
+
+class TestFinishSession:
+    """完成練習測試"""
+
+    def test_finish_enqueues_records(self, ws_client, monkeypatch):
+        """測試完成時排入延遲寫入"""
+        import app.ws.router as ws_router_module
+
+        queued = []
+
+        class FakeWriter:
+            def enqueue(self, record):
+                queued.append(record)
+                return True
+
+        async def fake_loader(article_id, version):
+            return 1, "hi", "en"
+
+        monkeypatch.setattr(ws_router_module, "session_writer", FakeWriter())
+        monkeypatch.setattr(ws_router_module, "article_cache", ArticleTextCache(4, fake_loader))
+        # 只測寫入流程，不受最短時間 / 字數限制
+        monkeypatch.setattr(ws_router_module.settings, "WS_MIN_SESSION_SECONDS", 0)
+        monkeypatch.setattr(ws_router_module.settings, "WS_MIN_SESSION_CHARS", 1)
+        article_id = "5f0c6d2e-8a43-4d1b-9a57-3f7f0c2b9e10"
+
+        with ws_client.websocket_connect("/ws/?session_id=finish") as ws:
+            ws.send_json({
+                "type": "start_session",
+                "article_id": article_id,
+                "article_version": 1,
+                "mode_seconds": 60,
+                "language": "ja",
+            })
+            assert ws.receive_json()["verified"] is True
+            # 伺服器依文章內容判定，忽略客戶端宣稱的 correct
+            ws.send_json({"type": "keystroke_batch", "ack": "none", "keystrokes": [
+                {"char": "h", "correct": False, "t": 100},
+                {"char": "x", "correct": True, "t": 220},
+            ]})
+            ws.send_json({"type": "finish_session"})
+            ended = ws.receive_json()
+
+        assert ended["type"] == "session_ended"
+        assert ended["record_id"] == str(queued[0]["session"]["id"])
+        session_row, score_row = queued[0]["session"], queued[0]["score"]
+        assert str(session_row["article_id"]) == article_id
+        assert session_row["raw_keystrokes_json"]["count"] == 2
+        assert score_row["session_id"] == session_row["id"]
+        assert (score_row["correct_keystrokes"], score_row["error_keystrokes"]) == (1, 1)
+        # 語言取自文章而非客戶端
+        assert score_row["language"] == "en"
+        # 錯字計在應打的字上
+        assert "x" not in ended["key_stats"]["keys"]
+        assert ended["key_stats"]["keys"]["i"] == {"count": 1, "errors": 1, "n": 1, "mean_ms": 120.0, "stdev_ms": 0.0}
+        assert session_row["key_stats_json"] == ended["key_stats"]
+
+    def test_repeated_finish_persists_once(self, ws_client, monkeypatch):
+        """測試重複送出 finish_session 只寫入一次，並回傳同一份結果"""
+        import app.ws.router as ws_router_module
+
+        queued = []
+
+        class FakeWriter:
+            def enqueue(self, record):
+                queued.append(record)
+                return True
+
+        async def fake_loader(article_id, version):
+            return 1, "hi", "en"
+
+        monkeypatch.setattr(ws_router_module, "session_writer", FakeWriter())
+        monkeypatch.setattr(ws_router_module, "article_cache", ArticleTextCache(4, fake_loader))
+        # 只測寫入流程，不受最短時間 / 字數限制
+        monkeypatch.setattr(ws_router_module.settings, "WS_MIN_SESSION_SECONDS", 0)
+        monkeypatch.setattr(ws_router_module.settings, "WS_MIN_SESSION_CHARS", 1)
+
+        with ws_client.websocket_connect("/ws/?session_id=finish-twice") as ws:
+            ws.send_json({
+                "type": "start_session",
+                "article_id": "5f0c6d2e-8a43-4d1b-9a57-3f7f0c2b9e10",
+                "article_version": 1,
+                "mode_seconds": 60,
+                "language": "en",
+            })
+            ws.receive_json()
+            ws.send_json({"type": "keystroke_batch", "ack": "none", "keystrokes": [{"char": "h", "t": 100}]})
+            replies = []
+            for _ in range(3):
+                ws.send_json({"type": "finish_session"})
+                replies.append(ws.receive_json())
+            assert "finish-twice" not in ws_router_module.session_data
+            assert "finish-twice" not in ws_router_module.manager.metrics_ticker
+
+        assert len(queued) == 1
+        assert {reply["record_id"] for reply in replies} == {str(queued[0]["session"]["id"])}
+        assert replies[1] == replies[0] == replies[2]
+
+    def test_missing_version_records_resolved_version(self, ws_client, monkeypatch):
+        """測試要求的文章版本不存在時，工作階段記錄實際比對的版本"""
+        import app.ws.router as ws_router_module
+
+        async def fake_loader(article_id, version):
+            return 1, "hi", "en"
+
+        monkeypatch.setattr(ws_router_module, "article_cache", ArticleTextCache(4, fake_loader))
+
+        with ws_client.websocket_connect("/ws/?session_id=old-version") as ws:
+            ws.send_json({
+                "type": "start_session",
+                "article_id": "5f0c6d2e-8a43-4d1b-9a57-3f7f0c2b9e10",
+                "article_version": 9,
+                "mode_seconds": 60,
+                "language": "en",
+            })
+            assert ws.receive_json()["verified"] is True
+            data = ws_router_module.session_data["old-version"]
+            assert data.article_version == 1
+            assert data.to_checkpoint()["article_version"] == 1
+
+    def test_short_or_overlong_sessions_are_not_inflated(self, monkeypatch):
+        """測試過短的工作階段不寫入、WPM 以模式時間為上限、超時的按鍵不計入"""
+        from datetime import datetime, timedelta
+
+        import app.ws.router as ws_router_module
+
+        now = datetime.utcnow()
+
+        def session(seconds_ago, chars):
+            data = ws_router_module.SessionData("short", start_time=now - timedelta(seconds=seconds_ago))
+            data.article_id = "5f0c6d2e-8a43-4d1b-9a57-3f7f0c2b9e10"
+            data.article_version, data.mode_seconds, data.language = 1, 60, "en"
+            for i in range(chars):
+                data.add_keystroke("a", True, offset_ms=i)
+            return data
+
+        metrics = {"net_wpm": 0, "gross_wpm": 0, "accuracy": 100}
+        # 一個字後立即結束
+        assert session(0.1, 1).to_records(metrics, now) is None
+        assert session(30, 5).to_records(metrics, now) is None
+        # 30 秒 100 字 = 40 WPM；超過模式時間仍以 60 秒計算
+        assert session(30, 100).to_records(metrics, now)["score"]["net_wpm"] == 40.0
+        assert session(90, 300).to_records(metrics, now)["score"]["net_wpm"] == 60.0
+
+        late = session(70, 0)
+        assert ws_router_module._add_keystroke(late, {"char": "a"}) == (False, 0)
+        assert late.total_chars == 0
+
+
+class TestReaper:
+    """閒置回收與記憶體預算測試"""
+
+    def _manager_with_sessions(self, monkeypatch, last_updates):
+        import app.ws.router as ws_router_module
+
+        sessions = {}
+        for session_id, last_update in last_updates.items():
+            data = ws_router_module.SessionData(session_id)
+            data.last_update = last_update
+            sessions[session_id] = data
+        monkeypatch.setattr(ws_router_module, "session_data", sessions)
+        manager = ws_router_module.ConnectionManager()
+        for session_id in last_updates:
+            manager.last_seen[session_id] = 1000.0
+        return manager
+
+    def test_silent_connections_pinged_then_evicted(self, monkeypatch):
+        """測試無回應連線先 ping 後回收"""
+        from app.core.config import settings
+
+        manager = self._manager_with_sessions(monkeypatch, {"a": 1000.0, "b": 1000.0})
+        manager.touch("b")
+        manager.last_seen["b"] = 1000.0 + settings.WS_IDLE_TIMEOUT_SECONDS
+
+        assert manager.sweep(1000.0 + settings.WS_PING_INTERVAL_SECONDS) == []
+        assert manager.pinged == {"a"}
+        assert manager.sweep(1000.0 + settings.WS_IDLE_TIMEOUT_SECONDS) == [("a", "idle")]
+
+    def test_session_without_keystrokes_evicted(self, monkeypatch):
+        """測試長時間未打字的工作階段被回收"""
+        from app.core.config import settings
+
+        now = 5000.0
+        manager = self._manager_with_sessions(
+            monkeypatch, {"typing": now - 1, "stalled": now - settings.WS_SESSION_IDLE_SECONDS}
+        )
+        manager.last_seen = {"typing": now, "stalled": now}
+        assert manager.sweep(now) == [("stalled", "session_idle")]
+
+    def test_memory_budget_evicts_longest_idle_first(self, monkeypatch):
+        """測試超過記憶體預算時先回收最久閒置者"""
+        import app.ws.router as ws_router_module
+        from app.core.config import settings
+
+        now = 5000.0
+        manager = self._manager_with_sessions(monkeypatch, {"new": now - 1, "old": now - 30, "mid": now - 10})
+        manager.last_seen = {"new": now, "old": now, "mid": now}
+        monkeypatch.setattr(ws_router_module.SessionData, "estimated_bytes", lambda self: 1024 * 1024)
+        monkeypatch.setattr(settings, "WS_MEMORY_BUDGET_MB", 1)
+        assert manager.sweep(now) == [("old", "memory"), ("mid", "memory")]
+
+
+class TestInstrumentation:
+    """WebSocket Prometheus 指標測試"""
+
+    def test_message_and_disconnect_counters(self, ws_client):
+        """測試收發訊息與斷線原因計數"""
+        import time
+        from prometheus_client import REGISTRY
+        from app.ws.router import manager
+
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        before = {
+            "in": sample("ws_messages_received_total", type="heartbeat"),
+            "other": sample("ws_messages_received_total", type="other"),
+            "out": sample("ws_messages_sent_total", type="heartbeat_ack"),
+            "handled": sample("ws_handler_duration_seconds_count", type="heartbeat"),
+            "closed": sample("ws_disconnects_total", reason="client"),
+        }
+        with ws_client.websocket_connect("/ws/?session_id=metrics") as ws:
+            ws.send_json({"type": "heartbeat"})
+            assert ws.receive_json()["type"] == "heartbeat_ack"
+            ws.send_json({"type": "made_up"})
+            ws.send_json({"type": "heartbeat"})
+            ws.receive_json()
+            assert sample("active_connections") >= 1
+
+        assert sample("ws_messages_received_total", type="heartbeat") == before["in"] + 2
+        assert sample("ws_messages_received_total", type="other") == before["other"] + 1
+        assert sample("ws_messages_sent_total", type="heartbeat_ack") == before["out"] + 2
+        assert sample("ws_handler_duration_seconds_count", type="heartbeat") == before["handled"] + 2
+        # 伺服器端在客戶端關閉後才執行清理；connection_users 在計數之後才移除，等到它消失再比對確切次數
+        deadline = time.monotonic() + 2
+        while "metrics" in manager.connection_users and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "metrics" not in manager.connection_users
+        assert sample("ws_disconnects_total", reason="client") == before["closed"] + 1
@@ -0,0 +1,59 @@
+"""
+WebSocket 指標排程器測試
+"""
+import asyncio
+
+from app.ws.scheduler import MetricsTicker
+
+
+async def _noop(session_ids):
+    return None
+
+
+class TestMetricsTicker:
+    """MetricsTicker 時間輪測試"""
+
+    def test_session_fires_once_per_interval(self):
+        """測試每個週期只觸發一次"""
+        async def scenario():
+            ticker = MetricsTicker(_noop, interval=5, tick=1)
+            ticker.schedule("s1")
+            fired = [ticker.advance() for _ in range(15)]
+            ticker.stop()
+            return fired
+
+        fired = asyncio.run(scenario())
+        assert [i for i, due in enumerate(fired) if "s1" in due] == [4, 9, 14]
+
+    def test_unschedule(self):
+        """測試取消排程"""
+        async def scenario():
+            ticker = MetricsTicker(_noop, interval=3, tick=1)
+            ticker.schedule("s1")
+            ticker.schedule("s2")
+            ticker.unschedule("s1")
+            fired = [ticker.advance() for _ in range(3)]
+            ticker.stop()
+            return ticker, fired
+
+        ticker, fired = asyncio.run(scenario())
+        assert fired == [[], [], ["s2"]]
+        assert "s1" not in ticker
+        assert len(ticker) == 1
+
+    def test_callback_runs_from_single_task(self):
+        """測試回呼由單一任務觸發"""
+        calls = []
+
+        async def callback(session_ids):
+            calls.append(sorted(session_ids))
+
+        async def scenario():
+            ticker = MetricsTicker(callback, interval=0.02, tick=0.01)
+            for i in range(3):
+                ticker.schedule(f"s{i}")
+            await asyncio.sleep(0.035)
+            ticker.stop()
+
+        asyncio.run(scenario())
+        assert calls and calls[0] == ["s0", "s1", "s2"]
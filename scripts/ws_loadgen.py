@@ -0,0 +1,316 @@
+"""
+WebSocket load generator for the /ws typing endpoint.
+
+Opens many simulated typists against a running server. Each typist goes through
+start_session / keystroke / finish_session with human-like key timing. The
+report covers ack latency percentiles, peak connections, and server CPU and
+memory (scraped from /metrics). All randomness is seeded, so two runs with the
+same arguments send the same traffic and their JSON reports can be compared.
+
+Usage (server already running, e.g. `uvicorn app.main:app --workers 1`):
+    python scripts/ws_loadgen.py --clients 2000 --ramp 20 --chars 200
+    python scripts/ws_loadgen.py --clients 500 --json before.json
+
+Only needs `websockets` and `httpx`, both already installed with the backend.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import resource
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog typing practice keyboard speed "
+    "accuracy rhythm finger home row practice makes perfect every day small "
+    "steps lead to big progress focus breathe relax and keep going"
+).split()
+
+
+@dataclass
+class ClientStats:
+    connected: bool = False
+    finished: bool = False
+    error: Optional[str] = None
+    sent: int = 0
+    acked: int = 0
+    ack_latencies: List[float] = field(default_factory=list)
+    connect_latency: Optional[float] = None
+    finish_latency: Optional[float] = None
+
+
+@dataclass
+class ServerSample:
+    cpu_seconds: Optional[float] = None
+    rss_bytes: Optional[float] = None
+    connections: Optional[float] = None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sample"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def make_text(rng: random.Random, chars: int) -> str:
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+def key_delays(rng: random.Random, text: str, wpm: float) -> List[float]:
+    """Seconds to wait before each key: log-normal around the target speed, longer after spaces"""
+    mean = 60.0 / (wpm * 5)
+    sigma = 0.35
+    mu = math.log(mean) - sigma * sigma / 2
+    delays = []
+    for i, char in enumerate(text):
+        delay = rng.lognormvariate(mu, sigma)
+        if i and text[i - 1] == " ":
+            delay *= 1.5
+        if rng.random() < 0.01:
+            delay += rng.uniform(0.3, 1.0)  # hesitation
+        delays.append(delay)
+    return delays
+
+
+def parse_metrics(text: str) -> ServerSample:
+    sample = ServerSample()
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        if name == "process_cpu_seconds_total":
+            sample.cpu_seconds = float(value)
+        elif name == "process_resident_memory_bytes":
+            sample.rss_bytes = float(value)
+        elif name == "active_connections":
+            sample.connections = float(value)
+    return sample
+
+
+async def scrape(client: httpx.AsyncClient, url: str) -> Optional[ServerSample]:
+    try:
+        response = await client.get(url)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    return parse_metrics(response.text)
+
+
+async def typist(index: int, args: argparse.Namespace, stats: ClientStats) -> None:
+    rng = random.Random(args.seed * 1_000_003 + index)
+    text = make_text(rng, args.chars)
+    wpm = max(10.0, rng.gauss(args.wpm, args.wpm_spread))
+    delays = key_delays(rng, text, wpm)
+    errors = [rng.random() < args.error_rate for _ in text]
+
+    url = f"{args.url}?session_id=loadgen-{args.seed}-{index}"
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, ping_interval=None, open_timeout=args.timeout, max_queue=None) as ws:
+            stats.connected = True
+            await ws.send(json.dumps({"type": "start_session", "ack_mode": args.ack_mode}))
+            while json.loads(await ws.recv()).get("type") != "session_started":
+                pass
+            stats.connect_latency = time.perf_counter() - started
+
+            pending: Dict[int, float] = {}
+            ended = asyncio.get_running_loop().create_future()
+
+            async def reader():
+                async for raw in ws:
+                    message = json.loads(raw)
+                    kind = message.get("type")
+                    if kind == "keystroke_processed":
+                        sent_at = pending.pop(message.get("position"), None)
+                        if sent_at is not None:
+                            stats.acked += 1
+                            stats.ack_latencies.append(time.perf_counter() - sent_at)
+                    elif kind == "ping":
+                        await ws.send(json.dumps({"type": "pong"}))
+                    elif kind == "session_ended" and not ended.done():
+                        ended.set_result(time.perf_counter())
+
+            read_task = asyncio.create_task(reader())
+            try:
+                for position, (char, delay, wrong) in enumerate(zip(text, delays, errors)):
+                    await asyncio.sleep(delay)
+                    pending[position] = time.perf_counter()
+                    await ws.send(json.dumps({
+                        "type": "keystroke",
+                        "char": char,
+                        "correct": not wrong,
+                        "position": position,
+                    }))
+                    stats.sent += 1
+
+                finish_sent = time.perf_counter()
+                await ws.send(json.dumps({"type": "finish_session"}))
+                stats.finish_latency = await asyncio.wait_for(ended, args.timeout) - finish_sent
+                stats.finished = True
+            finally:
+                read_task.cancel()
+    except Exception as e:
+        stats.error = type(e).__name__
+
+
+async def sample_server(client: httpx.AsyncClient, url: str, samples: List[ServerSample], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        sample = await scrape(client, url)
+        if sample is not None:
+            samples.append(sample)
+        try:
+            await asyncio.wait_for(stop.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+def raise_fd_limit(wanted: int) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 2)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    raise_fd_limit(args.clients + 256)
+    stats = [ClientStats() for _ in range(args.clients)]
+    samples: List[ServerSample] = []
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(timeout=5.0) as http:
+        before = await scrape(http, args.metrics_url)
+        sampler = asyncio.create_task(sample_server(http, args.metrics_url, samples, stop))
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        wall_started = time.perf_counter()
+
+        tasks = []
+        interval = args.ramp / args.clients if args.clients else 0
+        for index, client_stats in enumerate(stats):
+            tasks.append(asyncio.create_task(typist(index, args, client_stats)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+
+        wall = time.perf_counter() - wall_started
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        stop.set()
+        await sampler
+        after = await scrape(http, args.metrics_url)
+
+    latencies = [latency for s in stats for latency in s.ack_latencies]
+    connect = [s.connect_latency for s in stats if s.connect_latency is not None]
+    finish = [s.finish_latency for s in stats if s.finish_latency is not None]
+    errors: Dict[str, int] = {}
+    for s in stats:
+        if s.error:
+            errors[s.error] = errors.get(s.error, 0) + 1
+
+    server = {}
+    if before and after and before.cpu_seconds is not None and after.cpu_seconds is not None:
+        server["cpu_percent"] = round((after.cpu_seconds - before.cpu_seconds) / wall * 100, 1)
+    rss = [s.rss_bytes for s in samples if s.rss_bytes is not None]
+    if rss:
+        server["peak_rss_mb"] = round(max(rss) / 2 ** 20, 1)
+    connections = [s.connections for s in samples if s.connections is not None]
+    if connections:
+        # /metrics is answered by one worker, so this is connections on that worker
+        server["peak_connections_per_worker"] = int(max(connections))
+
+    client_cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "wall_seconds": round(wall, 2),
+        "clients": {
+            "connected": sum(s.connected for s in stats),
+            "finished": sum(s.finished for s in stats),
+            "errors": errors,
+        },
+        "keystrokes": {
+            "sent": sum(s.sent for s in stats),
+            "acked": sum(s.acked for s in stats),
+            "per_second": round(sum(s.sent for s in stats) / wall, 1) if wall else None,
+        },
+        "ack_latency_ms": {
+            "p50": _ms(percentile(latencies, 50)),
+            "p90": _ms(percentile(latencies, 90)),
+            "p99": _ms(percentile(latencies, 99)),
+            "max": _ms(max(latencies) if latencies else None),
+        },
+        "session_start_ms": {"p50": _ms(percentile(connect, 50)), "p99": _ms(percentile(connect, 99))},
+        "session_finish_ms": {"p50": _ms(percentile(finish, 50)), "p99": _ms(percentile(finish, 99))},
+        "server": server,
+        # A saturated generator inflates latency; keep this well below 100
+        "generator_cpu_percent": round(client_cpu / wall * 100, 1) if wall else None,
+    }
+
+
+def print_report(report: dict) -> None:
+    clients = report["clients"]
+    keys = report["keystrokes"]
+    ack = report["ack_latency_ms"]
+    print(f"wall time           {report['wall_seconds']} s")
+    print(f"clients             {clients['finished']}/{report['config']['clients']} finished, "
+          f"{clients['connected']} connected, errors {clients['errors'] or 0}")
+    print(f"keystrokes          {keys['sent']} sent, {keys['acked']} acked, {keys['per_second']}/s")
+    print(f"ack latency (ms)    p50 {ack['p50']}  p90 {ack['p90']}  p99 {ack['p99']}  max {ack['max']}")
+    print(f"session start (ms)  p50 {report['session_start_ms']['p50']}  p99 {report['session_start_ms']['p99']}")
+    print(f"session finish (ms) p50 {report['session_finish_ms']['p50']}  p99 {report['session_finish_ms']['p99']}")
+    server = report["server"]
+    if server:
+        print(f"server              cpu {server.get('cpu_percent')}%  peak rss {server.get('peak_rss_mb')} MB  "
+              f"peak connections/worker {server.get('peak_connections_per_worker')}")
+    else:
+        print("server              /metrics not reachable, no CPU / memory figures")
+    print(f"generator cpu       {report['generator_cpu_percent']}%")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the /ws typing endpoint")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/", help="WebSocket endpoint")
+    parser.add_argument("--metrics-url", default="http://127.0.0.1:8000/metrics/", help="Prometheus endpoint of the server")
+    parser.add_argument("--clients", type=int, default=1000, help="Simulated typists")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which clients connect")
+    parser.add_argument("--chars", type=int, default=200, help="Characters typed per session")
+    parser.add_argument("--wpm", type=float, default=60.0, help="Mean typing speed")
+    parser.add_argument("--wpm-spread", type=float, default=15.0, help="Standard deviation of typing speed")
+    parser.add_argument("--error-rate", type=float, default=0.03, help="Share of mistyped keys")
+    parser.add_argument("--ack-mode", default="batch", choices=["batch", "sampled", "none"],
+                        help="Latency is only measured for acknowledged keystrokes")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Connect / finish timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Same seed, same traffic")
+    parser.add_argument("--json", help="Also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["clients"]["finished"] == args.clients else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))